@@ -0,0 +1,694 @@
+"""
+Scan analysis pipeline.
+The load -> analyze -> extract-vitals path shared by the Streamlit app and
+the batch CLI. vitallens is imported lazily so callers can point it at a
+local API stand-in (API_URL / API_RESOLVE_URL) before first use.
+
+The VITALLENS method calls the remote API through a pooled client
+(client_pool.py); POS, CHROM and G run the local engines in rppg_local.py.
+An API call that times out or fails can fall back to a local engine.
+
+Videos longer than `max_frames` are analyzed in fixed-length overlapping
+windows, and the per-window results are stitched into continuous rolling
+series. The next window is decoded on a background thread while the
+current one is being analyzed (pipeline.prefetch). Shorter videos go
+through the face ROI stage (face_track.py) by default, so only the face
+region of each frame is kept in memory. With `max_subjects` above one that
+stage follows every face in the same decode pass and the per-face streams
+are analyzed together (analyze_tracks). What that stage or the full-frame
+decode produced is kept in the frame cache (frame_cache.py), so analyzing
+the same video again with other settings skips the decode.
+"""
+
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import numpy as np
+
+from api_payload import reduce_frames
+from client_pool import count_bytes_sent, get_pool
+from face_track import NoFaceDetectedError, track_subjects, track_video
+from frame_cache import file_hash, get_frame_cache, intermediate_key, quality_key
+from memory_budget import get_budget
+from memstats import RssPeak, format_bytes
+from metrics import current_trace, stage, trace
+from pipeline import PipelineCancelled, prefetch
+from quality_gate import QualityGateError, QualityReport, check_video
+from rppg_local import (LOCAL_METHODS, ROLLING_RR_WINDOW_S, ROLLING_WINDOW_S, analyze_frames_local, estimate_vitals,
+                        rolling_vitals)
+from video_loader import (DEFAULT_DECODER, DEFAULT_MAX_FRAMES, DEFAULT_MAX_PIXELS, DEFAULT_TARGET_FPS,
+                          SPILL_THRESHOLD_BYTES, FrameWindows, expected_frames, load_video, probe_video)
+
+API_METHODS = ('VITALLENS',)
+METHODS = API_METHODS + LOCAL_METHODS
+
+DEFAULT_SETTINGS = {
+    'method': 'VITALLENS',
+    'mode': 'BURST',
+    'estimate_rolling_vitals': True,
+    'rolling_hr_window_s': ROLLING_WINDOW_S,  # rolling series are computed locally from the waveforms
+    'rolling_rr_window_s': ROLLING_RR_WINDOW_S,
+    'detect_faces': True,
+    'fps': None,  # use the fps reported by the video
+    'max_frames': DEFAULT_MAX_FRAMES,
+    'max_pixels': DEFAULT_MAX_PIXELS,
+    'target_fps': DEFAULT_TARGET_FPS or None,  # decimate faster videos to this rate before analysis
+    'decoder': DEFAULT_DECODER,  # 'cv2', 'av' or 'auto'
+    'spill_threshold': SPILL_THRESHOLD_BYTES,  # frame buffers larger than this are memory-mapped files
+    'memory_budget': True,  # reserve the estimated footprint against the process budget first (memory_budget.py)
+    'roi_stage': True,  # keep only face ROI means and crops instead of full frames (face_track.py)
+    'max_subjects': 1,  # faces to analyze from one decode pass; above 1 needs the ROI stage
+    'quality_gate': True,  # reject dark, shaky or faceless videos from a few sampled frames first (quality_gate.py)
+    'quality_thresholds': None,  # overrides of quality_gate.DEFAULT_THRESHOLDS
+    'frame_cache': True,  # keep decoded ROI tracks or frames for re-analysis with other settings (frame_cache.py)
+    'fallback_method': None,  # local method to use when the API fails
+    'api_timeout': None,  # seconds before giving up on the API
+    'reduce_api_payload': True,  # crop and resize to the model input before the API client
+    'window_s': 20.0,  # window length for videos longer than max_frames
+    'window_overlap_s': 5.0,
+}
+
+
+class APITimeoutError(TimeoutError):
+    """Raised when the VitalLens API does not answer within `api_timeout`."""
+
+
+def analysis_settings(**overrides):
+    """Return a copy of the default settings with `overrides` applied."""
+    unknown = set(overrides) - set(DEFAULT_SETTINGS)
+    if unknown:
+        raise ValueError(f"Unknown analysis settings: {', '.join(sorted(unknown))}")
+    settings = dict(DEFAULT_SETTINGS)
+    settings.update(overrides)
+    for key in ('method', 'fallback_method'):
+        if settings[key] is not None and settings[key] not in METHODS:
+            raise ValueError(f"Unknown {key}: {settings[key]}")
+    if settings['fallback_method'] in API_METHODS:
+        raise ValueError("fallback_method must be a local method")
+    if settings['max_subjects'] < 1:
+        raise ValueError("max_subjects must be at least 1")
+    if settings['max_subjects'] > 1 and not settings['roi_stage']:
+        raise ValueError("max_subjects above 1 needs roi_stage")
+    return settings
+
+
+def create_vitallens(settings, api_key=None):
+    """Construct a VitalLens client for `settings`."""
+    import vitallens
+    return vitallens.VitalLens(
+        method=vitallens.Method[settings['method']],
+        api_key=api_key,
+        mode=vitallens.Mode[settings['mode']],
+        detect_faces=settings['detect_faces'],
+        export_to_json=False,
+        # Rolled locally from the returned waveforms instead (rppg_local.rolling_vitals)
+        estimate_rolling_vitals=False
+    )
+
+
+def _fallback_errors():
+    """Exceptions that mean the API is unavailable rather than the input being bad."""
+    import requests
+    from vitallens.errors import VitalLensAPIError, VitalLensAPIQuotaExceededError
+    return (APITimeoutError, requests.exceptions.RequestException,
+            VitalLensAPIError, VitalLensAPIQuotaExceededError)
+
+
+def _call_with_timeout(fn, timeout):
+    """Run `fn` in a daemon thread and wait at most `timeout` seconds for it."""
+    if not timeout:
+        return fn()
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=contextvars.copy_context().run, args=(run,), daemon=True).start()
+    try:
+        return future.result(timeout=timeout)
+    except TimeoutError:
+        raise APITimeoutError(f"VitalLens API did not respond within {timeout:.0f}s") from None
+
+
+def _analyze_api(frames, fps, settings, api_key, vl):
+    def call():
+        if vl is not None:
+            with stage('api_call'):
+                return vl(frames, fps=fps)
+        if not settings['reduce_api_payload']:
+            with get_pool().client(settings, api_key) as client, stage('api_call'):
+                return client(frames, fps=fps)
+        # Faces are found here, so the client only ever sees the cropped ROI
+        with get_pool().client(dict(settings, detect_faces=False), api_key) as client:
+            with stage('payload_reduce'):
+                reduced = reduce_frames(frames, fps, client.rppg.roi_method, client.rppg.input_size,
+                                        detect_faces=settings['detect_faces'])
+            if reduced is None:
+                return []
+            with stage('api_call'):
+                return client(reduced, fps=fps)
+    with count_bytes_sent() as sent:
+        results = _call_with_timeout(call, settings['api_timeout'])
+    logging.info(f"Sent {format_bytes(sent.bytes)} to the VitalLens API "
+                 f"for {len(frames)} frames ({format_bytes(frames.nbytes)} decoded)")
+    if not results or len(results) == 0:
+        return None
+    vital_signs = results[0]['vital_signs']
+    if settings['estimate_rolling_vitals']:
+        with stage('rolling_vitals'):
+            rolling_vitals(vital_signs, fps, settings['rolling_hr_window_s'], settings['rolling_rr_window_s'])
+    return vital_signs
+
+
+def analyze_frames(frames, fps, settings, api_key=None, vl=None):
+    """Run rPPG inference on decoded RGB frames for the first face.
+
+    Returns:
+        Tuple of the `vital_signs` dict and the name of the method that
+        produced it, which differs from settings['method'] after a fallback.
+    Raises:
+        NoFaceDetectedError: If no face was found.
+    """
+    fps = settings['fps'] or fps
+    method = settings['method']
+    if method in LOCAL_METHODS:
+        with stage('local_rppg'):
+            vital_signs = analyze_frames_local(
+                frames, fps, method, detect_faces=settings['detect_faces'],
+                estimate_rolling_vitals=settings['estimate_rolling_vitals'],
+                rolling_window_s=settings['rolling_hr_window_s'],
+                rolling_rr_window_s=settings['rolling_rr_window_s'])
+    else:
+        try:
+            vital_signs = _analyze_api(frames, fps, settings, api_key, vl)
+        except _fallback_errors() as e:
+            if not settings['fallback_method']:
+                raise
+            method = settings['fallback_method']
+            logging.warning(f"VitalLens API unavailable ({e}); falling back to local {method}")
+            with stage('local_rppg'):
+                vital_signs = analyze_frames_local(
+                    frames, fps, method, detect_faces=settings['detect_faces'],
+                    estimate_rolling_vitals=settings['estimate_rolling_vitals'],
+                    rolling_window_s=settings['rolling_hr_window_s'],
+                    rolling_rr_window_s=settings['rolling_rr_window_s'])
+    if vital_signs is None:
+        raise NoFaceDetectedError("No face detected in video")
+    return vital_signs, method
+
+
+def _keep_crops(settings):
+    return settings['method'] in API_METHODS or settings['frame_cache']
+
+
+def load_face_track(video_path, settings, progress=None, cancel=None):
+    """Run the face ROI stage over `video_path` with the decode settings of `settings`.
+
+    API crops are only kept when the method needs them (or may fall back
+    from them), or when the frame cache keeps them for a later API run.
+    """
+    return track_video(video_path, max_frames=settings['max_frames'], max_pixels=settings['max_pixels'],
+                       target_fps=settings['target_fps'], decoder=settings['decoder'],
+                       detect_faces=settings['detect_faces'], keep_crops=_keep_crops(settings),
+                       progress=progress, cancel=cancel)
+
+
+def analyze_track(track, settings, api_key=None, vl=None):
+    """Run rPPG inference on the output of the face ROI stage.
+
+    Local methods use the per-frame skin means; the API gets the model-ROI
+    crops, so it never sees full frames. Same return value and fallback
+    behaviour as analyze_frames.
+    """
+    fps = settings['fps'] or track.fps
+    method = settings['method']
+    if method in LOCAL_METHODS:
+        with stage('local_rppg'):
+            vital_signs = estimate_vitals(track.means, fps, method, settings['estimate_rolling_vitals'],
+                                          settings['rolling_hr_window_s'], settings['rolling_rr_window_s'])
+    else:
+        try:
+            # The crops are already centred on the tracked face
+            vital_signs = _analyze_api(track.crops, fps, dict(settings, detect_faces=False), api_key, vl)
+        except _fallback_errors() as e:
+            if not settings['fallback_method']:
+                raise
+            method = settings['fallback_method']
+            logging.warning(f"VitalLens API unavailable ({e}); falling back to local {method}")
+            with stage('local_rppg'):
+                vital_signs = estimate_vitals(track.means, fps, method, settings['estimate_rolling_vitals'],
+                                              settings['rolling_hr_window_s'], settings['rolling_rr_window_s'])
+    if vital_signs is None:
+        raise NoFaceDetectedError("No face detected in video")
+    return vital_signs, method
+
+
+def load_face_tracks(video_path, settings, progress=None, cancel=None):
+    """load_face_track for up to settings['max_subjects'] faces in one decode pass, largest face first."""
+    return track_subjects(video_path, settings['max_subjects'], max_frames=settings['max_frames'],
+                          max_pixels=settings['max_pixels'], target_fps=settings['target_fps'],
+                          decoder=settings['decoder'], detect_faces=settings['detect_faces'],
+                          keep_crops=_keep_crops(settings), progress=progress, cancel=cancel)
+
+
+def analyze_tracks(tracks, settings, api_key=None, vl=None):
+    """Run analyze_track on the face track of every subject.
+
+    Local methods take milliseconds per subject and run in turn. API calls
+    for all subjects go out together on the client pool, in batch mode so
+    no burst state is shared between subjects, so the wait is the slowest
+    call rather than the sum; with an explicit `vl` client they run in turn.
+    Returns a (vital_signs, method) pair per track, None where no face was
+    found in its crops.
+    """
+    def run(track):
+        try:
+            return analyze_track(track, subject_settings, api_key=api_key, vl=vl)
+        except NoFaceDetectedError:
+            return None
+
+    if settings['method'] in LOCAL_METHODS or vl is not None or len(tracks) == 1:
+        subject_settings = settings
+        return [run(track) for track in tracks]
+    subject_settings = dict(settings, mode='BATCH')
+    with ThreadPoolExecutor(max_workers=min(len(tracks), get_pool().max_size)) as executor:
+        futures = [executor.submit(contextvars.copy_context().run, run, track) for track in tracks]
+        return [future.result() for future in futures]
+
+
+def analyze_video(video_path, settings, api_key=None, vl=None, progress=None, cancel=None, video_hash=None):
+    """Decode `video_path` and analyze it.
+
+    Videos longer than settings['max_frames'] go through the windowed path.
+    Returns a dict with the `vital_signs`, the `fps` used, the number of
+    frames analyzed, `timings` in seconds, decoder `load_stats`, the
+    `quality` gate report (None with the gate off), how the `memory` budget
+    admitted it (None with the budget off or when the decoded video came
+    from the frame cache), the per-face `subjects` (None unless
+    settings['max_subjects'] is above 1; `vital_signs` and `method` are then
+    the largest face's) and, with metrics enabled, the per-stage `stages` of
+    the trace (see metrics.py).
+
+    With settings['frame_cache'] on, the decoded face tracks or frames and
+    the quality report are looked up by `video_hash` (the SHA-256 of the
+    file, computed here when not given) and stored after a decode; windowed
+    videos, and decodes the memory budget downscaled, are not cached.
+
+    `progress`, if given, is called as progress(stage, frames, total) with
+    stage 'quality', 'memory' (waiting for the budget), 'decode',
+    'inference' or, for windowed videos, 'windows'. Setting `cancel` (a
+    threading.Event) stops the analysis while waiting or between frames or
+    windows with pipeline.PipelineCancelled.
+
+    Raises:
+        QualityGateError: If settings['quality_gate'] is on and the sampled
+            frames are too dark, overexposed, shaky or have no face.
+    """
+    with trace('analysis', method=settings['method']) as tr:
+        cache = get_frame_cache() if settings['frame_cache'] else None
+        if cache is not None and video_hash is None:
+            video_hash = file_hash(video_path)
+        quality = check_quality(video_path, settings, progress, cache, video_hash)
+        admission = None
+        start = time.perf_counter()
+        key = intermediate_key(video_hash, settings) if cache is not None else None
+        decoded = _cached_decode(settings, cache, key)
+        if decoded is not None:
+            result = _analyze_decoded(decoded, settings, api_key, vl, progress, cancel, start)
+        else:
+            budget = get_budget().reserve(video_path, settings, progress, cancel) if settings['memory_budget'] \
+                else contextlib.nullcontext()
+            with budget as admission:
+                run_settings = admission.settings if admission is not None else settings
+                # A decode admission downscaled would be stored where no lookup goes
+                if key is not None and intermediate_key(video_hash, run_settings) != key:
+                    key = None
+                result = _analyze_video(video_path, run_settings, api_key, vl, progress, cancel, cache, key)
+    result['quality'] = quality
+    result['memory'] = admission.as_dict() if admission is not None else None
+    result.setdefault('subjects', None)
+    if tr is not None:
+        result['stages'] = tr.summary()['stages']
+    return result
+
+
+def check_quality(video_path, settings, progress=None, cache=None, video_hash=None):
+    """Run the quality gate if settings enable it; returns its report as a dict, or None.
+
+    With a frame `cache`, a report stored for `video_hash` is reused.
+    """
+    if not settings['quality_gate']:
+        return None
+    start = time.perf_counter()
+    key = quality_key(video_hash, settings) if cache is not None else None
+    stored = cache.get_quality(key) if key is not None else None
+    if stored is not None:
+        report = QualityReport(**dict(stored, frames_decoded=0, elapsed_s=time.perf_counter() - start))
+    else:
+        if progress is not None:
+            progress('quality')
+        with stage('quality_gate'):
+            report = check_video(video_path, settings['quality_thresholds'], detect_faces=settings['detect_faces'])
+        if key is not None:
+            cache.put_quality(key, report.as_dict())
+    if not report.passed:
+        raise QualityGateError(report)
+    for warning in report.warnings:
+        logging.info(f"Quality gate warning for {video_path}: {warning}")
+    return report.as_dict()
+
+
+def _start_inference(progress, cancel, n_frames):
+    if cancel is not None and cancel.is_set():
+        raise PipelineCancelled()
+    if progress is not None:
+        progress('inference', n_frames, n_frames)
+
+
+def _cached_decode(settings, cache, key):
+    """Face tracks (ROI stage) or a LoadedVideo (full frames) stored under `key`, or None."""
+    if cache is None:
+        return None
+    rss = RssPeak()
+    with stage('frame_cache'):
+        if settings['roi_stage']:
+            decoded = cache.get_tracks(key, need_crops=settings['method'] in API_METHODS)
+        else:
+            decoded = cache.get_frames(key)
+    if decoded is not None:
+        peak = rss.peak()
+        for item in decoded if settings['roi_stage'] else [decoded]:
+            item.peak_rss_bytes = peak
+    return decoded
+
+
+def _decode(video_path, settings, progress, cancel):
+    if settings['roi_stage'] and settings['max_subjects'] > 1:
+        return load_face_tracks(video_path, settings, progress=progress, cancel=cancel)
+    if settings['roi_stage']:
+        return [load_face_track(video_path, settings, progress=progress, cancel=cancel)]
+    return load_video(video_path, max_frames=settings['max_frames'], max_pixels=settings['max_pixels'],
+                      target_fps=settings['target_fps'], decoder=settings['decoder'],
+                      spill_threshold=settings['spill_threshold'], progress=progress, cancel=cancel)
+
+
+def _track_load_stats(track, tracks):
+    return {
+        'frames': track.n_frames,
+        'source_size': track.source_size,
+        'frame_size': track.frame_size,
+        'video_bytes': sum(t.nbytes for t in tracks),
+        'spilled': False,
+        'peak_rss_bytes': track.peak_rss_bytes,
+        'fps_detected': track.fps_detected,
+        'decoder': track.stats['decoder'],
+        'source_fps': track.stats['source_fps'],
+        'frames_skipped': track.stats['frames_skipped'],
+        'face_track': track.stats,
+        'frame_cache': track.stats.get('frame_cache', 'miss'),
+    }
+
+
+def _analyze_subjects(tracks, settings, api_key, vl, progress, cancel, start, load_s):
+    _start_inference(progress, cancel, sum(track.n_frames for track in tracks))
+    subjects = []
+    for track, analyzed in zip(tracks, analyze_tracks(tracks, settings, api_key=api_key, vl=vl)):
+        if analyzed is None:
+            continue
+        fps = settings['fps'] or track.fps
+        subjects.append({
+            'subject': len(subjects),
+            'vital_signs': analyzed[0],
+            'method': analyzed[1],
+            'box': np.median(track.boxes, axis=0).tolist(),  # in pixels of the analyzed frame (frame_size)
+            'start_s': track.start_frame / fps,
+            'n_frames': track.n_frames,
+        })
+    if not subjects:
+        raise NoFaceDetectedError("No face detected in video")
+    total_s = time.perf_counter() - start
+    primary = tracks[0]
+    return {
+        'vital_signs': subjects[0]['vital_signs'],
+        'method': subjects[0]['method'],
+        'fps': settings['fps'] or primary.fps,
+        'n_frames': subjects[0]['n_frames'],
+        'subjects': subjects,
+        'peak_rss_bytes': primary.peak_rss_bytes,
+        'timings': {'load_s': load_s, 'analyze_s': total_s - load_s, 'total_s': total_s},
+        'load_stats': dict(_track_load_stats(primary, tracks), subjects=len(subjects)),
+    }
+
+
+def _analyze_video(video_path, settings, api_key, vl, progress, cancel, cache=None, cache_key=None):
+    if needs_windowing(video_path, settings):
+        if settings['max_subjects'] > 1:
+            logging.warning(f"{video_path} is longer than max_frames; analyzing the first face only")
+        return analyze_video_windowed(video_path, settings, api_key=api_key, progress=progress, cancel=cancel)
+    start = time.perf_counter()
+    decoded = _decode(video_path, settings, progress, cancel)
+    if cache is not None and cache_key is not None:
+        with stage('frame_cache'):
+            if settings['roi_stage']:
+                cache.put_tracks(cache_key, decoded)
+            else:
+                cache.put_frames(cache_key, decoded)
+    return _analyze_decoded(decoded, settings, api_key, vl, progress, cancel, start)
+
+
+def _analyze_decoded(decoded, settings, api_key, vl, progress, cancel, start):
+    """Analyze the output of _decode (or the same from the frame cache); `start` is when loading began."""
+    load_s = time.perf_counter() - start
+    if settings['roi_stage'] and settings['max_subjects'] > 1:
+        return _analyze_subjects(decoded, settings, api_key, vl, progress, cancel, start, load_s)
+    if settings['roi_stage']:
+        track = decoded[0]
+        fps = settings['fps'] or track.fps
+        _start_inference(progress, cancel, track.n_frames)
+        vital_signs, method = analyze_track(track, settings, api_key=api_key, vl=vl)
+        total_s = time.perf_counter() - start
+        return {
+            'vital_signs': vital_signs,
+            'method': method,
+            'fps': fps,
+            'n_frames': track.n_frames,
+            'peak_rss_bytes': track.peak_rss_bytes,
+            'timings': {'load_s': load_s, 'analyze_s': total_s - load_s, 'total_s': total_s},
+            'load_stats': _track_load_stats(track, [track]),
+        }
+    loaded = decoded
+    try:
+        fps = settings['fps'] or loaded.fps
+        _start_inference(progress, cancel, loaded.n_frames)
+        vital_signs, method = analyze_frames(loaded.frames, fps, settings, api_key=api_key, vl=vl)
+        load_stats = {
+            'frames': loaded.n_frames,
+            'source_size': loaded.source_size,
+            'frame_size': (loaded.frames.shape[2], loaded.frames.shape[1]),
+            'video_bytes': loaded.nbytes,
+            'spilled': loaded.spill_path is not None,
+            'peak_rss_bytes': loaded.peak_rss_bytes,
+            'fps_detected': loaded.fps_detected,
+            'decoder': loaded.stats['decoder'],
+            'source_fps': loaded.stats['source_fps'],
+            'frames_skipped': loaded.stats['frames_skipped'],
+            'frame_cache': loaded.stats.get('frame_cache', 'miss'),
+        }
+    finally:
+        loaded.close()
+    total_s = time.perf_counter() - start
+    return {
+        'vital_signs': vital_signs,
+        'method': method,
+        'fps': fps,
+        'n_frames': load_stats['frames'],
+        'peak_rss_bytes': load_stats['peak_rss_bytes'],
+        'timings': {'load_s': load_s, 'analyze_s': total_s - load_s, 'total_s': total_s},
+        'load_stats': load_stats,
+    }
+
+
+def needs_windowing(video_path, settings):
+    """True if the video has more frames than a single-shot analysis may hold."""
+    n_frames, _, _, fps = probe_video(video_path)
+    return expected_frames(n_frames, fps, settings['target_fps']) > settings['max_frames']
+
+
+class _SeriesStitcher:
+    """Blends per-window series into one continuous series.
+
+    Each window is weighted with a trapezoid that ramps over the overlap,
+    so overlapping windows crossfade instead of jumping at the seams.
+    """
+
+    def __init__(self, ramp):
+        self.ramp = max(ramp, 1)
+        self.sum = np.zeros(0)
+        self.weight = np.zeros(0)
+
+    def add(self, start, values, is_first, is_last):
+        n = len(values)
+        end = start + n
+        if end > len(self.sum):
+            grow = end - len(self.sum)
+            self.sum = np.concatenate([self.sum, np.zeros(grow)])
+            self.weight = np.concatenate([self.weight, np.zeros(grow)])
+        i = np.arange(n, dtype=float)
+        w = np.ones(n)
+        if not is_first:
+            w = np.minimum(w, (i + 1) / self.ramp)
+        if not is_last:
+            w = np.minimum(w, (n - i) / self.ramp)
+        valid = np.isfinite(values)
+        w = np.where(valid, w, 0.0)
+        self.sum[start:end] += w * np.where(valid, values, 0.0)
+        self.weight[start:end] += w
+
+    def result(self):
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(self.weight > 0, self.sum / self.weight, np.nan)
+
+
+def _window_series(vital_signs, name, n):
+    """Per-frame series for one window: the rolling estimate, else the window value."""
+    rolling = vital_signs.get(f'rolling_{name}', {}).get('data')
+    if rolling is not None and len(rolling) == n:
+        return np.asarray(rolling, dtype=float)
+    value = vital_signs.get(name, {}).get('value')
+    return np.full(n, np.nan if value is None else float(value))
+
+
+def analyze_video_windowed(video_path, settings, api_key=None, progress=None, cancel=None, prefetch_depth=2):
+    """Analyze a video of any length in overlapping windows with constant memory.
+
+    Each window is analyzed independently (the API runs in batch mode so no
+    burst state carries across windows). Windows with no detectable face are
+    skipped. `progress`, if given, is called as progress('windows', frames
+    done, total frames) after each window.
+
+    Up to `prefetch_depth` window buffers are allocated so decoding runs
+    ahead of inference; 1 decodes and analyzes strictly in turn. Setting
+    `cancel` (a threading.Event) stops both stages.
+
+    Raises:
+        NoFaceDetectedError: If no window contained a face.
+        pipeline.PipelineCancelled: If `cancel` was set.
+    """
+    start = time.perf_counter()
+    rss = RssPeak()
+    window_settings = dict(settings, mode='BATCH')
+    windows = FrameWindows(video_path, settings['window_s'], settings['window_overlap_s'],
+                           max_pixels=settings['max_pixels'], n_buffers=prefetch_depth,
+                           target_fps=settings['target_fps'], decoder=settings['decoder'])
+    fps = settings['fps'] or windows.fps
+    overlap = windows.window_frames - windows.hop_frames
+    stitchers = {name: _SeriesStitcher(overlap) for name in ('heart_rate', 'respiratory_rate')}
+    per_window = []
+    methods = set()
+    n_frames = 0
+    decode_s = 0.0
+    analyze_s = 0.0
+
+    # decode_s only counts time spent waiting on the decoder, which is what
+    # pipelining removes from the total
+    stream = prefetch(windows, depth=prefetch_depth, cancel=cancel)
+    try:
+        t = time.perf_counter()
+        for win_start, frames, is_last in stream:
+            decode_s += time.perf_counter() - t
+            n = frames.shape[0]
+            is_first = win_start == 0
+            n_frames = win_start + n
+            t = time.perf_counter()
+            try:
+                vital_signs, method = analyze_frames(frames, fps, window_settings, api_key=api_key)
+            except NoFaceDetectedError:
+                vital_signs = None
+            analyze_s += time.perf_counter() - t
+            rss.sample()  # a window and its inference are still held here
+            if vital_signs is not None:
+                methods.add(method)
+                for name, stitcher in stitchers.items():
+                    stitcher.add(win_start, _window_series(vital_signs, name, n), is_first, is_last)
+                per_window.append({
+                    'start_s': win_start / fps,
+                    'end_s': (win_start + n) / fps,
+                    'heart_rate': _value(vital_signs, 'heart_rate'),
+                    'respiratory_rate': _value(vital_signs, 'respiratory_rate'),
+                })
+            if progress is not None:
+                progress('windows', n_frames, windows.n_frames_reported or None)
+            t = time.perf_counter()
+    finally:
+        stream.close()
+        window_bytes = windows.nbytes
+        windows.close()
+
+    tr = current_trace()
+    if tr is not None:
+        # Decode time the pipeline did not hide behind inference
+        tr.record('decode_wait', decode_s)
+    if not per_window:
+        raise NoFaceDetectedError("No face detected in video")
+
+    units = {'heart_rate': 'bpm', 'respiratory_rate': 'bpm'}
+    vital_signs = {'windows': per_window}
+    for name, stitcher in stitchers.items():
+        values = [w[name] for w in per_window if w[name] is not None]
+        if not values:
+            continue
+        series = stitcher.result()
+        if len(series) < n_frames:
+            series = np.concatenate([series, np.full(n_frames - len(series), np.nan)])
+        note = f"Stitched from {len(per_window)} windows of {settings['window_s']:.0f}s."
+        vital_signs[name] = {'value': float(np.median(values)), 'unit': units[name],
+                             'confidence': len(values) / len(per_window), 'note': note}
+        vital_signs[f'rolling_{name}'] = {'data': series, 'unit': units[name],
+                                          'confidence': np.isfinite(series).astype(float), 'note': note}
+
+    total_s = time.perf_counter() - start
+    peak_rss = rss.peak()
+    return {
+        'vital_signs': vital_signs,
+        'method': '+'.join(sorted(methods)),
+        'fps': fps,
+        'n_frames': n_frames,
+        'window_bytes': window_bytes,
+        'peak_rss_bytes': peak_rss,
+        'timings': {'load_s': decode_s, 'analyze_s': analyze_s, 'total_s': total_s},
+        'load_stats': {
+            'frames': n_frames,
+            'windows': len(per_window),
+            'video_bytes': window_bytes,
+            'spilled': False,
+            'peak_rss_bytes': peak_rss,
+            'fps_detected': windows.fps_detected,
+        },
+    }
+
+
+def _value(vital_signs, name):
+    value = vital_signs.get(name, {}).get('value')
+    return None if value is None or np.isnan(value) else float(value)
+
+
+def _series(vital_signs, name):
+    data = vital_signs.get(name, {}).get('data')
+    return None if data is None else np.asarray(data, dtype=float).tolist()
+
+
+def summarize_vitals(vital_signs):
+    """Plain-Python HR/RR values and rolling series, suitable for JSON."""
+    return {
+        'heart_rate': _value(vital_signs, 'heart_rate'),
+        'respiratory_rate': _value(vital_signs, 'respiratory_rate'),
+        'rolling_heart_rate': _series(vital_signs, 'rolling_heart_rate'),
+        'rolling_respiratory_rate': _series(vital_signs, 'rolling_respiratory_rate'),
+    }
@@ -0,0 +1,47 @@
+"""
+API payload reduction.
+Crops decoded frames to the face ROI the VitalLens model uses and resizes
+them to its input size before they are handed to the API client, so the
+client never sees (or copies) full-resolution video. Temporal decimation
+to the model's frame rate is left to the client, which also interpolates
+the results back to every input frame.
+"""
+
+import cv2
+import numpy as np
+
+from rppg_local import detect_face_boxes
+
+
+def representative_box(boxes):
+    """The per-frame box closest to the median box, as the vitallens client picks it."""
+    boxes = np.asarray(boxes, dtype=np.float64)
+    return boxes[np.argmin(np.linalg.norm(boxes - np.median(boxes, axis=0), axis=1))]
+
+
+def api_roi(box, roi_method, frame_size):
+    """Model ROI (x0, y0, x1, y1) around a face box, clipped to the frame."""
+    from prpy.numpy.face import get_roi_from_det
+    return get_roi_from_det(box, roi_method=roi_method, clip_dims=frame_size)
+
+
+def reduce_frames(frames, fps, roi_method, input_size, detect_faces=True):
+    """Crop `frames` to the model ROI and resize to `input_size` square.
+
+    Returns a uint8 array of shape (n_frames, input_size, input_size, 3), or
+    None when face detection finds no face.
+    """
+    n, height, width = frames.shape[:3]
+    if detect_faces:
+        boxes = detect_face_boxes(frames, fps)
+        if boxes is None:
+            return None
+        box = representative_box(boxes)
+    else:
+        box = (0, 0, width, height)
+    x0, y0, x1, y1 = api_roi(box, roi_method, (width, height))
+    out = np.empty((n, input_size, input_size, 3), dtype=np.uint8)
+    # Bilinear like the client's own resize, so the model sees the same pixels
+    for i in range(n):
+        cv2.resize(frames[i, y0:y1, x0:x1], (input_size, input_size), dst=out[i], interpolation=cv2.INTER_LINEAR)
+    return out
@@ -0,0 +1,354 @@
+"""
+Process-wide pieces of the Streamlit app.
+The stylesheet, the fixed HTML fragments and the cached resources are built
+once, when the module is first imported, instead of on every rerun of the
+app script. Nothing here imports cv2, numpy, matplotlib or vitallens.
+"""
+
+import importlib.util
+import os
+import re
+
+import streamlit as st
+
+from metrics import stage, start_http_server, trace
+from result_cache import ResultCache
+from results_store import ResultsStore
+
+# Checked without importing vitallens, which takes about a second
+VITALLENS_AVAILABLE = importlib.util.find_spec('vitallens') is not None
+
+# Series colour and global-value line colour per chart
+CHART_COLORS = {
+    'heart_rate': ('#ef4444', '#dc2626'),
+    'respiratory_rate': ('#3b82f6', '#2563eb'),
+}
+
+
+@st.cache_resource
+def get_result_cache():
+    # One cache per process, shared by every session
+    return ResultCache()
+
+
+@st.cache_resource
+def get_results_store():
+    # Scan history shared by every session
+    return ResultsStore()
+
+
+def current_user():
+    """Who scans are recorded for: the signed-in email, or None without auth, when none are kept."""
+    return st.user.get('email') or None
+
+
+@st.cache_resource
+def start_metrics_server():
+    # Prometheus endpoint shared by every session, if a port is configured
+    port = os.environ.get('VITALLENS_METRICS_PORT')
+    return start_http_server(int(port)) if port else None
+
+
+def run_analysis(video_path, settings, api_key, result_cache, result_key, upload_write_s, results_store=None,
+                 user=None, progress=None, cancel=None, video_hash=None):
+    """Job body for an uploaded video: analyze it, cache and record the result and remove the upload.
+
+    Runs on a job_queue worker; the returned dict is analysis.analyze_video's
+    result plus the metrics `trace` (None with metrics disabled), `result_key`
+    and the `rolling_windows` the series were computed with. `video_hash`
+    (result_cache.content_hash of the upload) keys the frame cache. The scan
+    is recorded in `results_store` only for a signed-in `user`.
+    """
+    from analysis import analyze_video, summarize_vitals
+    try:
+        with trace('analysis', method=settings['method']) as tr:
+            if tr is not None:
+                tr.record('upload_write', upload_write_s)
+            result = analyze_video(video_path, settings, api_key=api_key, progress=progress, cancel=cancel,
+                                   video_hash=video_hash)
+        result['trace'] = tr
+        result['result_key'] = result_key
+        result['rolling_windows'] = (settings['rolling_hr_window_s'], settings['rolling_rr_window_s'])
+        # Fallback and downscaled results are not cached so the next START gets the full analysis
+        downscaled = result['memory'] is not None and result['memory']['max_pixels'] != settings['max_pixels']
+        fell_back = any(subject['method'] != settings['method'] for subject in result['subjects'] or [result])
+        if not fell_back and not downscaled:
+            result_cache.put(result_key, {'vital_signs': result['vital_signs'], 'fps': result['fps'],
+                                         'fps_detected': result['load_stats'].get('fps_detected', True),
+                                         'quality': result['quality'], 'subjects': result['subjects']})
+        if results_store is not None and user is not None:
+            results_store.add(user, dict(summarize_vitals(result['vital_signs']), method=result['method'],
+                                         fps=result['fps'], n_frames=result['n_frames'], result_key=result_key))
+        return result
+    finally:
+        try:
+            os.unlink(video_path)
+        except OSError:
+            pass
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def render_chart(result_key, method, name, windows, _series, fps, global_value, ylabel):
+    # Keyed on the result hash and rolling windows; the underscore keeps the series itself out of the hash
+    from charts import render_series_png
+    color, line_color = CHART_COLORS[name]
+    with stage('chart_render'):
+        return render_series_png(_series, fps, global_value, color=color, line_color=line_color, ylabel=ylabel)
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def reroll_vitals(result_key, method, hr_window_s, rr_window_s, _vital_signs, fps):
+    """Rolling HR/RR entries for other window lengths, from the result's waveforms."""
+    from rppg_local import rolling_vitals
+    waveforms = {name: _vital_signs[name] for name in ('ppg_waveform', 'respiratory_waveform') if name in _vital_signs}
+    rolled = rolling_vitals(waveforms, fps, hr_window_s, rr_window_s)
+    return {name: entry for name, entry in rolled.items() if name.startswith('rolling_')}
+
+
+_CSS = """
+    @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap');
+
+    * {
+        font-family: 'Inter', sans-serif;
+    }
+
+    .main {
+        padding: 0 !important;
+        background: #fafafa;
+    }
+
+    .block-container {
+        padding: 2rem 3rem !important;
+        max-width: 100% !important;
+    }
+
+    .header-section {
+        text-align: center;
+        padding: 1rem 0 2rem 0;
+    }
+
+    .main-title {
+        font-size: 2.5rem;
+        font-weight: 700;
+        color: #111;
+        margin-bottom: 0.5rem;
+    }
+
+    .main-subtitle {
+        font-size: 1.1rem;
+        color: #666;
+        font-weight: 400;
+        line-height: 1.6;
+    }
+
+    .instructions-container {
+        background: white;
+        border-radius: 16px;
+        padding: 2rem;
+        box-shadow: 0 2px 8px rgba(0,0,0,0.08);
+        margin-bottom: 2rem;
+    }
+
+    .section-title {
+        font-size: 1.4rem;
+        font-weight: 600;
+        color: #111;
+        margin-bottom: 1.5rem;
+    }
+
+    .instruction-item {
+        display: flex;
+        align-items: flex-start;
+        margin-bottom: 1.2rem;
+        font-size: 0.95rem;
+        color: #333;
+    }
+
+    .instruction-number {
+        background: #f5f5f5;
+        color: #666;
+        min-width: 28px;
+        height: 28px;
+        border-radius: 50%;
+        display: flex;
+        align-items: center;
+        justify-content: center;
+        font-weight: 600;
+        font-size: 0.85rem;
+        margin-right: 0.8rem;
+        flex-shrink: 0;
+    }
+
+    .video-section {
+        background: white;
+        border-radius: 16px;
+        padding: 2rem;
+        box-shadow: 0 2px 8px rgba(0,0,0,0.08);
+        margin-bottom: 2rem;
+    }
+
+    .metrics-grid {
+        display: grid;
+        grid-template-columns: 1fr 1fr;
+        gap: 1rem;
+        margin-top: 1rem;
+    }
+
+    .metric-card {
+        background: white;
+        border-radius: 12px;
+        padding: 1.5rem;
+        box-shadow: 0 2px 8px rgba(0,0,0,0.08);
+        text-align: center;
+        transition: transform 0.2s;
+    }
+
+    .metric-card:hover {
+        transform: translateY(-2px);
+        box-shadow: 0 4px 12px rgba(0,0,0,0.12);
+    }
+
+    .metric-icon {
+        font-size: 2rem;
+        margin-bottom: 0.5rem;
+    }
+
+    .metric-label {
+        font-size: 0.85rem;
+        color: #666;
+        font-weight: 500;
+        margin-bottom: 0.3rem;
+    }
+
+    .metric-value {
+        font-size: 2rem;
+        font-weight: 700;
+        color: #111;
+    }
+
+    .metric-unit {
+        font-size: 0.9rem;
+        color: #999;
+        font-weight: 500;
+    }
+
+    .stButton > button {
+        width: 100%;
+        background: #22c55e !important;
+        color: white !important;
+        border: none !important;
+        border-radius: 12px !important;
+        padding: 1rem 2rem !important;
+        font-size: 1.1rem !important;
+        font-weight: 600 !important;
+        letter-spacing: 0.5px !important;
+        transition: all 0.2s !important;
+        box-shadow: 0 4px 12px rgba(34, 197, 94, 0.3) !important;
+        margin-top: 1rem !important;
+    }
+
+    .stButton > button:hover {
+        background: #16a34a !important;
+        box-shadow: 0 6px 16px rgba(34, 197, 94, 0.4) !important;
+        transform: translateY(-1px);
+    }
+
+    .upload-info {
+        text-align: center;
+        padding: 3rem 2rem;
+        color: #999;
+        font-size: 1rem;
+    }
+
+    #MainMenu {visibility: hidden;}
+    footer {visibility: hidden;}
+
+    .chart-container {
+        background: white;
+        border-radius: 12px;
+        padding: 1.5rem;
+        box-shadow: 0 2px 8px rgba(0,0,0,0.08);
+        margin-bottom: 1rem;
+    }
+
+    .chart-title {
+        font-size: 1.1rem;
+        font-weight: 600;
+        color: #111;
+        margin-bottom: 1rem;
+    }
+
+    .more-metrics {
+        text-align: center;
+        padding: 1rem;
+        color: #666;
+        font-size: 0.9rem;
+        font-weight: 500;
+    }
+
+    .scenario-description {
+        background: #f9fafb;
+        border-radius: 8px;
+        padding: 1rem;
+        margin-top: 1rem;
+        font-size: 0.9rem;
+        color: #555;
+        line-height: 1.6;
+    }
+"""
+
+
+def _minify(css):
+    css = re.sub(r'\s+', ' ', css)
+    return re.sub(r'\s*([{};:,])\s*', r'\1', css).strip()
+
+
+STYLE = f"<style>{_minify(_CSS)}</style>"
+
+HEADER = (
+    '<div class="header-section">'
+    '<div class="main-title">Monitor health metrics in just 30 seconds—with a video scan.</div>'
+    '<div class="main-subtitle">Measure health markers like heart rate (HR), respiratory rate (RR) and more in just 30 seconds via video scan.</div>'
+    '</div>'
+)
+
+INSTRUCTIONS = [
+    "Ensure good lighting for clear visibility.",
+    "Position your device's camera so it's level with your eyes.",
+    "Avoid talking or moving your head."
+]
+INSTRUCTION_ITEMS = tuple(
+    f'<div class="instruction-item"><div class="instruction-number">{i}</div><div>{instruction}</div></div>'
+    for i, instruction in enumerate(INSTRUCTIONS, 1)
+)
+
+SCENARIO_DESCRIPTION = (
+    '<div class="scenario-description">'
+    'This health assessment uses rPPG, computer vision, and advanced AI to build a full profile of your health markers.'
+    '<br><br>'
+    'Click <strong>START</strong> to take a 30 seconds video scan and get insights into your health.'
+    '</div>'
+)
+
+
+def section_title(title):
+    return f'<div class="section-title">{title}</div>'
+
+
+def metric_card(icon, label, value=None, unit=None):
+    """HTML of one metric card; `value` None shows the '--' placeholder."""
+    if value is None:
+        shown = '--'
+    else:
+        shown = f'{value:.0f}<span class="metric-unit"> {unit}</span>'
+    return f'<div class="metric-card"><div class="metric-icon">{icon}</div><div class="metric-label">{label}</div><div class="metric-value">{shown}</div></div>'
+
+
+# Markers the app does not measure yet, shown as placeholders under HR and RR
+PLACEHOLDER_CARDS = tuple(metric_card(icon, label) for icon, label in [
+    ("🩺", "Blood Pressure"),
+    ("📊", "Body Mass Index"),
+    ("💓", "Heart Rate Variability"),
+    ("📈", "Cardiac Stress Index"),
+])
+EMPTY_CARDS = (metric_card("❤️", "Heart Rate"), metric_card("🫁", "Breathing Rate")) + PLACEHOLDER_CARDS
@@ -0,0 +1,239 @@
+"""
+Headless batch analysis.
+Analyzes a folder or glob of recorded scans over a process pool and writes
+one JSONL or CSV row per video with HR, RR, rolling series, timings and
+errors. The number of decoded frame buffers in flight is bounded by an
+estimated memory budget.
+
+    python batch_cli.py scans/ --output results.jsonl --workers 4 --method POS
+    python batch_cli.py "scans/**/*.mp4" --format csv --output results.csv
+    python batch_cli.py scans/ --method POS --store results.sqlite3 --user clinic-a
+    python batch_cli.py group_scans/ --method POS --max-subjects 4  # one row per video, every face in `subjects`
+
+Runs offline with a local rPPG method (--method POS/CHROM/G) or against a
+local API stand-in (--api-url, see benchmarks/mock_api.py).
+"""
+
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from analysis import METHODS, analysis_settings, analyze_video, summarize_vitals
+from memstats import format_bytes
+from quality_gate import DEFAULT_THRESHOLDS, QualityGateError
+from results_store import ResultsStore
+from rppg_local import LOCAL_METHODS
+from video_loader import estimate_nbytes
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov')
+DEFAULT_MAX_IN_FLIGHT_BYTES = 4 * 1024 ** 3
+
+CSV_FIELDS = ['video', 'status', 'method', 'heart_rate', 'respiratory_rate', 'n_frames', 'fps',
+              'load_s', 'analyze_s', 'total_s', 'rolling_heart_rate', 'rolling_respiratory_rate', 'subjects', 'quality',
+              'error']
+
+
+def find_videos(inputs):
+    """Expand folders and globs into a sorted list of video files."""
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            candidates = glob.glob(os.path.join(item, '**', '*'), recursive=True)
+        else:
+            candidates = glob.glob(item, recursive=True)
+        paths.update(p for p in candidates if os.path.isfile(p) and p.lower().endswith(VIDEO_EXTENSIONS))
+    return sorted(paths)
+
+
+def _init_worker(env):
+    # Must run before vitallens is imported so API_URL overrides take effect
+    os.environ.update(env)
+
+
+def analyze_one(video_path, settings, api_key=None):
+    """Analyze a single video and return its output row. Never raises."""
+    row = {'video': video_path, 'status': 'ok', 'error': None}
+    start = time.perf_counter()
+    try:
+        result = analyze_video(video_path, settings, api_key=api_key)
+        row['method'] = result['method']
+        row.update(summarize_vitals(result['vital_signs']))
+        row.update(n_frames=result['n_frames'], fps=result['fps'], **result['timings'])
+        row['quality'] = result['quality'] and result['quality']['status']
+        if result['subjects']:
+            row['subjects'] = [dict(summarize_vitals(subject['vital_signs']), method=subject['method'],
+                                    box=subject['box'], start_s=subject['start_s'])
+                               for subject in result['subjects']]
+    except Exception as e:
+        row.update(status='error', error=f"{type(e).__name__}: {e}", total_s=time.perf_counter() - start)
+        if os.environ.get('BATCH_CLI_TRACEBACKS'):
+            row['traceback'] = traceback.format_exc()
+    return row
+
+
+def _threshold(item):
+    name, _, value = item.partition('=')
+    if name not in DEFAULT_THRESHOLDS:
+        raise argparse.ArgumentTypeError(f"unknown threshold {name!r} (choose from {', '.join(DEFAULT_THRESHOLDS)})")
+    try:
+        return name, float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{name} needs a number, got {value!r}") from None
+
+
+class _Writer:
+    def __init__(self, f, fmt, store=None, user=None):
+        self.f = f
+        self.fmt = fmt
+        self.store = store
+        self.user = user
+        if fmt == 'csv':
+            self.csv = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction='ignore')
+            self.csv.writeheader()
+
+    def write(self, row):
+        if self.fmt == 'csv':
+            row = dict(row)
+            for key in ('rolling_heart_rate', 'rolling_respiratory_rate', 'subjects'):
+                if row.get(key) is not None:
+                    row[key] = json.dumps(row[key])
+            self.csv.writerow(row)
+        else:
+            self.f.write(json.dumps(row) + '\n')
+        self.f.flush()
+        if self.store is not None and row['status'] == 'ok':
+            self.store.add(self.user, row)
+
+
+def run_batch(videos, settings, writer, workers=None, max_in_flight_bytes=DEFAULT_MAX_IN_FLIGHT_BYTES,
+              api_key=None, env=None, log=None):
+    """Analyze `videos` over a process pool and pass each row to `writer`.
+
+    A video is only submitted when its estimated frame buffer fits in the
+    remaining in-flight budget, except that one video is always allowed so
+    oversized files still make progress. Returns summary statistics.
+    """
+    pending = list(videos)
+    in_flight = {}
+    in_flight_bytes = 0
+    counts = {'ok': 0, 'error': 0}
+    rejected = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(env or {},)) as pool:
+        while pending or in_flight:
+            while pending:
+                try:
+                    estimate = estimate_nbytes(pending[0], settings['max_frames'], max_pixels=settings['max_pixels'],
+                                               target_fps=settings['target_fps'])
+                except IOError:
+                    estimate = 0  # let the worker report the error
+                if in_flight and in_flight_bytes + estimate > max_in_flight_bytes:
+                    break
+                video = pending.pop(0)
+                future = pool.submit(analyze_one, video, settings, api_key)
+                in_flight[future] = estimate
+                in_flight_bytes += estimate
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                in_flight_bytes -= in_flight.pop(future)
+                row = future.result()
+                counts[row['status']] += 1
+                rejected += (row['error'] or '').startswith(QualityGateError.__name__)
+                writer.write(row)
+                if log:
+                    log(f"[{counts['ok'] + counts['error']}/{len(videos)}] {row['status']:>5} {row['video']}"
+                        + (f" - {row['error']}" if row['error'] else ''))
+
+    elapsed = time.perf_counter() - start
+    return dict(counts, videos=len(videos), quality_rejected=rejected, elapsed_s=elapsed,
+                videos_per_s=len(videos) / elapsed if elapsed > 0 else 0.0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Analyze a directory of recorded scans")
+    parser.add_argument('inputs', nargs='+', help="Video files, folders or glob patterns")
+    parser.add_argument('--output', '-o', help="Output file (default: stdout)")
+    parser.add_argument('--format', choices=['jsonl', 'csv'], help="Output format (default: from extension, else jsonl)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument('--max-in-flight-mb', type=float, default=DEFAULT_MAX_IN_FLIGHT_BYTES / 1024 ** 2,
+                        help="Budget for decoded frame buffers across all workers")
+    parser.add_argument('--method', default='VITALLENS', choices=METHODS)
+    parser.add_argument('--fallback-method', choices=LOCAL_METHODS, help="Local method to use when the API fails")
+    parser.add_argument('--api-timeout', type=float, help="Seconds to wait for the API before falling back")
+    parser.add_argument('--mode', default='BATCH', choices=['BATCH', 'BURST'])
+    parser.add_argument('--max-frames', type=int, default=analysis_settings()['max_frames'])
+    parser.add_argument('--max-pixels', type=int, default=analysis_settings()['max_pixels'])
+    parser.add_argument('--decoder', default=analysis_settings()['decoder'], choices=['auto', 'cv2', 'av'])
+    parser.add_argument('--target-fps', type=float, default=analysis_settings()['target_fps'],
+                        help="Decimate faster videos to this frame rate (0 keeps every frame)")
+    parser.add_argument('--no-rolling', action='store_true', help="Skip rolling vitals")
+    parser.add_argument('--rolling-hr-window', type=float, default=analysis_settings()['rolling_hr_window_s'],
+                        help="Rolling heart rate window in seconds")
+    parser.add_argument('--rolling-rr-window', type=float, default=analysis_settings()['rolling_rr_window_s'],
+                        help="Rolling respiratory rate window in seconds")
+    parser.add_argument('--no-face-detection', action='store_true', help="Treat whole frames as the face ROI")
+    parser.add_argument('--no-roi-stage', action='store_true', help="Keep full frames instead of tracked face ROIs")
+    parser.add_argument('--max-subjects', type=int, default=1,
+                        help="Analyze up to this many faces per video from one decode pass")
+    parser.add_argument('--no-quality-gate', action='store_true', help="Analyze videos that fail the quality check too")
+    parser.add_argument('--no-frame-cache', action='store_true',
+                        help="Do not keep decoded tracks or frames for re-runs with other settings")
+    parser.add_argument('--quality-threshold', type=_threshold, action='append', default=[], metavar='NAME=VALUE',
+                        help="Override a quality gate threshold, e.g. min_brightness=30 (repeatable)")
+    parser.add_argument('--store', metavar='DB', help="Also record successful scans in this results store (SQLite)")
+    parser.add_argument('--user', default='batch', help="User the scans are recorded for with --store")
+    parser.add_argument('--api-key', default=os.environ.get('VITALLENS_API_KEY'))
+    parser.add_argument('--api-url', help="Base URL of a VitalLens-compatible API, e.g. a local stub")
+    args = parser.parse_args(argv)
+
+    videos = find_videos(args.inputs)
+    if not videos:
+        print("No videos found", file=sys.stderr)
+        return 1
+    if args.method == 'VITALLENS' and not args.api_key:
+        print("VITALLENS method needs --api-key or VITALLENS_API_KEY", file=sys.stderr)
+        return 1
+
+    settings = analysis_settings(
+        method=args.method, mode=args.mode, max_frames=args.max_frames, max_pixels=args.max_pixels,
+        target_fps=args.target_fps or None, decoder=args.decoder,
+        estimate_rolling_vitals=not args.no_rolling, detect_faces=not args.no_face_detection,
+        rolling_hr_window_s=args.rolling_hr_window, rolling_rr_window_s=args.rolling_rr_window,
+        roi_stage=not args.no_roi_stage, max_subjects=args.max_subjects, quality_gate=not args.no_quality_gate,
+        quality_thresholds=dict(args.quality_threshold) or None, frame_cache=not args.no_frame_cache,
+        fallback_method=args.fallback_method, api_timeout=args.api_timeout)
+    env = {}
+    if args.api_url:
+        base = args.api_url.rstrip('/')
+        env = {'API_URL': f"{base}/file", 'API_RESOLVE_URL': f"{base}/resolve-model"}
+
+    fmt = args.format or ('csv' if args.output and args.output.endswith('.csv') else 'jsonl')
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    store = ResultsStore(args.store) if args.store else None
+    try:
+        log = lambda msg: print(msg, file=sys.stderr)
+        stats = run_batch(videos, settings, _Writer(out, fmt, store, args.user), workers=args.workers,
+                          max_in_flight_bytes=int(args.max_in_flight_mb * 1024 ** 2),
+                          api_key=args.api_key, env=env, log=log)
+    finally:
+        if args.output:
+            out.close()
+        if store is not None:
+            store.close()
+
+    print(f"Analyzed {stats['videos']} videos ({stats['ok']} ok, {stats['error']} errors, "
+          f"{stats['quality_rejected']} of them rejected by the quality gate) in "
+          f"{stats['elapsed_s']:.1f}s - {stats['videos_per_s']:.2f} videos/s "
+          f"(in-flight budget {format_bytes(int(args.max_in_flight_mb * 1024 ** 2))})", file=sys.stderr)
+    return 0 if stats['error'] == 0 else 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""
+Bytes sent to the VitalLens API per scan, with and without payload reduction.
+
+Runs one scan against the local API stand-in per configuration and reads
+the request bytes it received. Each configuration runs in a fresh
+subprocess so the compression setting and client pool start clean. The
+client crops and resizes to the model input itself, so handing it the ROI
+crop ('roi crop') sends the same bytes as full frames and only saves
+client-side time and memory; the gzip request bodies of the default
+configuration are what reduce bandwidth. 'gzip rejected' runs the default
+against an endpoint that refuses gzip bodies, which must fall back to plain
+ones. Exits non-zero unless the default sends at least MIN_REDUCTION times
+fewer bytes than 'full frames', or if any configuration changes the heart
+rate. The synthetic clip is smoother than camera video, so gzip does better
+on it than on real scans.
+
+    python -m benchmarks.bench_api_payload --seconds 20 --width 1280 --height 720
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.mock_api import MockVitalLensAPI
+from memstats import format_bytes
+
+# compression None leaves VITALLENS_API_COMPRESSION unset, i.e. the default
+CONFIGS = {
+    'full frames': {'reduce': False, 'compression': '', 'accept_gzip': True},
+    'roi crop': {'reduce': True, 'compression': '', 'accept_gzip': True},
+    'default': {'reduce': True, 'compression': None, 'accept_gzip': True},
+    'gzip rejected': {'reduce': True, 'compression': None, 'accept_gzip': False},
+}
+MIN_REDUCTION = 10.0  # on the wire, 'default' against 'full frames'
+
+
+def _worker(video, reduce):
+    import logging
+    from analysis import analysis_settings, analyze_frames
+    from video_loader import load_video
+    logging.getLogger().setLevel(logging.WARNING)
+
+    loaded = load_video(video, max_frames=10 ** 6)
+    settings = analysis_settings(method='VITALLENS', mode='BURST', detect_faces=False, reduce_api_payload=reduce)
+    start = time.perf_counter()
+    vital_signs, _ = analyze_frames(loaded.frames, loaded.fps, settings, api_key='local')
+    print(json.dumps({
+        'frame_bytes': int(loaded.frames.nbytes),
+        'elapsed_s': time.perf_counter() - start,
+        'heart_rate': vital_signs['heart_rate']['value'],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--worker', action='store_true')
+    parser.add_argument('--reduce', action='store_true')
+    parser.add_argument('--video')
+    args = parser.parse_args()
+
+    if args.worker:
+        _worker(args.video, args.reduce)
+        return 0
+
+    from benchmarks.synthetic import write_synthetic_video
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.mp4')
+        write_synthetic_video(path, args.seconds, args.fps, args.width, args.height)
+        for label, config in CONFIGS.items():
+            with MockVitalLensAPI(accept_gzip=config['accept_gzip']) as api:
+                env = dict(os.environ, **api.env)
+                env.pop('VITALLENS_API_COMPRESSION', None)
+                if config['compression'] is not None:
+                    env['VITALLENS_API_COMPRESSION'] = config['compression']
+                cmd = [sys.executable, '-m', 'benchmarks.bench_api_payload', '--worker', '--video', path]
+                out = subprocess.run(cmd + (['--reduce'] if config['reduce'] else []),
+                                     env=env, capture_output=True, text=True, check=True)
+                results[label] = json.loads(out.stdout.strip().splitlines()[-1])
+                results[label]['wire_bytes'] = api.bytes_received
+
+    baseline = results['full frames']['wire_bytes']
+    print(f"decoded frames: {format_bytes(results['full frames']['frame_bytes'])}")
+    for label, r in results.items():
+        print(f"{label:>16}: {format_bytes(r['wire_bytes']):>10} on the wire "
+              f"({baseline / r['wire_bytes']:5.1f}x less than full frames), "
+              f"{r['elapsed_s']:.2f}s, HR {r['heart_rate']:.1f} bpm")
+
+    failed = False
+    reduction = baseline / results['default']['wire_bytes']
+    if reduction < MIN_REDUCTION:
+        print(f"FAIL: the default sends only {reduction:.1f}x fewer bytes than full frames "
+              f"(need {MIN_REDUCTION:g}x)")
+        failed = True
+    for label, r in results.items():
+        if abs(r['heart_rate'] - results['full frames']['heart_rate']) > 1.0:
+            print(f"FAIL: {label} changed the heart rate")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+Chart render time against rolling-series length.
+
+Renders one rolling heart-rate chart per series length, plotting every
+sample (the previous behaviour) and the min/max-decimated series from
+charts.py, and reports the decimation cost on its own. Exits non-zero if
+the decimated render time still grows with series length.
+
+    python -m benchmarks.bench_charts --lengths 1000 10000 100000 1000000
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from charts import MAX_POINTS, minmax_decimate, render_series_png
+
+# Allowed growth of the decimated render time from the shortest to the longest series
+MAX_GROWTH = 2.0
+
+
+def _time(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lengths', type=int, nargs='+', default=[1000, 10000, 100000, 1000000])
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    render_series_png(np.zeros(10), args.fps)  # font cache and backend setup
+    rows = []
+    print(f"{'samples':>9} {'full render':>12} {'decimated':>10} {'decimate':>9}")
+    for n in args.lengths:
+        series = 70 + 5 * np.sin(np.arange(n) / (args.fps * 20)) + rng.normal(0, 1, n)
+        full = _time(lambda: render_series_png(series, args.fps, 70, max_points=n), args.repeat)
+        dec = _time(lambda: render_series_png(series, args.fps, 70), args.repeat)
+        cut = _time(lambda: minmax_decimate(series, MAX_POINTS), args.repeat)
+        rows.append((n, full, dec, cut))
+        print(f"{n:>9} {full * 1000:>10.0f}ms {dec * 1000:>8.0f}ms {cut * 1000:>7.2f}ms")
+
+    growth = rows[-1][2] / rows[0][2]
+    if growth > MAX_GROWTH:
+        print(f"FAIL: decimated render grew {growth:.1f}x with series length (limit {MAX_GROWTH}x)")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+"""
+Per-request overhead of a pooled VitalLens client versus one client per call.
+
+Sends the same short clip to the local API stand-in repeatedly, once
+constructing a new client for every call (as the app used to on every
+START click) and once through client_pool, from several threads. Each
+variant runs in a fresh subprocess because the pool reroutes vitallens'
+HTTP calls process-wide. Exits non-zero if pooling is not faster.
+
+    python -m benchmarks.bench_client_pool --calls 40 --threads 4
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.mock_api import MockVitalLensAPI
+
+
+def _worker(variant, video, calls, threads):
+    import logging
+    from analysis import analysis_settings, create_vitallens
+    from client_pool import get_pool
+    from video_loader import load_video
+    logging.getLogger().setLevel(logging.WARNING)
+
+    frames = load_video(video, max_frames=10 ** 6).frames
+    settings = analysis_settings(method='VITALLENS', mode='BATCH', detect_faces=False)
+
+    def per_call(_):
+        return create_vitallens(settings, 'local')(frames, fps=30)
+
+    def pooled(_):
+        with get_pool().client(settings, 'local') as client:
+            return client(frames, fps=30)
+
+    fn = {'per-call': per_call, 'pooled': pooled}[variant]
+    fn(None)  # warm up imports and the first connection
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        list(executor.map(fn, range(calls)))
+    elapsed = time.perf_counter() - start
+    out = {'variant': variant, 'elapsed_s': elapsed}
+    if variant == 'pooled':
+        out['pool'] = get_pool().snapshot()
+    print(json.dumps(out))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--calls', type=int, default=40)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--worker', choices=['per-call', 'pooled'])
+    parser.add_argument('--video')
+    args = parser.parse_args()
+
+    if args.worker:
+        _worker(args.worker, args.video, args.calls, args.threads)
+        return 0
+
+    from benchmarks.synthetic import write_synthetic_video
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.mp4')
+        write_synthetic_video(path, args.seconds, 30, 160, 120)
+        for variant in ('per-call', 'pooled'):
+            with MockVitalLensAPI() as api:
+                out = subprocess.run(
+                    [sys.executable, '-m', 'benchmarks.bench_client_pool', '--worker', variant, '--video', path,
+                     '--calls', str(args.calls), '--threads', str(args.threads)],
+                    env=dict(os.environ, **api.env), capture_output=True, text=True, check=True)
+                results[variant] = json.loads(out.stdout.strip().splitlines()[-1])
+                results[variant].update(server_requests=api.requests, server_connections=api.connections)
+
+    for variant, r in results.items():
+        print(f"{variant:>9}: {r['elapsed_s'] / args.calls * 1000:7.1f} ms/call, "
+              f"{r['server_requests']} HTTP requests over {r['server_connections']} connections")
+    pool = results['pooled']['pool']
+    print(f"     pool: {pool['clients']} clients created for {pool['acquisitions']} acquisitions, "
+          f"{pool['waits']} waits (max {pool['wait_s_max'] * 1000:.1f} ms), "
+          f"connection reuse {pool['connection_reuse_rate']:.0%}")
+    saved = (results['per-call']['elapsed_s'] - results['pooled']['elapsed_s']) / args.calls
+    print(f"overhead saved: {saved * 1000:.1f} ms/call")
+    if saved <= 0:
+        print("FAIL: pooled client was not faster")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
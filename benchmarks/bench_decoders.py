@@ -0,0 +1,69 @@
+"""
+Decode throughput of the OpenCV and PyAV decoders on the same files.
+
+Writes synthetic clips at several resolutions and loads each one with
+decoder='cv2' (decode, cv2.resize, cvtColor) and decoder='av' (threaded
+decode, swscale straight to RGB), at full size and at the default pixel
+budget. Reports frames/s, the mean absolute pixel difference between the
+two decoders and which one 'auto' picks on this machine.
+
+    python -m benchmarks.bench_decoders --resolutions 1280x720 1920x1080 --seconds 5
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from video_loader import DECODERS, DEFAULT_MAX_PIXELS, benchmark_decoders, load_video, select_decoder
+
+
+def run(path, max_pixels, repeat):
+    rows = {}
+    frames = {}
+    for decoder in DECODERS:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            video = load_video(path, max_frames=10 ** 6, max_pixels=max_pixels, decoder=decoder)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+            frames[decoder] = video.frames
+        rows[decoder] = video.n_frames / best
+    diff = float(np.abs(frames['cv2'].astype(np.int16) - frames['av'].astype(np.int16)).mean())
+    return rows, diff
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--resolutions', nargs='+', default=['640x480', '1280x720', '1920x1080'])
+    parser.add_argument('--seconds', type=float, default=4)
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--repeat', type=int, default=2, help="Loads per configuration; the fastest counts")
+    args = parser.parse_args()
+
+    from benchmarks.synthetic import write_synthetic_video
+
+    print(f"{'clip':>10} {'scaling':>10} {'cv2 fps':>8} {'av fps':>8} {'av/cv2':>7} {'mean |diff|':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for resolution in args.resolutions:
+            width, height = (int(v) for v in resolution.split('x'))
+            path = os.path.join(tmp, f"{resolution}.mp4")
+            write_synthetic_video(path, args.seconds, args.fps, width, height)
+            for label, max_pixels in (('full', None), ('budget', DEFAULT_MAX_PIXELS)):
+                rows, diff = run(path, max_pixels, args.repeat)
+                print(f"{resolution:>10} {label:>10} {rows['cv2']:>8.0f} {rows['av']:>8.0f} "
+                      f"{rows['av'] / rows['cv2']:>6.2f}x {diff:>12.2f}")
+
+    startup = benchmark_decoders()
+    print(f"\nStartup benchmark on {os.cpu_count()} cores: "
+          + ", ".join(f"{k} {v:.0f} fps" for k, v in startup.items())
+          + f" -> decoder='auto' uses {select_decoder('auto')}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
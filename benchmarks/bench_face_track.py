@@ -0,0 +1,115 @@
+"""
+Full-frame analysis versus the face ROI stage.
+
+Analyzes the same synthetic clip with roi_stage off (every decoded frame is
+kept and faces are detected afterwards) and on (the face is detected on
+keyframes and tracked while decoding, so only skin ROI means and small API
+crops are kept), for a local method and for the API against the local mock.
+Reports load and analysis time, peak RSS and HR error, then the time it
+takes each path to reject a clip that has no face in it. The synthetic face
+is only found by the Haar cascade, so this needs the pinned OpenCV 4.x.
+
+    python -m benchmarks.bench_face_track --width 1280 --height 720 --seconds 20
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.mock_api import MockVitalLensAPI
+from memstats import format_bytes, reset_peak_rss
+
+HR_BPM = 72.0
+
+
+def _write_blank_video(path, seconds, fps, width, height):
+    import cv2
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    frame = np.full((height, width, 3), 90, dtype=np.uint8)
+    for _ in range(int(seconds * fps)):
+        writer.write(frame)
+    writer.release()
+
+
+def run(path, method, roi_stage):
+    from analysis import analysis_settings, analyze_video
+    # The vitallens face detector does not recognise the synthetic face, so the
+    # full-frame path treats the whole frame as the face (its cheapest setting)
+    settings = analysis_settings(method=method, roi_stage=roi_stage, detect_faces=roi_stage, frame_cache=False,
+                                 estimate_rolling_vitals=False)
+    reset_peak_rss()  # runs are sequential, so each can have the process high-water mark to itself
+    result = analyze_video(path, settings, api_key='bench')
+    hr = result['vital_signs']['heart_rate']['value']
+    return dict(result['timings'], method=method, roi_stage=roi_stage, n_frames=result['n_frames'],
+                peak_rss_bytes=result['peak_rss_bytes'], hr_error=abs(hr - HR_BPM))
+
+
+def time_to_reject(path, roi_stage):
+    from analysis import NoFaceDetectedError, analysis_settings, analyze_video
+    # The quality gate would reject the clip before either path starts; this times the paths themselves
+    settings = analysis_settings(method='POS', roi_stage=roi_stage, quality_gate=False, frame_cache=False)
+    start = time.perf_counter()
+    try:
+        analyze_video(path, settings, api_key='bench')
+    except NoFaceDetectedError:
+        return time.perf_counter() - start
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--methods', nargs='+', default=['POS', 'VITALLENS'])
+    args = parser.parse_args()
+
+    from benchmarks.synthetic import write_synthetic_video
+
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp, MockVitalLensAPI() as api:
+        os.environ.update(api.env)
+        face = os.path.join(tmp, 'face.mp4')
+        blank = os.path.join(tmp, 'blank.mp4')
+        write_synthetic_video(face, args.seconds, args.fps, args.width, args.height, hr_bpm=HR_BPM,
+                              features=True)
+        _write_blank_video(blank, args.seconds, args.fps, args.width, args.height)
+        # Full-frame runs go first so the ROI runs cannot profit from a higher RSS high-water mark
+        rows = [run(face, method, roi_stage) for method in args.methods for roi_stage in (False, True)]
+        reject = {roi_stage: time_to_reject(blank, roi_stage) for roi_stage in (False, True)}
+
+    print(f"{args.width}x{args.height}, {args.seconds:g} s at {args.fps:g} fps")
+    print(f"{'method':>10} {'path':>10} {'frames':>7} {'load s':>7} {'analyze s':>10} {'peak RSS':>10} {'HR err':>7}")
+    for r in rows:
+        path = 'roi' if r['roi_stage'] else 'full'
+        print(f"{r['method']:>10} {path:>10} {r['n_frames']:>7} {r['load_s']:>7.2f} {r['analyze_s']:>10.2f} "
+              f"{format_bytes(r['peak_rss_bytes']):>10} {r['hr_error']:>7.1f}")
+    print()
+
+    failures = []
+    for full, roi in zip(rows[::2], rows[1::2]):
+        print(f"{roi['method']}: {full['total_s'] / roi['total_s']:.1f}x faster, "
+              f"{full['peak_rss_bytes'] / roi['peak_rss_bytes']:.1f}x lower peak RSS with the ROI stage")
+        if roi['peak_rss_bytes'] > full['peak_rss_bytes']:
+            failures.append(f"{roi['method']}: ROI stage peaks above the full-frame path")
+        if roi['hr_error'] > 3:
+            failures.append(f"{roi['method']}: ROI stage HR error {roi['hr_error']:.1f} bpm")
+    for roi_stage, seconds in reject.items():
+        path = 'roi' if roi_stage else 'full'
+        if seconds is None:
+            failures.append(f"{path} path did not reject the clip without a face")
+        else:
+            print(f"No-face clip rejected by the {path} path after {seconds:.2f}s")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Re-analysis latency with the frame cache against decoding again.
+
+Analyzes a synthetic clip once with `--first` (which stores the decoded
+intermediate), then with each of `--methods` twice: from the frame cache,
+and with the cache off, which is what switching method cost before (quality
+gate, container probe, full decode and face tracking again). Runs on the
+face ROI stage and on full frames, reports load and total time per method,
+the speedup, the size of each cache entry and the heart rate of both runs,
+then fills a small cache past its cap to check eviction. VITALLENS runs
+against the mock API. Exits 1 when a re-analysis from the cache loads less
+than `--min-speedup` times faster, gives a different heart rate, or the
+capped cache ends up over its size.
+
+    python -m benchmarks.bench_frame_cache --seconds 30 --methods CHROM G VITALLENS
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.mock_api import MockVitalLensAPI
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def _hr(result):
+    return result['vital_signs'].get('heart_rate', {}).get('value')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=30)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--first', default='POS', help="Method of the first analysis")
+    parser.add_argument('--methods', nargs='+', default=['CHROM', 'G', 'VITALLENS'], help="Methods to re-analyze with")
+    parser.add_argument('--cache-mb', type=float, default=8192,
+                        help="Frame cache cap; one entry may take a quarter, and 30 s of full frames take 1.4 GB")
+    parser.add_argument('--api-latency', type=float, default=0.2, help="Mock API seconds per call")
+    parser.add_argument('--min-speedup', type=float, default=10.0, help="Required load time speedup of a cache hit")
+    parser.add_argument('--hr-tolerance', type=float, default=0.5, help="Allowed HR difference, hit vs decode, in bpm")
+    args = parser.parse_args()
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp, MockVitalLensAPI(latency=args.api_latency) as api:
+        os.environ.update(api.env)
+        os.environ['FRAME_CACHE_DIR'] = os.path.join(tmp, 'frame_cache')
+        os.environ['FRAME_CACHE_MAX_BYTES'] = str(int(args.cache_mb * 1024 ** 2))
+        from analysis import analysis_settings, analyze_video
+        from benchmarks.synthetic import write_synthetic_video
+        from frame_cache import FrameCache, _dir_bytes, file_hash, get_frame_cache, intermediate_key
+        from memstats import format_bytes
+
+        logging.disable(logging.WARNING)
+        path = os.path.join(tmp, 'scan.mp4')
+        write_synthetic_video(path, args.seconds, 30, args.width, args.height, features=True)
+        video_hash = file_hash(path)
+        cache = get_frame_cache()
+        print(f"{args.seconds:g} s clip at {args.width}x{args.height}; first analysis {args.first}, "
+              f"mock API {args.api_latency:g} s/call")
+        print(f"{'path':>11} {'method':>10} {'decode load s':>14} {'cached load s':>14} {'speedup':>8} "
+              f"{'decode total s':>15} {'cached total s':>15} {'HR decode':>10} {'HR cached':>10}")
+        entry_sizes = {}
+        for roi_stage in (True, False):
+            name = 'ROI stage' if roi_stage else 'full frame'
+            base = analysis_settings(mode='BATCH', roi_stage=roi_stage, detect_faces=roi_stage)
+            first, first_s = _timed(lambda: analyze_video(path, dict(base, method=args.first), api_key='bench'))
+            entry = os.path.join(cache.cache_dir, intermediate_key(video_hash, base))
+            entry_sizes[name] = (_dir_bytes(entry) if os.path.isdir(entry) else 0, first_s)
+            for method in args.methods:
+                settings = dict(base, method=method)
+                decoded, decoded_s = _timed(lambda: analyze_video(path, dict(settings, frame_cache=False),
+                                                                  api_key='bench'))
+                cached, cached_s = _timed(lambda: analyze_video(path, settings, api_key='bench'))
+                # Loading the video also covers the quality gate and the probe before it
+                decoded_load = decoded_s - decoded['timings']['analyze_s']
+                cached_load = cached_s - cached['timings']['analyze_s']
+                speedup = decoded_load / max(cached_load, 1e-9)
+                print(f"{name:>11} {method:>10} {decoded_load:>14.3f} {cached_load:>14.4f} {speedup:>7.0f}x "
+                      f"{decoded_s:>15.2f} {cached_s:>15.2f} {_hr(decoded):>10.1f} {_hr(cached):>10.1f}")
+                if cached['load_stats']['frame_cache'] != 'hit':
+                    failures.append(f"{name} {method}: re-analysis did not hit the frame cache"
+                                    + (" (entry over a quarter of --cache-mb)" if not entry_sizes[name][0] else ""))
+                elif speedup < args.min_speedup:
+                    failures.append(f"{name} {method}: cached load only {speedup:.1f}x faster than decoding")
+                if abs(_hr(cached) - _hr(decoded)) > args.hr_tolerance:
+                    failures.append(f"{name} {method}: HR {_hr(cached):.1f} from the cache, {_hr(decoded):.1f} decoded")
+        for name, (size, first_s) in entry_sizes.items():
+            print(f"{name} entry: {format_bytes(size)} on disk (first analysis {first_s:.2f}s)")
+
+        # Eviction: a cap of 2.5 ROI entries keeps the two most recently used
+        size = entry_sizes['ROI stage'][0]
+        capped = FrameCache(os.path.join(tmp, 'capped'), max_bytes=int(size * 2.5), registry=None)
+        capped.max_entry_bytes = capped.max_bytes
+        tracks = cache.get_tracks(intermediate_key(video_hash, analysis_settings()))
+        for i in range(5):
+            capped.put_tracks(f'entry-{i}', tracks)
+            capped.get_tracks('entry-0')  # keep the first one in use
+        kept = sorted(os.listdir(capped.cache_dir))
+        stats = capped.snapshot()
+        print(f"capped at {format_bytes(capped.max_bytes)}: kept {', '.join(kept)} "
+              f"({format_bytes(stats['bytes'])}), {stats['evictions']} evicted")
+        on_disk = sum(_dir_bytes(os.path.join(capped.cache_dir, name)) for name in kept)
+        if max(stats['bytes'], on_disk) > capped.max_bytes:
+            failures.append(f"capped cache holds {format_bytes(stats['bytes'])}, over {format_bytes(capped.max_bytes)}")
+        if kept != ['entry-0', 'entry-4']:
+            failures.append(f"eviction kept {kept} instead of the most recently used entries")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
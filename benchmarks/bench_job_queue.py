@@ -0,0 +1,135 @@
+"""
+Background job queue under concurrent submissions.
+
+Submits a burst of analyses of the same synthetic clip to a JobQueue with a
+fixed worker pool and reports queue wait, run time and the most jobs seen
+running at once, then cancels a job mid-decode and measures how long it
+takes to stop, and checks that submissions past `--max-queued` are refused.
+Exits 1 when the pool runs more jobs than it has workers, a job fails,
+cancellation takes longer than `--cancel-budget-s` or the queue never fills.
+
+    python -m benchmarks.bench_job_queue --jobs 8 --workers 2 --method POS
+"""
+
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.mock_api import MockVitalLensAPI
+
+
+class _Concurrency:
+    """Counts how many wrapped calls are in flight at once."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = 0
+        self.peak = 0
+
+    def __call__(self, video_path, settings, progress=None, cancel=None):
+        from analysis import analyze_video
+        with self.lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+        try:
+            return analyze_video(video_path, settings, api_key='bench', progress=progress, cancel=cancel)
+        finally:
+            with self.lock:
+                self.current -= 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--jobs', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--max-queued', type=int, default=4, help="Queue limit for the rejection check")
+    parser.add_argument('--method', default='POS')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=360)
+    parser.add_argument('--cancel-budget-s', type=float, default=1.0)
+    args = parser.parse_args()
+
+    from analysis import analysis_settings
+    from benchmarks.synthetic import write_synthetic_video
+    from job_queue import JobQueue, QueueFullError
+
+    logging.disable(logging.WARNING)
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp, MockVitalLensAPI() as api:
+        os.environ.update(api.env)
+        path = os.path.join(tmp, 'clip.mp4')
+        write_synthetic_video(path, args.seconds, args.fps, args.width, args.height, features=True)
+        settings = analysis_settings(method=args.method, estimate_rolling_vitals=False, frame_cache=False)
+
+        # Burst: every job is submitted at once, the pool drains them
+        body = _Concurrency()
+        jobs_queue = JobQueue(workers=args.workers, max_queued=args.jobs, registry=None)
+        start = time.perf_counter()
+        jobs = [jobs_queue.submit(body, path, settings, label=f'burst-{i}') for i in range(args.jobs)]
+        for job in jobs:
+            job.wait()
+        wall_s = time.perf_counter() - start
+        snapshots = [job.snapshot() for job in jobs]
+        jobs_queue.shutdown()
+
+        # Cancellation: stop a running job once it has started decoding
+        cancel_queue = JobQueue(workers=1, max_queued=args.max_queued, registry=None)
+        job = cancel_queue.submit(body, path, settings, label='cancel')
+        while job.frames is None and not job.done:
+            time.sleep(0.005)
+        cancelled_at = time.perf_counter()
+        job.cancel()
+        job.wait()
+        cancel_s = time.perf_counter() - cancelled_at
+        cancel_status = job.status
+
+        # Admission: one running job, `max_queued` waiting, the next one is refused
+        blocker = threading.Event()
+        cancel_queue.submit(lambda progress=None, cancel=None: blocker.wait(), label='blocker')
+        while cancel_queue.snapshot()['running'] == 0:
+            time.sleep(0.005)
+        rejected_after = None
+        for i in range(args.max_queued + 1):
+            try:
+                cancel_queue.submit(lambda progress=None, cancel=None: None, label=f'filler-{i}')
+            except QueueFullError:
+                rejected_after = i
+                break
+        blocker.set()
+        cancel_queue.shutdown()
+
+    waits = [s['wait_s'] for s in snapshots]
+    runs = [s['run_s'] for s in snapshots if s['run_s'] is not None]
+    print(f"{args.jobs} x {args.method} on {args.width}x{args.height}, {args.seconds:g} s, {args.workers} workers")
+    print(f"  wall time:        {wall_s:.2f}s ({args.jobs / wall_s:.2f} jobs/s)")
+    print(f"  queue wait:       mean {statistics.mean(waits):.2f}s, max {max(waits):.2f}s")
+    print(f"  run time:         median {statistics.median(runs):.2f}s")
+    print(f"  peak concurrency: {body.peak} (cap {args.workers})")
+    print(f"  cancel latency:   {cancel_s:.3f}s ({cancel_status})")
+    print(f"  queue full after: {rejected_after} queued (limit {args.max_queued})")
+
+    failed = [s for s in snapshots if s['status'] != 'done']
+    if failed:
+        failures.append(f"{len(failed)} jobs did not finish: {failed[0]['error'] or failed[0]['status']}")
+    if body.peak > args.workers:
+        failures.append(f"{body.peak} jobs ran at once with {args.workers} workers")
+    if cancel_status != 'cancelled':
+        failures.append(f"cancelled job ended as {cancel_status}")
+    elif cancel_s > args.cancel_budget_s:
+        failures.append(f"cancellation took {cancel_s:.2f}s, over the {args.cancel_budget_s:.2f}s budget")
+    if rejected_after != args.max_queued:
+        failures.append(f"queue refused a job after {rejected_after} queued, expected {args.max_queued}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
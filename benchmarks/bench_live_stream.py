@@ -0,0 +1,77 @@
+"""
+Live stream mode on a looping synthetic clip standing in for a camera.
+
+Runs LiveAnalyzer in real time and reports per-update latency, dropped
+frames and the HR/RR error against the embedded rates. Exits non-zero if
+the estimates are off or frames are being dropped.
+
+    python -m benchmarks.bench_live_stream --seconds 40 --width 640 --height 480
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+MAX_HR_ERROR_BPM = 3.0
+MAX_RR_ERROR_BPM = 3.0
+MAX_DROP_RATE = 0.05
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=40, help="How long to stream")
+    parser.add_argument('--clip-seconds', type=float, default=20, help="Length of the looped clip")
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--hr', type=float, default=72.0)
+    parser.add_argument('--rr', type=float, default=15.0)
+    parser.add_argument('--method', default='POS')
+    args = parser.parse_args()
+
+    from benchmarks.synthetic import write_synthetic_video
+    from live_stream import LiveAnalyzer
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'camera.mp4')
+        write_synthetic_video(path, args.clip_seconds, args.fps, args.width, args.height,
+                              hr_bpm=args.hr, rr_bpm=args.rr)
+        live = LiveAnalyzer(path, method=args.method, detect_faces=False, loop=True).start()
+        deadline = time.monotonic() + args.seconds
+        while live.running and time.monotonic() < deadline:
+            time.sleep(0.5)
+            live.poll()
+        live.stop()
+
+    if live.error:
+        print(f"FAIL: {live.error}")
+        return 1
+    m = live.metrics()
+    settled = [e for e in live.history if e['t'] >= live.buffer_s]
+    hr = np.median([e['heart_rate'] for e in settled]) if settled else float('nan')
+    rr = np.median([e['respiratory_rate'] for e in settled]) if settled else float('nan')
+    print(f"{m['frames_received']} frames, {m['frames_dropped']} dropped ({m['drop_rate']:.1%}), "
+          f"{m['updates']} updates")
+    print(f"update latency: mean {m['update_ms_mean']:.2f} ms, max {m['update_ms_max']:.2f} ms")
+    print(f"HR {hr:.1f} bpm (true {args.hr:.1f}), RR {rr:.1f} rpm (true {args.rr:.1f}) "
+          f"over {len(settled)} updates with a full buffer")
+
+    failed = False
+    if not abs(hr - args.hr) <= MAX_HR_ERROR_BPM:
+        print(f"FAIL: HR error above {MAX_HR_ERROR_BPM} bpm")
+        failed = True
+    if not abs(rr - args.rr) <= MAX_RR_ERROR_BPM:
+        print(f"FAIL: RR error above {MAX_RR_ERROR_BPM} rpm")
+        failed = True
+    if m['drop_rate'] > MAX_DROP_RATE:
+        print(f"FAIL: dropped more than {MAX_DROP_RATE:.0%} of frames")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Peak memory of the streaming loader versus the old list + np.array path.
+
+Each loader runs in a fresh subprocess so peak RSS readings do not leak
+between runs. Exits non-zero if the streaming loader holds noticeably more
+than one copy of the decoded video.
+
+    python -m benchmarks.bench_loader_memory --seconds 20 --width 1280 --height 720
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from memstats import current_rss_bytes, format_bytes, peak_rss_bytes, reset_peak_rss
+
+# Allowed peak above the post-import baseline, as a multiple of one video copy
+MAX_COPIES = 1.25
+
+
+def _load_with_list(path):
+    import cv2
+    import numpy as np
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    cap.release()
+    return np.array(frames)
+
+
+def _load_streaming(path):
+    from video_loader import load_video
+    return load_video(path, max_frames=10 ** 6).frames
+
+
+def _worker(loader, path):
+    import cv2  # noqa: F401  imported before the baseline reading
+    import numpy as np  # noqa: F401
+    baseline = current_rss_bytes()
+    reset_peak_rss()
+    frames = {'list': _load_with_list, 'streaming': _load_streaming}[loader](path)
+    print(json.dumps({
+        'loader': loader,
+        'video_bytes': int(frames.nbytes),
+        'peak_delta_bytes': peak_rss_bytes() - baseline,
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--worker', choices=['list', 'streaming'])
+    parser.add_argument('--video')
+    args = parser.parse_args()
+
+    if args.worker:
+        _worker(args.worker, args.video)
+        return 0
+
+    from benchmarks.synthetic import write_synthetic_video
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.mp4')
+        write_synthetic_video(path, args.seconds, args.fps, args.width, args.height)
+        results = {}
+        for loader in ('list', 'streaming'):
+            out = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_loader_memory', '--worker', loader, '--video', path],
+                capture_output=True, text=True, check=True)
+            results[loader] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    video_bytes = results['streaming']['video_bytes']
+    for loader, r in results.items():
+        copies = r['peak_delta_bytes'] / video_bytes
+        print(f"{loader:>10}: peak +{format_bytes(r['peak_delta_bytes'])} ({copies:.2f} copies of {format_bytes(video_bytes)})")
+
+    copies = results['streaming']['peak_delta_bytes'] / video_bytes
+    if copies > MAX_COPIES:
+        print(f"FAIL: streaming loader peaked at {copies:.2f} copies (limit {MAX_COPIES})")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
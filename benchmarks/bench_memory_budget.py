@@ -0,0 +1,131 @@
+"""
+Concurrent sessions against the process memory budget.
+
+Starts `--sessions` analyses of synthetic HD clips at once, as that many
+Streamlit sessions pressing START together would, on a job queue with one
+worker per session so nothing but the budget holds them back. Runs the
+burst with the budget off, then on, sampling the process's anonymous RSS
+(heap, not memory-mapped spill files) every few milliseconds, and reports
+the peak above the idle baseline, wall time and how each analysis was
+admitted. Full-frame buffers (the ROI stage off) make every analysis heavy
+by default; VITALLENS runs against the mock API. Exits 1 when the peak with
+the budget on exceeds the budget by more than `--tolerance`.
+
+    python -m benchmarks.bench_memory_budget --sessions 8 --budget-mb 800
+"""
+
+import argparse
+import collections
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.mock_api import MockVitalLensAPI
+
+
+class _PeakSampler:
+    """Tracks the highest anonymous RSS seen on a background thread."""
+
+    def __init__(self, interval_s=0.005):
+        from memstats import anon_rss_bytes
+        self.read = anon_rss_bytes
+        self.interval_s = interval_s
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.read())
+            time.sleep(self.interval_s)
+
+    def __enter__(self):
+        self.peak = self.read()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def _burst(paths, settings, sessions):
+    from analysis import analyze_video
+    from job_queue import JobQueue
+
+    jobs_queue = JobQueue(workers=sessions, max_queued=len(paths), registry=None)
+    start = time.perf_counter()
+    with _PeakSampler() as sampler:
+        jobs = [jobs_queue.submit(lambda path, progress=None, cancel=None:
+                                  analyze_video(path, settings, api_key='bench', progress=progress, cancel=cancel),
+                                  path, label=f'session-{i}') for i, path in enumerate(paths)]
+        for job in jobs:
+            job.wait()
+    wall_s = time.perf_counter() - start
+    jobs_queue.shutdown()
+    return jobs, sampler.peak, wall_s
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sessions', type=int, default=6)
+    parser.add_argument('--budget-mb', type=float, default=800)
+    parser.add_argument('--seconds', type=float, default=8)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--method', default='POS')
+    parser.add_argument('--roi-stage', action='store_true', help="Use the face ROI stage instead of full frames")
+    parser.add_argument('--skip-unbudgeted', action='store_true', help="Only run with the budget on")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="Allowed overshoot of the budget")
+    args = parser.parse_args()
+
+    budget_bytes = int(args.budget_mb * 1024 ** 2)
+    os.environ['MEMORY_BUDGET_BYTES'] = str(budget_bytes)
+    from analysis import analysis_settings, analyze_video
+    from benchmarks.synthetic import write_synthetic_video
+    from memory_budget import estimate_footprint
+    from memstats import anon_rss_bytes, format_bytes
+    from video_loader import probe_video
+
+    logging.disable(logging.WARNING)
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp, MockVitalLensAPI() as api:
+        os.environ.update(api.env)
+        paths = []
+        for i in range(args.sessions):
+            path = os.path.join(tmp, f'session-{i}.mp4')
+            write_synthetic_video(path, args.seconds, 30, args.width, args.height, seed=i, features=True)
+            paths.append(path)
+        base = analysis_settings(method=args.method, roi_stage=args.roi_stage, quality_gate=False, frame_cache=False,
+                                 detect_faces=args.roi_stage, decoder='cv2')
+        analyze_video(paths[0], dict(base, memory_budget=False), api_key='bench')  # load detectors and decoders once
+        footprint = estimate_footprint(probe_video(paths[0]), base)
+        baseline = anon_rss_bytes()
+
+        print(f"{args.sessions} sessions x {args.width}x{args.height}, {args.seconds:g} s, {args.method}"
+              f"{' (ROI stage)' if args.roi_stage else ' (full frames)'}; estimated {format_bytes(footprint.total)}"
+              f" each, budget {format_bytes(budget_bytes)}, idle heap {format_bytes(baseline)}")
+        runs = [('budget on', True)] if args.skip_unbudgeted else [('budget off', False), ('budget on', True)]
+        for name, enabled in runs:
+            jobs, peak, wall_s = _burst(paths, dict(base, memory_budget=enabled), args.sessions)
+            failed = [job for job in jobs if job.status != 'done']
+            decisions = collections.Counter(job.result['memory']['decision'] for job in jobs
+                                            if job.status == 'done' and job.result['memory'])
+            waits = [job.result['memory']['wait_s'] for job in jobs if job.status == 'done' and job.result['memory']]
+            over = peak - baseline
+            print(f"  {name:>10}: peak heap +{format_bytes(over)} ({over / budget_bytes:.0%} of budget), "
+                  f"wall {wall_s:.1f}s" + (f", {dict(decisions)}, max wait {max(waits):.1f}s" if decisions else ""))
+            if failed:
+                failures.append(f"{name}: {len(failed)} analyses did not finish: {failed[0].error}")
+            if enabled and over > budget_bytes * (1 + args.tolerance):
+                failures.append(f"peak heap {format_bytes(over)} is over the {format_bytes(budget_bytes)} budget")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""
+Multi-subject analysis cost against one analysis per person.
+
+Writes synthetic group clips with 1 to `--faces` faces in a grid, each with
+its own pulse, and analyzes each clip twice: with max_subjects=1, which is
+what analyzing a group costs per person today (one full decode and track
+each, so N people cost N times that), and with max_subjects=N, which
+decodes and detects once and follows every face in the same pass. Reports
+both times, their ratio and the heart rate error of every face against the
+rate it was rendered with. Then checks a two-face clip whose faces only
+appear `--late-s` in, which must give both faces, and one with no face,
+which must be rejected with NoFaceDetectedError. VITALLENS runs against the
+mock API with `--api-latency` per call. Exits 1 when a face is missed or
+off by more than `--hr-tolerance`, when a face beyond the first adds more
+than `--max-extra` of a single analysis, or when the late or faceless clip
+is not handled.
+
+    python -m benchmarks.bench_multi_subject --faces 4 --method POS
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.mock_api import MockVitalLensAPI
+
+
+def _tile_of(box, tiles):
+    cx, cy = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+    for i, (x0, y0, x1, y1) in enumerate(tiles):
+        if x0 <= cx < x1 and y0 <= cy < y1:
+            return i
+    return None
+
+
+def _value(subject):
+    return subject['vital_signs'].get('heart_rate', {}).get('value')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--faces', type=int, default=4, help="Largest group size; runs 1..faces")
+    parser.add_argument('--seconds', type=float, default=20)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--method', default='POS')
+    parser.add_argument('--api-latency', type=float, default=0.5, help="Mock API seconds per call")
+    parser.add_argument('--hr-tolerance', type=float, default=3.0, help="Allowed HR error in bpm")
+    parser.add_argument('--max-extra', type=float, default=0.5,
+                        help="Allowed cost of each face beyond the first, as a fraction of a single analysis")
+    parser.add_argument('--late-s', type=float, default=2.0, help="When the faces appear in the late-face clip")
+    args = parser.parse_args()
+
+    from analysis import analysis_settings, analyze_video
+    from benchmarks.synthetic import group_layout, write_group_video
+    from face_track import NoFaceDetectedError
+
+    logging.disable(logging.WARNING)
+    failures = []
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp, MockVitalLensAPI(latency=args.api_latency) as api:
+        os.environ.update(api.env)
+        base = analysis_settings(method=args.method, quality_gate=False, memory_budget=False, frame_cache=False)
+        # Load the detector and API client once so the first clip pays no setup
+        warm = os.path.join(tmp, 'warm.mp4')
+        write_group_video(warm, [72, 84], 2, 30, args.width, args.height)
+        analyze_video(warm, dict(base, max_subjects=2), api_key='bench')
+        for n in range(1, args.faces + 1):
+            hr_bpms = [60 + 12 * i for i in range(n)]
+            path = os.path.join(tmp, f'group-{n}.mp4')
+            write_group_video(path, hr_bpms, args.seconds, 30, args.width, args.height, seed=n)
+            tiles = group_layout(n, args.width, args.height)
+
+            start = time.perf_counter()
+            analyze_video(path, base, api_key='bench')
+            single_s = time.perf_counter() - start
+            start = time.perf_counter()
+            result = analyze_video(path, dict(base, max_subjects=n), api_key='bench')
+            multi_s = time.perf_counter() - start
+
+            subjects = result['subjects'] or [{'vital_signs': result['vital_signs'], 'box': [0, 0, 0, 0]}]
+            errors = {}
+            for subject in subjects:
+                tile = _tile_of(subject['box'], tiles) if n > 1 else 0
+                hr = subject['vital_signs'].get('heart_rate', {}).get('value')
+                if tile is not None and hr is not None:
+                    errors[tile] = abs(hr - hr_bpms[tile])
+            rows.append((n, single_s, multi_s, len(subjects), errors))
+            missed = sorted(set(range(n)) - set(errors))
+            if missed:
+                failures.append(f"{n} faces: no result for face(s) {', '.join(str(i + 1) for i in missed)}")
+            worst = max(errors.values(), default=0.0)
+            if worst > args.hr_tolerance:
+                failures.append(f"{n} faces: HR off by {worst:.1f} bpm")
+            if n > 1 and multi_s - single_s > args.max_extra * (n - 1) * single_s:
+                failures.append(f"{n} faces: each extra face added {(multi_s - single_s) / (n - 1):.2f}s "
+                                f"to a {single_s:.2f}s single analysis")
+
+        # Nothing to follow on the first frames: the tracker must wait for the faces, or give up without one
+        late = os.path.join(tmp, 'late.mp4')
+        hr_bpms = [66, 90]
+        tiles = group_layout(len(hr_bpms), args.width, args.height)
+        write_group_video(late, hr_bpms, args.seconds, 30, args.width, args.height, start_s=args.late_s)
+        result = analyze_video(late, dict(base, max_subjects=len(hr_bpms)), api_key='bench')
+        subjects = result['subjects'] or []
+        late_errors = [abs(_value(subject) - hr_bpms[_tile_of(subject['box'], tiles)])
+                       for subject in subjects
+                       if _value(subject) is not None and _tile_of(subject['box'], tiles) is not None]
+        late_row = (len(subjects), min((subject['start_s'] for subject in subjects), default=float('nan')),
+                    max(late_errors, default=float('nan')))
+        if len(late_errors) != len(hr_bpms):
+            failures.append(f"faces appearing at {args.late_s:g}s: {len(late_errors)} of {len(hr_bpms)} analyzed")
+        elif max(late_errors) > args.hr_tolerance:
+            failures.append(f"faces appearing at {args.late_s:g}s: HR off by {max(late_errors):.1f} bpm")
+        blank = os.path.join(tmp, 'blank.mp4')
+        write_group_video(blank, [72, 84], 8, 30, args.width, args.height, start_s=10)
+        try:
+            analyze_video(blank, dict(base, max_subjects=2), api_key='bench')
+            blank_outcome = "analyzed"
+            failures.append("clip without a face was analyzed")
+        except NoFaceDetectedError:
+            blank_outcome = "rejected, no face"
+        except Exception as e:
+            blank_outcome = f"{type(e).__name__}: {e}"
+            failures.append(f"clip without a face raised {blank_outcome}")
+
+    print(f"{args.seconds:g} s clips at {args.width}x{args.height}, {args.method}"
+          + (f" (mock API, {args.api_latency:g} s/call)" if args.method == 'VITALLENS' else ""))
+    print(f"{'faces':>5} {'single s':>9} {'N x single s':>13} {'multi s':>8} {'vs N x single':>14} "
+          f"{'per extra face s':>17} {'found':>6} {'max HR err':>11}")
+    for n, single_s, multi_s, found, errors in rows:
+        extra = f"{(multi_s - single_s) / (n - 1):.2f}" if n > 1 else "-"
+        print(f"{n:>5} {single_s:>9.2f} {n * single_s:>13.2f} {multi_s:>8.2f} {multi_s / (n * single_s):>14.0%} "
+              f"{extra:>17} {found:>6} {max(errors.values(), default=float('nan')):>11.1f}")
+    print(f"faces appearing at {args.late_s:g}s: {late_row[0]} found, first from {late_row[1]:.1f}s, "
+          f"max HR err {late_row[2]:.1f}; no face: {blank_outcome}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
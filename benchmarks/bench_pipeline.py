@@ -0,0 +1,70 @@
+"""
+End-to-end latency of pipelined versus serial windowed analysis.
+
+Runs the VITALLENS method against the local API stand-in with a fixed
+per-request latency, once decoding and analyzing each window in turn and
+once with decoding prefetched on a background thread. Exits non-zero if
+the two disagree or the pipeline is not faster.
+
+    python -m benchmarks.bench_pipeline --seconds 120 --latency 1.0
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.mock_api import MockVitalLensAPI
+from memstats import format_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=120)
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=480)
+    parser.add_argument('--latency', type=float, default=1.0, help="Seconds added to every API request")
+    parser.add_argument('--depth', type=int, default=2, help="Window buffers in the pipelined run")
+    args = parser.parse_args()
+
+    from benchmarks.synthetic import write_synthetic_video
+
+    with tempfile.TemporaryDirectory() as tmp, MockVitalLensAPI(latency=args.latency) as api:
+        # vitallens reads the API URLs on import
+        os.environ.update(api.env)
+        from analysis import analysis_settings, analyze_video_windowed
+        logging.getLogger().setLevel(logging.WARNING)
+
+        path = os.path.join(tmp, 'bench.mp4')
+        write_synthetic_video(path, args.seconds, args.fps, args.width, args.height)
+        settings = analysis_settings(method='VITALLENS', detect_faces=False, frame_cache=False)
+
+        results = {}
+        for label, depth in (('serial', 1), ('pipelined', args.depth)):
+            start = time.perf_counter()
+            result = analyze_video_windowed(path, settings, api_key='local', prefetch_depth=depth)
+            result['elapsed_s'] = time.perf_counter() - start
+            results[label] = result
+
+    for label, r in results.items():
+        t = r['timings']
+        print(f"{label:>10}: {r['elapsed_s']:6.2f}s end-to-end, {t['load_s']:6.2f}s waiting on decode, "
+              f"{t['analyze_s']:6.2f}s in inference, {len(r['vital_signs']['windows'])} windows, "
+              f"buffers {format_bytes(r['window_bytes'])}, HR {r['vital_signs']['heart_rate']['value']:.1f} bpm")
+
+    serial, pipelined = results['serial'], results['pipelined']
+    print(f"speedup: {serial['elapsed_s'] / pipelined['elapsed_s']:.2f}x")
+    if serial['vital_signs']['heart_rate']['value'] != pipelined['vital_signs']['heart_rate']['value']:
+        print("FAIL: pipelined and serial results differ")
+        return 1
+    if pipelined['elapsed_s'] >= serial['elapsed_s']:
+        print("FAIL: pipelined run was not faster")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
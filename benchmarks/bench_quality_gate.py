@@ -0,0 +1,105 @@
+"""
+Quality gate cost and the analysis time it saves.
+
+Writes a test set of synthetic clips (good, dim, jittery, shaky, very shaky,
+dark, overexposed and without a face), runs the quality gate on each and
+the full analysis with the gate off (VITALLENS against the mock API with
+`--api-latency` per call, or a local method), and reports each verdict and
+its metrics, the gate's time per clip, and the decode and inference time
+the rejections save net of the gate's cost on every clip. Exits 1 when a
+clip gets the wrong verdict or the gate takes longer than `--budget-s`.
+
+    python -m benchmarks.bench_quality_gate --width 1280 --height 720 --method POS
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.mock_api import MockVitalLensAPI
+
+# name: (write_synthetic_video options, expected verdict)
+CLIPS = {
+    'good': ({}, 'ok'),
+    'dim': ({'gain': 0.4}, 'warn'),
+    'jittery': ({'shake_px': 1}, 'ok'),
+    'shaky': ({'shake_px': 6}, 'warn'),
+    'very shaky': ({'shake_px': 20}, 'reject'),
+    'dark': ({'gain': 0.15}, 'reject'),
+    'overexposed': ({'gain': 1.8}, 'reject'),
+    'no face': ({'face': False}, 'reject'),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=360)
+    parser.add_argument('--method', default='VITALLENS')
+    parser.add_argument('--api-latency', type=float, default=0.5, help="Mock API seconds per call")
+    parser.add_argument('--budget-s', type=float, default=0.5, help="Slowest allowed gate run (after the first)")
+    args = parser.parse_args()
+
+    from analysis import analysis_settings, analyze_video
+    from benchmarks.synthetic import write_synthetic_video
+    from quality_gate import check_video
+
+    logging.disable(logging.WARNING)
+    failures = []
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp, MockVitalLensAPI(latency=args.api_latency) as api:
+        os.environ.update(api.env)
+        settings = analysis_settings(method=args.method, quality_gate=False, frame_cache=False)
+        # Warm up the detectors and the API client so no clip pays one-off loading
+        warm = os.path.join(tmp, 'warm.mp4')
+        write_synthetic_video(warm, 2, args.fps, args.width, args.height, features=True)
+        check_video(warm)
+        analyze_video(warm, settings, api_key='bench')
+        for name, (options, expected) in CLIPS.items():
+            path = os.path.join(tmp, f"{name.replace(' ', '_')}.mp4")
+            write_synthetic_video(path, args.seconds, args.fps, args.width, args.height, features=True, **options)
+            report = check_video(path)
+            start = time.perf_counter()
+            try:
+                result = analyze_video(path, settings, api_key='bench')
+                outcome = 'ok'
+                load_s, analyze_s = result['timings']['load_s'], result['timings']['analyze_s']
+            except Exception as e:
+                outcome = type(e).__name__
+                load_s, analyze_s = time.perf_counter() - start, 0.0
+            rows.append((name, expected, report, outcome, load_s, analyze_s))
+
+    print(f"{len(CLIPS)} clips of {args.seconds:g} s at {args.width}x{args.height}, {args.method}"
+          + (f" (mock API, {args.api_latency:g} s/call)" if args.method == 'VITALLENS' else ""))
+    print(f"{'clip':>12} {'verdict':>8} {'gate ms':>8} {'bright':>7} {'clipped':>8} {'motion':>7} {'face':>5}"
+          f" {'full analysis':>14} {'decode s':>9} {'infer s':>8}")
+    for name, expected, report, outcome, load_s, analyze_s in rows:
+        m = report.metrics
+        print(f"{name:>12} {report.status:>8} {report.elapsed_s * 1e3:>8.0f} {m['brightness']:>7.0f} "
+              f"{m['clipped']:>8.1%} {m['motion']:>7.2%} {m['face']:>5.0%} {outcome:>14} {load_s:>9.2f} {analyze_s:>8.2f}")
+        if report.status != expected:
+            failures.append(f"{name}: gate said {report.status}, expected {expected}")
+
+    gate_s = sum(r[2].elapsed_s for r in rows)
+    rejected = [r for r in rows if r[2].status == 'reject']
+    saved_decode = sum(r[4] for r in rejected)
+    saved_infer = sum(r[5] for r in rejected)
+    print(f"\nGate: {gate_s:.2f} s over {len(rows)} clips (max {max(r[2].elapsed_s for r in rows) * 1e3:.0f} ms, "
+          f"{max(r[2].frames_decoded for r in rows)} frames decoded per clip)")
+    print(f"Rejected {len(rejected)} clips, saving {saved_decode:.2f} s of decode and {saved_infer:.2f} s of inference; "
+          f"net {saved_decode + saved_infer - gate_s:.2f} s across the set")
+    slowest = max(r[2].elapsed_s for r in rows)
+    if slowest > args.budget_s:
+        failures.append(f"gate took {slowest:.2f}s, over the {args.budget_s:.2f}s budget")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Full-resolution versus reduced-resolution decode.
+
+Decodes the same synthetic clip at full resolution and scaled down to a
+pixel budget (cv2.resize and PyAV decoder-side scaling), then runs the
+local POS method on each result. Reports decode throughput, buffer size,
+inference time and how closely the reduced results agree with full size.
+
+    python -m benchmarks.bench_resize --width 3840 --height 2160 --seconds 5
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from memstats import format_bytes
+from video_loader import DEFAULT_MAX_PIXELS, load_video
+
+
+def _infer(frames, fps):
+    import vitallens
+    vl = vitallens.VitalLens(method=vitallens.Method.POS, detect_faces=False,
+                             estimate_rolling_vitals=False, export_to_json=False)
+    start = time.perf_counter()
+    results = vl(frames, fps=fps)
+    elapsed = time.perf_counter() - start
+    hr = results[0]['vital_signs'].get('heart_rate', {}).get('value') if results else None
+    return hr, elapsed
+
+
+def _green_trace(frames):
+    h, w = frames.shape[1:3]
+    roi = frames[:, h // 3:2 * h // 3, w // 3:2 * w // 3, 1]
+    return roi.reshape(len(frames), -1).mean(axis=1)
+
+
+def run(path, max_pixels):
+    configs = [
+        ('full', dict()),
+        ('cv2 resize', dict(max_pixels=max_pixels, decoder='cv2')),
+        ('av swscale', dict(max_pixels=max_pixels, decoder='av')),
+    ]
+    rows = []
+    reference = None
+    for name, kwargs in configs:
+        start = time.perf_counter()
+        video = load_video(path, max_frames=10 ** 6, **kwargs)
+        decode_s = time.perf_counter() - start
+        hr, infer_s = _infer(video.frames, video.fps)
+        trace = _green_trace(video.frames)
+        if reference is None:
+            reference = trace
+        rows.append({
+            'config': name,
+            'size': f"{video.frames.shape[2]}x{video.frames.shape[1]}",
+            'decode_fps': video.n_frames / decode_s,
+            'buffer_bytes': video.nbytes,
+            'infer_s': infer_s,
+            'heart_rate': hr,
+            'trace_corr': float(np.corrcoef(reference, trace)[0, 1]),
+        })
+        video.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--width', type=int, default=3840)
+    parser.add_argument('--height', type=int, default=2160)
+    parser.add_argument('--max-pixels', type=int, default=DEFAULT_MAX_PIXELS)
+    args = parser.parse_args()
+
+    from benchmarks.synthetic import write_synthetic_video
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.mp4')
+        write_synthetic_video(path, args.seconds, args.fps, args.width, args.height)
+        rows = run(path, args.max_pixels)
+
+    full = rows[0]
+    print(f"{'config':>12} {'size':>10} {'decode fps':>11} {'buffer':>10} {'infer s':>8} {'HR':>6} {'trace r':>8}")
+    for r in rows:
+        hr = f"{r['heart_rate']:.1f}" if r['heart_rate'] else '--'
+        print(f"{r['config']:>12} {r['size']:>10} {r['decode_fps']:>11.1f} {format_bytes(r['buffer_bytes']):>10} "
+              f"{r['infer_s']:>8.2f} {hr:>6} {r['trace_corr']:>8.4f}")
+    for r in rows[1:]:
+        print(f"{r['config']}: {full['buffer_bytes'] / r['buffer_bytes']:.1f}x less memory, "
+              f"{full['infer_s'] / r['infer_s']:.1f}x faster inference")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+Results store size and query latency at scale.
+
+Fills a fresh ResultsStore with synthetic scans (users spread over a year,
+each with rolling HR/RR series shaped like the sliding-window estimates)
+and reports insert throughput, bytes per scan, series compression against
+float64 and JSON, then p50/p95 latency of the lookups the app and exports
+use: a user's latest scans, a user/time-range query, an HR/RR trend, one
+scan's series and a one-user bulk export. Exits 1 when a lookup's p95 is over
+`--query-budget-ms` or decoded series drift by more than the 0.01 quantum.
+
+    python -m benchmarks.bench_results_store --scans 2000000 --users 20000
+"""
+
+import argparse
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from memstats import format_bytes
+from results_store import SCALE, ResultsStore, decode_series, encode_series
+
+YEAR_S = 365 * 24 * 3600
+
+
+def synthetic_series(rng, n, base, step):
+    """A slowly drifting rate, like the output of a sliding-window estimator."""
+    series = base + np.cumsum(rng.normal(0, step, n))
+    if rng.random() < 0.05:
+        series[:rng.integers(1, n // 4)] = np.nan  # warm-up gap before the first full window
+    return series
+
+
+def populate(store, rng, scans, users, series_len, batch_size=2000):
+    start_ts = time.time() - YEAR_S
+    pool = [(synthetic_series(rng, series_len, rng.uniform(55, 95), 0.03),
+             synthetic_series(rng, series_len, rng.uniform(10, 20), 0.01)) for _ in range(256)]
+    start = time.perf_counter()
+    for offset in range(0, scans, batch_size):
+        n = min(batch_size, scans - offset)
+        user_ids = rng.integers(0, users, n)
+        stamps = np.sort(rng.uniform(start_ts, start_ts + YEAR_S, n))
+        batch = []
+        for i in range(n):
+            hr, rr = pool[(offset + i) % len(pool)]
+            row = {'method': 'VITALLENS', 'fps': 30.0, 'n_frames': series_len,
+                   'heart_rate': float(np.nanmean(hr)), 'respiratory_rate': float(np.nanmean(rr)),
+                   'rolling_heart_rate': hr, 'rolling_respiratory_rate': rr}
+            batch.append((f'user-{user_ids[i]}', row, float(stamps[i])))
+        store.add_many(batch)
+    return time.perf_counter() - start, pool
+
+
+def latency_ms(fn, args_list):
+    times = []
+    for args in args_list:
+        start = time.perf_counter()
+        fn(*args)
+        times.append((time.perf_counter() - start) * 1e3)
+    times.sort()
+    return statistics.median(times), times[int(len(times) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scans', type=int, default=200000)
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--series-len', type=int, default=900, help="Samples per rolling series (30 s at 30 fps)")
+    parser.add_argument('--queries', type=int, default=200, help="Lookups per measurement")
+    parser.add_argument('--query-budget-ms', type=float, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'results.sqlite3')
+        store = ResultsStore(path)
+        insert_s, pool = populate(store, rng, args.scans, args.users, args.series_len)
+        stats = store.snapshot()
+
+        users = [f'user-{u}' for u in rng.integers(0, args.users, args.queries)]
+        now = time.time()
+        month = [(u, now - rng.uniform(30, 330) * 86400) for u in users]
+        latest = latency_ms(lambda u: store.query(user=u, limit=10), [(u,) for u in users])
+        ranged = latency_ms(lambda u, t: store.query(user=u, since=t, until=t + 30 * 86400), month)
+        trend = latency_ms(lambda u: store.trend(u, since=now - 90 * 86400), [(u,) for u in users])
+        scan_ids = [(int(i),) for i in rng.integers(1, args.scans + 1, args.queries)]
+        series = latency_ms(store.series, scan_ids)
+        export_users = users[:max(args.queries // 10, 1)]
+        export_start = time.perf_counter()
+        exported = sum(store.export(io.StringIO(), user=u) for u in export_users)
+        export_s = time.perf_counter() - export_start
+        count = store.count()
+        store.close()
+        db_bytes = sum(os.path.getsize(os.path.join(tmp, name)) for name in os.listdir(tmp))
+
+    # Round trip error and encoded size of the series pool
+    max_error = 0.0
+    encoded_bytes = json_bytes = 0
+    for hr, rr in pool:
+        for values in (hr, rr):
+            decoded = decode_series(encode_series(values))
+            finite = np.isfinite(values)
+            if not np.array_equal(finite, np.isfinite(decoded)):
+                max_error = float('inf')
+            else:
+                max_error = max(max_error, float(np.abs(decoded[finite] - values[finite]).max()))
+            encoded_bytes += len(encode_series(values))
+            json_bytes += len(json.dumps(np.where(finite, values, None).tolist()))
+    raw_bytes = len(pool) * 2 * args.series_len * 8
+
+    print(f"{count:,} scans, {args.users:,} users, 2 series x {args.series_len} samples each")
+    print(f"  insert:         {args.scans / insert_s:,.0f} scans/s ({insert_s:.1f}s)")
+    print(f"  database:       {format_bytes(db_bytes)} ({db_bytes / args.scans:,.0f} B/scan)")
+    print(f"  series:         {encoded_bytes / len(pool) / 2:,.0f} B each, {raw_bytes / encoded_bytes:.1f}x smaller than "
+          f"float64, {json_bytes / encoded_bytes:.1f}x smaller than JSON (max error {max_error:.4f})")
+    print(f"  export:         {exported / export_s:,.0f} scans/s with series ({exported} scans of {len(export_users)} users)")
+    print(f"{'lookup':>24} {'p50 ms':>8} {'p95 ms':>8}")
+    for name, (p50, p95) in [("latest 10 of a user", latest), ("user, 30 day range", ranged),
+                             ("user HR/RR trend, 90 d", trend), ("series of one scan", series)]:
+        print(f"{name:>24} {p50:>8.2f} {p95:>8.2f}")
+        if p95 > args.query_budget_ms:
+            failures.append(f"{name} p95 {p95:.1f} ms is over the {args.query_budget_ms:.1f} ms budget")
+    if max_error > 0.5 / SCALE + 1e-4:
+        failures.append(f"decoded series differ by up to {max_error:.4f}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
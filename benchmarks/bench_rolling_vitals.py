@@ -0,0 +1,135 @@
+"""
+Local rolling vitals versus the vitallens client's.
+
+Rolls synthetic pulse and respiration waveforms (rates drifting over the
+clip, plus noise) into per-frame HR/RR with the vitallens client's
+estimate_rolling_vitals and with rppg_local.rolling_vitals: batched FFTs
+over strided windows at a 0.5 s hop (the default), and windows at every
+sample by sliding DFT or by batched FFTs. Reports time per clip length,
+agreement with the vitallens series and error against the true rates, then
+the cost of re-rolling at other windows. Exits 1 when the local series drift
+from the vitallens series by more than `--max-diff-bpm` or the sliding DFT
+disagrees with per-window FFTs.
+
+    python -m benchmarks.bench_rolling_vitals --seconds 30 120 600
+"""
+
+import argparse
+import sys
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from rppg_local import (HR_BAND_HZ, ROLLING_HOP_S, ROLLING_RR_WINDOW_S, ROLLING_WINDOW_S, RR_BAND_HZ, rolling_rate,
+                        rolling_vitals, sliding_spectral_rate, spectral_rate)
+
+FULL_FFT_MAX_S = 120  # every-sample FFTs above this need gigabytes of spectra
+
+
+def synthetic_waveforms(seconds, fps, rng):
+    t = np.arange(int(seconds * fps)) / fps
+    hr = 65 + 20 * t / t[-1]  # bpm
+    rr = 12 + 4 * np.sin(2 * np.pi * t / max(seconds, 60))  # breaths/min
+    ppg = np.sin(2 * np.pi * np.cumsum(hr / 60) / fps) + 0.5 * rng.normal(size=t.size)
+    resp = np.sin(2 * np.pi * np.cumsum(rr / 60) / fps) + 0.3 * rng.normal(size=t.size)
+    return ppg, resp, hr, rr
+
+
+def vitallens_client(ppg, resp, fps):
+    from vitallens.signal import estimate_rolling_vitals
+    vital_signs = {}
+    estimate_rolling_vitals(vital_signs, {'ppg_waveform': ppg, 'respiratory_waveform': resp},
+                            {'ppg_waveform': np.ones_like(ppg), 'respiratory_waveform': np.ones_like(resp)},
+                            {'ppg_waveform', 'respiratory_waveform'}, fps, len(ppg) / fps)
+    return _rolled(vital_signs, len(ppg))
+
+
+def _rolled(vital_signs, n):
+    # Rates whose window is longer than the clip are not rolled
+    empty = {'data': np.full(n, np.nan)}
+    return (vital_signs.get('rolling_heart_rate', empty)['data'],
+            vital_signs.get('rolling_respiratory_rate', empty)['data'])
+
+
+def local(hop_s):
+    def roll(ppg, resp, fps):
+        vital_signs = rolling_vitals({'ppg_waveform': {'data': ppg, 'confidence': np.ones_like(ppg)},
+                                      'respiratory_waveform': {'data': resp, 'confidence': np.ones_like(resp)}},
+                                     fps, hop_s=hop_s)
+        return _rolled(vital_signs, len(ppg))
+    return roll
+
+
+def full_fft(ppg, resp, fps):
+    # Every window through the FFT path, for comparison with the sliding DFT
+    return (rolling_rate(ppg, fps, HR_BAND_HZ, ROLLING_WINDOW_S, hop_s=1 / fps)[0],
+            rolling_rate(resp, fps, RR_BAND_HZ, ROLLING_RR_WINDOW_S, hop_s=1 / fps)[0])
+
+
+def _median_abs_diff(a, b):
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    valid = np.isfinite(a) & np.isfinite(b)
+    return float(np.median(np.abs(a[valid] - b[valid]))) if valid.any() else float('nan')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, nargs='+', default=[30, 120, 600])
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--repeat', type=int, default=3, help="Runs per measurement; the fastest counts")
+    parser.add_argument('--max-diff-bpm', type=float, default=2.0,
+                        help="Largest allowed median difference from the vitallens series")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    engines = [('vitallens client', vitallens_client), ('FFT, 0.5 s hop', local(ROLLING_HOP_S)),
+               ('sliding DFT/sample', local(None)), ('FFT/sample', full_fft)]
+    failures = []
+    print(f"{'clip':>6} {'engine':>18} {'ms':>9} {'HR vs vitallens':>16} {'RR vs vitallens':>16} "
+          f"{'HR err':>7} {'RR err':>7}")
+    for seconds in args.seconds:
+        ppg, resp, hr_true, rr_true = synthetic_waveforms(seconds, args.fps, rng)
+        reference = None
+        for name, roll in engines:
+            if name == 'FFT/sample' and seconds > FULL_FFT_MAX_S:
+                continue
+            times = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                hr, rr = roll(ppg, resp, args.fps)
+                times.append(time.perf_counter() - start)
+            if reference is None:
+                reference = (hr, rr)
+            hr_diff, rr_diff = _median_abs_diff(hr, reference[0]), _median_abs_diff(rr, reference[1])
+            print(f"{seconds:>5g}s {name:>18} {min(times) * 1e3:>9.1f} {hr_diff:>16.2f} {rr_diff:>16.2f} "
+                  f"{_median_abs_diff(hr, hr_true):>7.2f} {_median_abs_diff(rr, rr_true):>7.2f}")
+            worst = np.nanmax([hr_diff, rr_diff, 0.0])
+            if name != 'vitallens client' and worst > args.max_diff_bpm:
+                failures.append(f"{seconds:g}s: {name} differs from vitallens by {worst:.2f} bpm")
+
+    # The sliding DFT must reproduce a zero-padded FFT of every window
+    ppg = synthetic_waveforms(min(args.seconds), args.fps, rng)[0]
+    window = int(ROLLING_WINDOW_S * args.fps)
+    sliding, _ = sliding_spectral_rate(ppg, args.fps, window)
+    direct, _ = spectral_rate(sliding_window_view(ppg, window), args.fps)
+    mismatch = int((sliding != direct).sum())
+    print(f"\nSliding DFT vs per-window FFT: {mismatch} of {len(direct)} windows differ")
+    if mismatch:
+        failures.append(f"sliding DFT differs from per-window FFTs in {mismatch} windows")
+
+    # Re-rolling a stored result at other windows, as the app's sliders do
+    ppg, resp, _, _ = synthetic_waveforms(max(args.seconds), args.fps, rng)
+    vital_signs = {'ppg_waveform': {'data': ppg}, 'respiratory_waveform': {'data': resp}}
+    for hr_window, rr_window in ((5, 20), (10, 30), (20, 60)):
+        start = time.perf_counter()
+        rolling_vitals(vital_signs, args.fps, hr_window, rr_window)
+        print(f"Re-roll {max(args.seconds):g}s at {hr_window}s/{rr_window}s windows: "
+              f"{(time.perf_counter() - start) * 1e3:.1f} ms")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
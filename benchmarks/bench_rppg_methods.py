@@ -0,0 +1,82 @@
+"""
+Throughput and accuracy of the local rPPG engines on one CPU core.
+
+Reports frames per second for ROI-mean extraction and for each signal
+engine (POS, CHROM, G) in rppg_local, next to the reference implementations
+shipped with vitallens, plus the heart-rate error on a synthetic clip with
+a known pulse.
+
+    python -m benchmarks.bench_rppg_methods --seconds 60 --hr 84
+"""
+
+import os
+
+# Pin BLAS/FFT thread pools to a single core before numpy is imported
+for _var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+    os.environ.setdefault(_var, '1')
+
+import argparse
+import sys
+import tempfile
+import time
+
+from rppg_local import LOCAL_METHODS, estimate_vitals, roi_means
+from video_loader import load_video
+
+
+def _best_of(fn, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=60)
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--width', type=int, default=320)
+    parser.add_argument('--height', type=int, default=240)
+    parser.add_argument('--hr', type=float, default=72.0, help="Embedded pulse rate in bpm")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--skip-reference', action='store_true', help="Do not time the vitallens implementations")
+    args = parser.parse_args()
+
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, {min(os.sched_getaffinity(0))})
+
+    from benchmarks.synthetic import write_synthetic_video
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.mp4')
+        write_synthetic_video(path, args.seconds, args.fps, args.width, args.height, hr_bpm=args.hr)
+        video = load_video(path, max_frames=10 ** 6, max_pixels=None)
+    frames, fps, n = video.frames, video.fps, video.n_frames
+
+    roi_s, rgb = _best_of(lambda: roi_means(frames), args.repeat)
+    print(f"{n} frames {args.width}x{args.height} @ {fps:.0f} fps, true HR {args.hr:.1f} bpm, 1 core")
+    print(f"{'roi means':>18}: {n / roi_s:>12,.0f} frames/s")
+
+    for method in LOCAL_METHODS:
+        t, vs = _best_of(lambda: estimate_vitals(rgb, fps, method), args.repeat)
+        hr = vs['heart_rate']['value']
+        print(f"{'local ' + method:>18}: {n / t:>12,.0f} frames/s  end-to-end {n / (t + roi_s):>10,.0f} frames/s"
+              f"  HR {hr:6.1f} (err {abs(hr - args.hr):.1f})")
+
+    if not args.skip_reference:
+        import vitallens
+        for method in LOCAL_METHODS:
+            vl = vitallens.VitalLens(method=vitallens.Method[method], detect_faces=False,
+                                     estimate_rolling_vitals=True, export_to_json=False)
+            t, results = _best_of(lambda: vl(frames, fps=fps), args.repeat)
+            hr = results[0]['vital_signs']['heart_rate']['value']
+            print(f"{'vitallens ' + method:>18}: {'':>12}           end-to-end {n / t:>10,.0f} frames/s"
+                  f"  HR {hr:6.1f} (err {abs(hr - args.hr):.1f})")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""
+Startup and rerun budget for the Streamlit app.
+
+Runs the app in a fresh process under Streamlit's AppTest and measures the
+time to import the app's top-level modules, the first page render (a cold
+start) and the median rerun, both idle and after a widget change. Also
+checks that heavy modules (cv2, numpy, matplotlib, vitallens) stay unloaded
+until a code path needs them. Exits 1 when any measurement is over budget.
+
+    python -m benchmarks.bench_startup --import-budget-s 0.5 --rerun-budget-ms 150
+
+AppTest re-parses the script on every run, which the Streamlit server does
+not, so rerun times here are an upper bound.
+"""
+
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, 'vitallens_streamlit_app.py')
+LAZY_MODULES = ('cv2', 'numpy', 'matplotlib', 'vitallens', 'av', 'scipy')
+
+
+def top_level_imports(path):
+    """Modules the script imports unconditionally: in its body or its top-level try blocks."""
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    body = list(tree.body)
+    for node in body:
+        if isinstance(node, ast.Try):
+            body.extend(node.body)
+    names = []
+    for node in body:
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0:
+            names.append(node.module)
+    return names
+
+
+def _median_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1e3
+
+
+def worker(repeat):
+    import importlib
+
+    import streamlit  # the framework's own import time is not the app's
+    from streamlit.testing.v1 import AppTest
+
+    sys.path.insert(0, ROOT)
+    start = time.perf_counter()
+    for name in top_level_imports(APP):
+        importlib.import_module(name)
+    import_s = time.perf_counter() - start
+
+    at = AppTest.from_file(APP, default_timeout=120)
+    at.secrets['VITALLENS_API_KEY'] = 'benchmark'
+    start = time.perf_counter()
+    at.run()
+    cold_start_s = time.perf_counter() - start
+    if at.exception:
+        raise RuntimeError(f"app raised: {at.exception[0].value}")
+
+    rerun_ms = _median_ms(at.run, repeat)
+    selector = next(s for s in at.selectbox if s.label == "Analysis method")
+    methods = iter(['POS', 'VITALLENS'] * repeat)
+    widget_rerun_ms = _median_ms(lambda: selector.set_value(next(methods)).run(), repeat)
+    loaded = sorted({name.split('.')[0] for name in sys.modules} & set(LAZY_MODULES))
+    print(json.dumps({'import_s': import_s, 'cold_start_s': cold_start_s, 'rerun_ms': rerun_ms,
+                      'widget_rerun_ms': widget_rerun_ms, 'heavy_modules_loaded': loaded}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--import-budget-s', type=float, default=0.5)
+    parser.add_argument('--cold-start-budget-s', type=float, default=1.0)
+    parser.add_argument('--rerun-budget-ms', type=float, default=150)
+    parser.add_argument('--repeat', type=int, default=10, help="Reruns per measurement; the median counts")
+    parser.add_argument('--output', '-o', help="Also write the measurements to this JSON file")
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.repeat)
+        return 0
+
+    # A fresh interpreter, so nothing is imported or cached yet
+    proc = subprocess.run([sys.executable, '-m', 'benchmarks.bench_startup', '--worker', '--repeat', str(args.repeat)],
+                          cwd=ROOT, capture_output=True, text=True)
+    if proc.returncode != 0:
+        print(proc.stderr[-2000:], file=sys.stderr)
+        print("FAIL: app did not start")
+        return 1
+    row = json.loads(proc.stdout.strip().splitlines()[-1])
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(row, f, indent=2)
+
+    checks = [
+        ('top-level imports', row['import_s'], args.import_budget_s, 's'),
+        ('cold start', row['cold_start_s'], args.cold_start_budget_s, 's'),
+        ('idle rerun', row['rerun_ms'], args.rerun_budget_ms, 'ms'),
+        ('widget rerun', row['widget_rerun_ms'], args.rerun_budget_ms, 'ms'),
+    ]
+    failures = []
+    for name, value, budget, unit in checks:
+        fmt = '.3f' if unit == 's' else '.1f'
+        print(f"{name:>18}: {value:{fmt}} {unit} (budget {budget:{fmt}} {unit})")
+        if value > budget:
+            failures.append(f"{name} took {value:{fmt}} {unit}, over the {budget:{fmt}} {unit} budget")
+    print(f"{'heavy modules':>18}: {', '.join(row['heavy_modules_loaded']) or 'none'} loaded before START")
+    if row['heavy_modules_loaded']:
+        failures.append(f"idle page loaded {', '.join(row['heavy_modules_loaded'])}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""
+Benchmark suite for the load -> convert -> analyze path.
+
+Generates synthetic face-like clips with a known pulse and breathing rate
+for every combination of resolution, length and frame rate, then runs the
+app's path on each in a fresh subprocess: load_video, then analyze_frames
+with the VITALLENS method against the local API stand-in and with a local
+rPPG method. Records decode fps, cvtColor cost, peak RSS, end-to-end
+latency and HR/RR error, and writes everything as JSON so runs can be
+compared across commits.
+
+    python -m benchmarks.bench_suite --output bench.json
+    python -m benchmarks.bench_suite --compare baseline.json bench.json
+"""
+
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.mock_api import MockVitalLensAPI
+
+RESOLUTIONS = {'480p': (640, 480), '720p': (1280, 720), '1080p': (1920, 1080)}
+HR_BPM = 72.0
+RR_BPM = 15.0
+# Metrics shown by --compare, with whether lower is better
+COMPARE_METRICS = {'decode_fps': False, 'cvt_ms_per_frame': True, 'peak_rss_bytes': True,
+                   'end_to_end_s': True, 'hr_error_bpm': True}
+
+
+def _cvt_ms_per_frame(frames, repeat=100):
+    """Cost of one BGR->RGB conversion at the decoded frame size."""
+    import cv2
+    src = frames[0].copy()
+    dst = src.copy()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        cv2.cvtColor(src, cv2.COLOR_BGR2RGB, dst=dst)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def _worker(video, engine, api_key):
+    import logging
+    from analysis import analysis_settings, analyze_frames
+    from memstats import peak_rss_bytes, reset_peak_rss
+    from video_loader import load_video
+    logging.getLogger().setLevel(logging.WARNING)
+
+    # Same settings the app's START handler uses
+    if engine == 'VITALLENS':
+        settings = analysis_settings(method=engine, mode='BURST', detect_faces=False, frame_cache=False)
+    else:
+        settings = analysis_settings(method=engine, detect_faces=False, frame_cache=False)
+    reset_peak_rss()
+    start = time.perf_counter()
+    loaded = load_video(video, max_frames=settings['max_frames'], max_pixels=settings['max_pixels'],
+                        target_fps=settings['target_fps'], decoder=settings['decoder'])
+    load_s = time.perf_counter() - start
+    row = {
+        'n_frames': loaded.n_frames,
+        'frame_size': [int(loaded.frames.shape[2]), int(loaded.frames.shape[1])],
+        'decode_fps': loaded.n_frames / load_s,
+        'load_s': load_s,
+        'cvt_ms_per_frame': _cvt_ms_per_frame(loaded.frames),
+    }
+    try:
+        t = time.perf_counter()
+        vital_signs, method = analyze_frames(loaded.frames, loaded.fps, settings, api_key=api_key)
+        row['analyze_s'] = time.perf_counter() - t
+        hr = vital_signs.get('heart_rate', {}).get('value')
+        rr = vital_signs.get('respiratory_rate', {}).get('value')
+        row.update(status='ok', method=method, heart_rate=hr, respiratory_rate=rr,
+                   hr_error_bpm=abs(hr - HR_BPM) if hr is not None else None,
+                   rr_error_bpm=abs(rr - RR_BPM) if rr is not None else None)
+    except Exception as e:
+        row.update(status='error', error=f"{type(e).__name__}: {e}")
+    row['end_to_end_s'] = time.perf_counter() - start
+    row['peak_rss_bytes'] = peak_rss_bytes()
+    loaded.close()
+    print(json.dumps(row))
+
+
+def _metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    import cv2
+    import numpy as np
+    return {
+        'commit': commit,
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+    }
+
+
+def run_suite(resolutions, lengths, fps_values, engines, api_latency, log):
+    from benchmarks.synthetic import write_synthetic_video
+
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp, MockVitalLensAPI(latency=api_latency) as api:
+        for resolution, seconds, fps in itertools.product(resolutions, lengths, fps_values):
+            width, height = RESOLUTIONS[resolution]
+            path = os.path.join(tmp, f"{resolution}_{seconds:g}s_{fps:g}fps.mp4")
+            write_synthetic_video(path, seconds, fps, width, height, hr_bpm=HR_BPM, rr_bpm=RR_BPM)
+            for engine in engines:
+                config = {'resolution': resolution, 'seconds': seconds, 'fps': fps, 'engine': engine}
+                out = subprocess.run(
+                    [sys.executable, '-m', 'benchmarks.bench_suite', '--worker', engine, '--video', path],
+                    env=dict(os.environ, **api.env), capture_output=True, text=True)
+                if out.returncode != 0:
+                    result = {'status': 'error', 'error': out.stderr.strip().splitlines()[-1:]}
+                else:
+                    result = json.loads(out.stdout.strip().splitlines()[-1])
+                runs.append({'config': config, 'result': result})
+                log(_summary_line(config, result))
+    return runs
+
+
+def _summary_line(config, r):
+    name = f"{config['resolution']:>5} {config['seconds']:>4g}s {config['fps']:>3g}fps {config['engine']:>9}"
+    if r.get('status') != 'ok':
+        return f"{name}: {r.get('error')}"
+    hr_err = f"{r['hr_error_bpm']:.1f}" if r['hr_error_bpm'] is not None else '-'
+    rr_err = f"{r['rr_error_bpm']:.1f}" if r['rr_error_bpm'] is not None else '-'
+    return (f"{name}: decode {r['decode_fps']:6.0f} fps, cvtColor {r['cvt_ms_per_frame']:.2f} ms/frame, "
+            f"peak {r['peak_rss_bytes'] / 1024 ** 2:6.0f} MB, end-to-end {r['end_to_end_s']:6.2f}s, "
+            f"HR err {hr_err}, RR err {rr_err}")
+
+
+def _key(run):
+    c = run['config']
+    return (c['resolution'], c['seconds'], c['fps'], c['engine'])
+
+
+def compare(baseline_path, current_path):
+    """Print per-config metric changes between two suite outputs."""
+    with open(baseline_path) as f:
+        baseline = {_key(r): r['result'] for r in json.load(f)['runs']}
+    with open(current_path) as f:
+        current = json.load(f)['runs']
+    regressions = 0
+    for run in current:
+        old = baseline.get(_key(run))
+        new = run['result']
+        if old is None or old.get('status') != 'ok' or new.get('status') != 'ok':
+            continue
+        changes = []
+        for metric, lower_is_better in COMPARE_METRICS.items():
+            a, b = old.get(metric), new.get(metric)
+            if not a or b is None:
+                continue
+            delta = (b - a) / a
+            worse = delta > 0.1 if lower_is_better else delta < -0.1
+            regressions += worse
+            changes.append(f"{metric} {delta:+.0%}{' !' if worse else ''}")
+        print(f"{' '.join(str(k) for k in _key(run))}: {', '.join(changes)}")
+    print(f"{regressions} metrics regressed by more than 10%")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--resolutions', nargs='+', default=['480p', '720p'], choices=list(RESOLUTIONS))
+    parser.add_argument('--lengths', type=float, nargs='+', default=[10, 20], help="Clip lengths in seconds")
+    parser.add_argument('--fps', type=float, nargs='+', default=[15, 30])
+    parser.add_argument('--engines', nargs='+', default=['VITALLENS', 'POS'])
+    parser.add_argument('--api-latency', type=float, default=0.0, help="Seconds added to every mock API request")
+    parser.add_argument('--output', '-o', help="Write JSON here (default: stdout)")
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'), help="Compare two suite outputs")
+    parser.add_argument('--worker')
+    parser.add_argument('--video')
+    args = parser.parse_args()
+
+    if args.worker:
+        _worker(args.video, args.worker, 'local')
+        return 0
+    if args.compare:
+        return 1 if compare(*args.compare) else 0
+
+    log = lambda msg: print(msg, file=sys.stderr)
+    runs = run_suite(args.resolutions, args.lengths, args.fps, args.engines, args.api_latency, log)
+    report = {'metadata': _metadata(), 'hr_bpm': HR_BPM, 'rr_bpm': RR_BPM, 'runs': runs}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return 0 if all(r['result'].get('status') == 'ok' for r in runs) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
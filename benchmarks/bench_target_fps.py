@@ -0,0 +1,104 @@
+"""
+Decoding every frame versus decimating to a target fps.
+
+Loads a synthetic 60 fps clip with and without `target_fps` (frames off the
+target grid are grab()bed but never retrieved or converted) and runs local
+POS on each result. Reports load throughput, buffer size, the seconds of
+video covered within `max_frames` and the HR error. A variable-frame-rate
+clip (alternating 60/30 fps) shows the timestamp-based picking keeping the
+sample spacing exact where the container's average fps does not.
+
+    python -m benchmarks.bench_target_fps --seconds 40 --max-frames 1800
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from memstats import format_bytes
+from rppg_local import analyze_frames_local
+from video_loader import load_video
+
+HR_BPM = 72.0
+
+
+def _load_and_analyze(path, max_frames, target_fps):
+    start = time.perf_counter()
+    video = load_video(path, max_frames=max_frames, target_fps=target_fps)
+    load_s = time.perf_counter() - start
+    vital_signs = analyze_frames_local(video.frames, video.fps, 'POS', detect_faces=False,
+                                       estimate_rolling_vitals=False)
+    hr = vital_signs['heart_rate']['value'] if vital_signs else None
+    row = {
+        'target_fps': target_fps,
+        'fps': video.fps,
+        'frames': video.n_frames,
+        'skipped': video.stats['frames_skipped'],
+        'load_s': load_s,
+        'buffer_bytes': video.nbytes,
+        'covered_s': video.n_frames / video.fps,
+        'heart_rate': hr,
+        'hr_error': abs(hr - HR_BPM) if hr is not None else None,
+    }
+    video.close()
+    return row
+
+
+def _print(title, rows):
+    print(title)
+    print(f"{'target':>7} {'fps':>6} {'frames':>7} {'skipped':>8} {'load s':>7} {'buffer':>10} {'covers':>7} {'HR err':>7}")
+    for r in rows:
+        target = f"{r['target_fps']:g}" if r['target_fps'] else 'all'
+        err = f"{r['hr_error']:.1f}" if r['hr_error'] is not None else '--'
+        print(f"{target:>7} {r['fps']:>6.1f} {r['frames']:>7} {r['skipped']:>8} {r['load_s']:>7.2f} "
+              f"{format_bytes(r['buffer_bytes']):>10} {r['covered_s']:>6.1f}s {err:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=40)
+    parser.add_argument('--fps', type=float, default=60)
+    parser.add_argument('--width', type=int, default=640)
+    parser.add_argument('--height', type=int, default=360)
+    parser.add_argument('--max-frames', type=int, default=1800)
+    parser.add_argument('--targets', type=float, nargs='+', default=[30, 15])
+    args = parser.parse_args()
+
+    from benchmarks.synthetic import write_synthetic_video, write_vfr_synthetic_video
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cfr = os.path.join(tmp, 'cfr.mp4')
+        vfr = os.path.join(tmp, 'vfr.mp4')
+        write_synthetic_video(cfr, args.seconds, args.fps, args.width, args.height, hr_bpm=HR_BPM)
+        write_vfr_synthetic_video(vfr, 20, (60, 30), width=args.width, height=args.height, hr_bpm=HR_BPM)
+        cfr_rows = [_load_and_analyze(cfr, args.max_frames, t) for t in [None] + args.targets]
+        vfr_rows = [_load_and_analyze(vfr, 10 ** 6, t) for t in (None, 30)]
+
+    _print(f"{args.seconds:g} s at {args.fps:g} fps, max_frames {args.max_frames}", cfr_rows)
+    print()
+    _print("20 s variable frame rate (60/30 fps segments)", vfr_rows)
+    print()
+
+    failures = []
+    full = cfr_rows[0]
+    for r in cfr_rows[1:]:
+        # Compare per second of video covered, since the full decode stops at max_frames
+        speedup = (full['load_s'] / full['covered_s']) / (r['load_s'] / r['covered_s'])
+        print(f"target {r['target_fps']:g} fps: {speedup:.1f}x faster load per video second, "
+              f"{full['buffer_bytes'] / full['covered_s'] / (r['buffer_bytes'] / r['covered_s']):.1f}x less memory "
+              f"per video second")
+        if speedup < 1.0:
+            failures.append(f"target {r['target_fps']:g} fps loads slower than decoding every frame")
+        if r['hr_error'] is None or r['hr_error'] > 3:
+            failures.append(f"target {r['target_fps']:g} fps HR error {r['hr_error']}")
+    if vfr_rows[1]['hr_error'] is None or vfr_rows[1]['hr_error'] > 3:
+        failures.append(f"VFR clip decimated to 30 fps: HR error {vfr_rows[1]['hr_error']}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,81 @@
+"""
+Peak memory of windowed analysis on a short versus a long video.
+
+Each run happens in a fresh subprocess so peak RSS readings do not leak
+between runs. Exits non-zero if the long video peaks well above the short
+one, i.e. if memory grows with video length instead of window length.
+
+    python -m benchmarks.bench_windowed_memory --short-seconds 30 --long-seconds 600
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from memstats import format_bytes
+
+# Allowed peak of the long run relative to the short run
+MAX_RATIO = 1.2
+
+
+def _worker(path, window_s, overlap_s):
+    from analysis import analysis_settings, analyze_video_windowed
+    settings = analysis_settings(method='POS', detect_faces=False, window_s=window_s, window_overlap_s=overlap_s)
+    result = analyze_video_windowed(path, settings)
+    print(json.dumps({
+        'n_frames': result['n_frames'],
+        'windows': len(result['vital_signs']['windows']),
+        'heart_rate': result['vital_signs']['heart_rate']['value'],
+        'window_bytes': result['window_bytes'],
+        'peak_rss_bytes': result['peak_rss_bytes'],
+        'total_s': result['timings']['total_s'],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--short-seconds', type=float, default=30)
+    parser.add_argument('--long-seconds', type=float, default=600)
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--width', type=int, default=320)
+    parser.add_argument('--height', type=int, default=240)
+    parser.add_argument('--window-s', type=float, default=20.0)
+    parser.add_argument('--overlap-s', type=float, default=5.0)
+    parser.add_argument('--worker', action='store_true')
+    parser.add_argument('--video')
+    args = parser.parse_args()
+
+    if args.worker:
+        _worker(args.video, args.window_s, args.overlap_s)
+        return 0
+
+    from benchmarks.synthetic import write_synthetic_video
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, seconds in (('short', args.short_seconds), ('long', args.long_seconds)):
+            path = os.path.join(tmp, f'{label}.mp4')
+            write_synthetic_video(path, seconds, args.fps, args.width, args.height)
+            out = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_windowed_memory', '--worker', '--video', path,
+                 '--window-s', str(args.window_s), '--overlap-s', str(args.overlap_s)],
+                capture_output=True, text=True, check=True)
+            results[label] = json.loads(out.stdout.strip().splitlines()[-1])
+
+    for label, r in results.items():
+        print(f"{label:>6}: {r['n_frames']} frames in {r['windows']} windows, HR {r['heart_rate']:.1f} bpm, "
+              f"window buffer {format_bytes(r['window_bytes'])}, peak RSS {format_bytes(r['peak_rss_bytes'])}, "
+              f"{r['total_s']:.1f}s")
+
+    ratio = results['long']['peak_rss_bytes'] / results['short']['peak_rss_bytes']
+    if ratio > MAX_RATIO:
+        print(f"FAIL: long video peaked at {ratio:.2f}x the short video (limit {MAX_RATIO})")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
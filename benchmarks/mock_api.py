@@ -0,0 +1,184 @@
+"""
+Local stand-in for the VitalLens API.
+Implements the resolve-model and file endpoints used by the vitallens client
+(including gzip request bodies, unless accept_gzip is off) so the app, batch CLI and benchmarks can
+run offline. The returned pulse is the standardized green-channel mean of
+the frames that were sent, so results on synthetic videos are meaningful
+rather than random.
+
+    python -m benchmarks.mock_api --port 8765 --latency 0.2
+    API_URL=http://127.0.0.1:8765/vitallens-v3/file \\
+    API_RESOLVE_URL=http://127.0.0.1:8765/vitallens-v3/resolve-model python batch_cli.py ...
+"""
+
+import argparse
+import base64
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+INPUT_SIZE = 40
+N_INPUTS = 4
+STATE_SIZE = 256
+
+MODEL_CONFIG = {
+    'n_inputs': N_INPUTS,
+    'input_size': INPUT_SIZE,
+    'roi_method': 'upper_body_cropped',
+    'fps_target': 30,
+    'supported_vitals': ['ppg', 'resp', 'hr', 'rr'],
+}
+
+
+def _standardize(x):
+    x = x - x.mean()
+    std = x.std()
+    return x / std if std > 0 else x
+
+
+def _handler(server_state):
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive so clients can reuse connections
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def setup(self):
+            super().setup()
+            with server_state['lock']:
+                server_state['connections'] += 1
+
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _check_key(self):
+            if not self.headers.get('x-api-key'):
+                self._send_json(403, {'message': 'Missing API key'})
+                return False
+            return True
+
+        def do_GET(self):
+            with server_state['lock']:
+                server_state['requests'] += 1
+            if not self.path.split('?')[0].endswith('/resolve-model'):
+                self._send_json(404, {'message': 'Not found'})
+                return
+            if not self._check_key():
+                return
+            self._send_json(200, {'config': dict(MODEL_CONFIG), 'resolved_model': 'vitallens-2.0'})
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            raw = self.rfile.read(length)
+            with server_state['lock']:
+                server_state['requests'] += 1
+                server_state['bytes_received'] += len(raw)
+            if not self.path.endswith('/file'):
+                self._send_json(404, {'message': 'Not found'})
+                return
+            if not self._check_key():
+                return
+            if server_state['latency'] > 0:
+                time.sleep(server_state['latency'])
+            if self.headers.get('Content-Encoding') == 'gzip':
+                if not server_state['accept_gzip']:
+                    self._send_json(415, {'message': 'Unsupported Content-Encoding'})
+                    return
+                raw = gzip.decompress(raw)
+            payload = json.loads(raw)
+            frames = np.frombuffer(base64.b64decode(payload['video']), dtype=np.uint8)
+            frames = frames.reshape(-1, INPUT_SIZE, INPUT_SIZE, 3).astype(np.float32)
+            green = frames[..., 1].mean(axis=(1, 2))
+            brightness = frames.mean(axis=(1, 2, 3))
+            if 'state' in payload:
+                # Frames carried over from the previous burst are not returned again
+                green, brightness = green[N_INPUTS - 1:], brightness[N_INPUTS - 1:]
+            n = len(green)
+            self._send_json(200, {
+                'vital_signs': {
+                    'ppg_waveform': {'data': _standardize(green).tolist(), 'confidence': [1.0] * n},
+                    'respiratory_waveform': {'data': _standardize(brightness).tolist(), 'confidence': [1.0] * n},
+                },
+                'face': {'confidence': [1.0] * n},
+                'state': {'data': [0.0] * STATE_SIZE},
+            })
+
+    return Handler
+
+
+class MockVitalLensAPI:
+    """Threaded mock API server; use as a context manager or call start()/stop()."""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, accept_gzip=True):
+        self.state = {'lock': threading.Lock(), 'latency': latency, 'accept_gzip': accept_gzip, 'requests': 0,
+                      'connections': 0, 'bytes_received': 0}
+        self.server = ThreadingHTTPServer((host, port), _handler(self.state))
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/vitallens-v3"
+
+    @property
+    def env(self):
+        """Environment variables that point the vitallens client at this server."""
+        return {'API_URL': f"{self.base_url}/file", 'API_RESOLVE_URL': f"{self.base_url}/resolve-model"}
+
+    @property
+    def bytes_received(self):
+        return self.state['bytes_received']
+
+    @property
+    def requests(self):
+        return self.state['requests']
+
+    @property
+    def connections(self):
+        """TCP connections accepted; fewer than `requests` means keep-alive reuse."""
+        return self.state['connections']
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the VitalLens API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="Seconds added to every /file request")
+    args = parser.parse_args()
+    api = MockVitalLensAPI(args.host, args.port, args.latency)
+    for name, value in api.env.items():
+        print(f"{name}={value}")
+    try:
+        api.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""
+Synthetic test videos.
+Writes face-like clips with a known pulse and breathing modulation so the
+benchmarks can run without recorded scans.
+"""
+
+import cv2
+import numpy as np
+
+SKIN_BGR = np.array([120, 150, 200], dtype=np.float32)
+BACKGROUND_BGR = np.array([60, 60, 60], dtype=np.float32)
+FEATURE_BGR = np.array([40, 50, 70], dtype=np.float32)
+
+
+def face_mask(width, height):
+    """Float mask of a centred face-sized ellipse."""
+    yy, xx = np.mgrid[0:height, 0:width].astype(np.float32)
+    cx, cy = width / 2, height / 2
+    rx, ry = width * 0.18, height * 0.30
+    return (((xx - cx) / rx) ** 2 + ((yy - cy) / ry) ** 2 <= 1.0).astype(np.float32)
+
+
+def draw_face_features(frame):
+    """Draw static eyes, brows, nose and mouth on the face ellipse, in place.
+
+    Enough structure for the OpenCV Haar face detector to find the face at
+    any aspect ratio; the pulse stays on the surrounding skin.
+    """
+    height, width = frame.shape[:2]
+    cx, cy = width / 2, height / 2
+    rx, ry = width * 0.18, height * 0.30
+    dark = FEATURE_BGR.tolist()
+    for side in (-1, 1):
+        ex, ey = int(cx + side * rx * 0.38), int(cy - ry * 0.22)
+        cv2.ellipse(frame, (ex, ey), (int(rx * 0.2), int(ry * 0.07)), 0, 0, 360, dark, -1)
+        cv2.ellipse(frame, (ex, int(ey - ry * 0.16)), (int(rx * 0.24), int(ry * 0.03)), 0, 0, 360, dark, -1)
+    cv2.ellipse(frame, (int(cx), int(cy + ry * 0.12)), (int(rx * 0.08), int(ry * 0.12)), 0, 0, 360, (90, 110, 150), -1)
+    cv2.ellipse(frame, (int(cx), int(cy + ry * 0.45)), (int(rx * 0.3), int(ry * 0.06)), 0, 0, 360, dark, -1)
+    return frame
+
+
+def synthetic_frame(t, mask, hr_bpm=72.0, rr_bpm=15.0, pulse_amplitude=2.0, rng=None):
+    """Render one BGR frame at time `t` seconds."""
+    pulse = pulse_amplitude * np.sin(2 * np.pi * hr_bpm / 60.0 * t)
+    breath = 3.0 * np.sin(2 * np.pi * rr_bpm / 60.0 * t)
+    # Pulse mostly modulates the green channel, breathing the overall brightness
+    skin = SKIN_BGR + np.array([0.4, 1.0, 0.6], dtype=np.float32) * pulse + breath
+    frame = BACKGROUND_BGR + mask[..., None] * (skin - BACKGROUND_BGR)
+    if rng is not None:
+        frame += rng.normal(0, 1.0, frame.shape).astype(np.float32)
+    return np.clip(frame, 0, 255).astype(np.uint8)
+
+
+def write_synthetic_video(path, seconds=10, fps=30, width=640, height=480,
+                          hr_bpm=72.0, rr_bpm=15.0, seed=0, features=False, gain=1.0, shake_px=0.0, face=True):
+    """Write a synthetic clip to `path` and return the number of frames written.
+
+    With `features`, the face gets eyes and a mouth (draw_face_features) so
+    face detectors find it. `gain` scales the brightness, `shake_px` moves
+    each frame by a random offset up to that many pixels, and `face=False`
+    leaves only the background, for clips a quality check should reject.
+    """
+    n_frames = int(round(seconds * fps))
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise IOError(f"Could not open video writer for {path}")
+    mask = face_mask(width, height) * face
+    rng = np.random.default_rng(seed)
+    try:
+        for i in range(n_frames):
+            frame = synthetic_frame(i / fps, mask, hr_bpm, rr_bpm, rng=rng)
+            if features and face:
+                draw_face_features(frame)
+            if shake_px:
+                dx, dy = rng.uniform(-shake_px, shake_px, 2)
+                frame = cv2.warpAffine(frame, np.float32([[1, 0, dx], [0, 1, dy]]), (width, height),
+                                       borderMode=cv2.BORDER_REPLICATE)
+            if gain != 1.0:
+                frame = cv2.convertScaleAbs(frame, alpha=gain)
+            writer.write(frame)
+    finally:
+        writer.release()
+    return n_frames
+
+
+def group_layout(n_faces, width, height):
+    """Tiles (x0, y0, x1, y1) of a near-square grid with one face per tile, row by row."""
+    cols = int(np.ceil(np.sqrt(n_faces)))
+    rows = int(np.ceil(n_faces / cols))
+    tile_w, tile_h = width // cols, height // rows
+    return [((i % cols) * tile_w, (i // cols) * tile_h, (i % cols + 1) * tile_w, (i // cols + 1) * tile_h)
+            for i in range(n_faces)]
+
+
+def write_group_video(path, hr_bpms, seconds=10, fps=30, width=1280, height=720, rr_bpms=None, seed=0,
+                      start_s=0.0):
+    """Write a clip with one face per tile of group_layout, each with its own pulse.
+
+    `hr_bpms` (and `rr_bpms`, default 15 for every face) give each face's
+    rates, in tile order. Faces have features so detectors find them, and
+    appear `start_s` into the clip (before that only the background shows).
+    Returns the number of frames written.
+    """
+    tiles = group_layout(len(hr_bpms), width, height)
+    rr_bpms = rr_bpms or [15.0] * len(hr_bpms)
+    n_frames = int(round(seconds * fps))
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise IOError(f"Could not open video writer for {path}")
+    masks = [face_mask(x1 - x0, y1 - y0) for x0, y0, x1, y1 in tiles]
+    rng = np.random.default_rng(seed)
+    frame = np.empty((height, width, 3), dtype=np.uint8)
+    try:
+        for i in range(n_frames):
+            frame[:] = BACKGROUND_BGR.astype(np.uint8)
+            if i < start_s * fps:
+                writer.write(frame)
+                continue
+            for (x0, y0, x1, y1), mask, hr_bpm, rr_bpm in zip(tiles, masks, hr_bpms, rr_bpms):
+                tile = synthetic_frame(i / fps, mask, hr_bpm, rr_bpm, rng=rng)
+                frame[y0:y1, x0:x1] = draw_face_features(tile)
+            writer.write(frame)
+    finally:
+        writer.release()
+    return n_frames
+
+
+def write_vfr_synthetic_video(path, seconds=10, rates=(60, 30), segment_s=2.0, width=640, height=480,
+                              hr_bpm=72.0, rr_bpm=15.0, seed=0):
+    """Write a variable-frame-rate clip that cycles through `rates` every `segment_s` seconds.
+
+    Frames carry their true presentation times, as phone recordings do.
+    Returns the number of frames written.
+    """
+    import fractions
+
+    import av
+
+    container = av.open(path, 'w')
+    stream = container.add_stream('mpeg4', rate=max(rates))
+    stream.width, stream.height = width, height
+    stream.pix_fmt = 'yuv420p'
+    time_base = fractions.Fraction(1, 1000)
+    stream.codec_context.time_base = time_base
+    mask = face_mask(width, height)
+    rng = np.random.default_rng(seed)
+    t = 0.0
+    n_frames = 0
+    try:
+        while t < seconds:
+            bgr = synthetic_frame(t, mask, hr_bpm, rr_bpm, rng=rng)
+            frame = av.VideoFrame.from_ndarray(bgr, format='bgr24')
+            frame.pts = int(round(t * 1000))
+            frame.time_base = time_base
+            container.mux(stream.encode(frame))
+            n_frames += 1
+            t += 1.0 / rates[int(t // segment_s) % len(rates)]
+        container.mux(stream.encode())
+    finally:
+        container.close()
+    return n_frames
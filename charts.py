@@ -0,0 +1,67 @@
+"""
+Chart rendering for rolling vital series.
+Series carry one sample per frame, so they are min/max-decimated to at
+most MAX_POINTS before plotting, and figures are rendered straight to PNG
+bytes with the object-oriented matplotlib API (no pyplot global state) so
+the caller can cache the image.
+"""
+
+import io
+
+import numpy as np
+
+MAX_POINTS = 2000
+
+
+def minmax_decimate(y, max_points=MAX_POINTS):
+    """Indices of a min/max-decimated view of `y`.
+
+    Splits `y` into max_points // 2 buckets and keeps the minimum and
+    maximum of each, in time order, so peaks and dips survive. NaN gaps
+    are kept as NaN where a whole bucket is missing.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    if n <= max_points:
+        return np.arange(n)
+    n_buckets = max(max_points // 2, 1)
+    size = -(-n // n_buckets)  # ceil
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:n] = y
+    buckets = padded.reshape(n_buckets, size)
+    finite = np.isfinite(buckets)
+    lo = np.where(finite, buckets, np.inf).argmin(axis=1)
+    hi = np.where(finite, buckets, -np.inf).argmax(axis=1)
+    offsets = np.arange(n_buckets) * size
+    idx = np.stack([np.minimum(lo, hi), np.maximum(lo, hi)], axis=1) + offsets[:, None]
+    idx = idx.ravel()
+    return np.unique(idx[idx < n])
+
+
+def decimated(y, fps, max_points=MAX_POINTS):
+    """(time_s, values) of `y` decimated to at most `max_points`."""
+    idx = minmax_decimate(y, max_points)
+    return idx / fps, np.asarray(y, dtype=float)[idx]
+
+
+def render_series_png(y, fps, global_value=None, color='#ef4444', line_color='#dc2626',
+                      ylabel='', max_points=MAX_POINTS):
+    """Render a rolling series chart in the app's style and return PNG bytes."""
+    from matplotlib.figure import Figure
+
+    t, values = decimated(y, fps, max_points)
+    fig = Figure(figsize=(7, 4), facecolor='white')
+    ax = fig.subplots()
+    ax.plot(t, values, color=color, linewidth=2.5)
+    if global_value:
+        ax.axhline(y=global_value, color=line_color, linestyle='--', linewidth=1.5, alpha=0.7)
+    ax.set_xlabel("Time (seconds)", fontsize=10)
+    ax.set_ylabel(ylabel, fontsize=10)
+    ax.grid(True, alpha=0.2, linestyle='-', linewidth=0.5)
+    ax.spines['top'].set_visible(False)
+    ax.spines['right'].set_visible(False)
+    fig.tight_layout()
+    buf = io.BytesIO()
+    # Same output settings as st.pyplot
+    fig.savefig(buf, format='png', dpi=200, bbox_inches='tight')
+    return buf.getvalue()
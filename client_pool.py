@@ -0,0 +1,276 @@
+"""
+Process-wide pool of VitalLens clients.
+Constructing a VitalLens client resolves the model config over HTTP and,
+with face detection, loads the detector model, so clients are kept and
+handed out per (method, mode, face detection, rolling vitals, API key)
+instead of being rebuilt for every analysis. A client is used by one
+caller at a time because burst mode keeps per-stream state.
+
+All API traffic from vitallens goes through one shared requests.Session
+so keep-alive connections are reused across calls and sessions. Request
+bodies are gzipped by default; if the endpoint rejects a gzip body, the
+request is sent again uncompressed and the session stops compressing.
+Bytes sent are counted for the process and, within count_bytes_sent(), for
+one caller.
+"""
+
+import concurrent.futures
+import contextlib
+import contextvars
+import gzip
+import json as _json
+import logging
+import os
+import threading
+import time
+import types
+from collections import defaultdict
+
+from metrics import stage
+
+DEFAULT_POOL_SIZE = int(os.environ.get('VITALLENS_POOL_SIZE', 4))
+# 'gzip' (default) compresses API request bodies; set it empty to send plain JSON
+API_COMPRESSION = os.environ.get('VITALLENS_API_COMPRESSION', 'gzip') or None
+# Statuses an endpoint that does not take Content-Encoding: gzip answers a gzip body with
+REJECTED_ENCODING_STATUSES = (400, 415)
+
+_byte_count = contextvars.ContextVar('api_byte_count', default=None)
+
+
+class _ByteCount:
+    def __init__(self):
+        self.bytes = 0
+        self._lock = threading.Lock()
+
+    def add(self, n):
+        with self._lock:
+            self.bytes += n
+
+
+@contextlib.contextmanager
+def count_bytes_sent():
+    """Count the request body bytes sent by the block; yields an object whose `bytes` is the total.
+
+    Requests from other threads are not counted unless they run in a copy of
+    the block's context, as the vitallens client's batch threads do.
+    """
+    count = _ByteCount()
+    token = _byte_count.set(count)
+    try:
+        yield count
+    finally:
+        _byte_count.reset(token)
+
+
+class _ContextThreadPoolExecutor(concurrent.futures.ThreadPoolExecutor):
+    """Runs each task in the submitter's context, so the client's batch requests are counted."""
+
+    def submit(self, fn, /, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class _SessionRequests:
+    """Stands in for the `requests` module inside vitallens and routes calls through a Session.
+
+    Counts request body bytes and, with compression='gzip', sends gzip
+    encoded bodies, falling back to plain ones for good if the endpoint
+    rejects them.
+    """
+
+    def __init__(self, session, compression=None):
+        import requests
+        self._requests = requests
+        self.session = session
+        self.compression = compression
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def _post(self, url, data, headers, **kwargs):
+        n = len(data) if data is not None else 0
+        with self._lock:
+            self.bytes_sent += n
+        count = _byte_count.get()
+        if count is not None:
+            count.add(n)
+        return self.session.post(url, data=data, headers=headers, **kwargs)
+
+    def post(self, url, json=None, headers=None, **kwargs):
+        headers = dict(headers or {})
+        if json is None:
+            return self._post(url, kwargs.pop('data', None), headers, **kwargs)
+        data = _json.dumps(json).encode()
+        headers['Content-Type'] = 'application/json'
+        if self.compression != 'gzip':
+            return self._post(url, data, headers, **kwargs)
+        response = self._post(url, gzip.compress(data, compresslevel=6), dict(headers, **{'Content-Encoding': 'gzip'}),
+                              **kwargs)
+        if response.status_code not in REJECTED_ENCODING_STATUSES:
+            return response
+        plain = self._post(url, data, headers, **kwargs)
+        if plain.ok:
+            logging.warning(f"VitalLens API rejected a gzip request body ({response.status_code}); "
+                            "sending request bodies uncompressed")
+            self.compression = None
+        return plain
+
+    def __getattr__(self, name):
+        return getattr(self._requests, name)
+
+
+def _pool_key(settings, api_key):
+    # Rolling vitals are computed outside the client, so they do not split the pool
+    return (settings['method'], settings['mode'], settings['detect_faces'], api_key)
+
+
+class ClientPool:
+    """Bounded pool of VitalLens clients keyed by client settings.
+
+    At most `max_size` clients exist per key; callers beyond that wait for
+    one to be released. Use `client()` as a context manager.
+    """
+
+    def __init__(self, max_size=DEFAULT_POOL_SIZE, factory=None, compression=API_COMPRESSION):
+        self.max_size = max(max_size, 1)
+        self._factory = factory
+        self.compression = compression
+        self._cond = threading.Condition()
+        self._idle = defaultdict(list)
+        self._counts = defaultdict(int)
+        self.stats = {'acquisitions': 0, 'created': 0, 'waits': 0, 'wait_s_total': 0.0, 'wait_s_max': 0.0}
+        self._session = None
+        self._requests = None
+
+    def _install_session(self):
+        """Route vitallens API requests through one keep-alive session."""
+        import requests
+        import vitallens.methods.vitallens as vl_module
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=self.max_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        self._requests = _SessionRequests(session, self.compression)
+        vl_module.requests = self._requests
+        vl_module.concurrent = types.SimpleNamespace(
+            futures=types.SimpleNamespace(ThreadPoolExecutor=_ContextThreadPoolExecutor))
+        self._session = session
+
+    def _create(self, settings, api_key):
+        if self._factory is not None:
+            return self._factory(settings, api_key)
+        from analysis import create_vitallens
+        return create_vitallens(settings, api_key)
+
+    def acquire(self, settings, api_key=None):
+        """Take a client for `settings`, creating or waiting for one as needed."""
+        key = _pool_key(settings, api_key)
+        start = time.perf_counter()
+        waited = False
+        with self._cond:
+            if self._session is None and self._factory is None:
+                self._install_session()
+            while not self._idle[key] and self._counts[key] >= self.max_size:
+                waited = True
+                self._cond.wait()
+            self.stats['acquisitions'] += 1
+            if waited:
+                wait_s = time.perf_counter() - start
+                self.stats['waits'] += 1
+                self.stats['wait_s_total'] += wait_s
+                self.stats['wait_s_max'] = max(self.stats['wait_s_max'], wait_s)
+            if self._idle[key]:
+                return self._idle[key].pop()
+            self._counts[key] += 1
+        try:
+            client = self._create(settings, api_key)
+        except BaseException:
+            with self._cond:
+                self._counts[key] -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.stats['created'] += 1
+        return client
+
+    def release(self, settings, api_key, client, discard=False):
+        """Return `client` to the pool, or drop it if `discard` (e.g. after an error mid-stream)."""
+        key = _pool_key(settings, api_key)
+        if not discard:
+            # Burst state belongs to the previous caller's stream
+            client.reset()
+        with self._cond:
+            if discard:
+                self._counts[key] -= 1
+            else:
+                self._idle[key].append(client)
+            self._cond.notify()
+
+    def client(self, settings, api_key=None):
+        """Context manager around acquire()/release()."""
+        return _Lease(self, settings, api_key)
+
+    @property
+    def bytes_sent(self):
+        """Request body bytes sent to the API by this process."""
+        return self._requests.bytes_sent if self._requests is not None else 0
+
+    def _connection_stats(self):
+        """(requests, new connections) over the shared session's connection pools."""
+        if self._session is None:
+            return 0, 0
+        n_requests = n_connections = 0
+        seen = set()
+        for adapter in self._session.adapters.values():
+            if id(adapter) in seen:
+                continue
+            seen.add(id(adapter))
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    n_requests += pool.num_requests
+                    n_connections += pool.num_connections
+        return n_requests, n_connections
+
+    def snapshot(self):
+        """Counters for display: pool size, waits and connection reuse."""
+        with self._cond:
+            n_requests, n_connections = self._connection_stats()
+            return dict(self.stats,
+                        clients=sum(self._counts.values()),
+                        idle=sum(len(v) for v in self._idle.values()),
+                        http_requests=n_requests,
+                        http_connections=n_connections,
+                        bytes_sent=self.bytes_sent,
+                        connection_reuse_rate=1 - n_connections / n_requests if n_requests else 0.0)
+
+
+class _Lease:
+    def __init__(self, pool, settings, api_key):
+        self.pool = pool
+        self.settings = settings
+        self.api_key = api_key
+        self.client = None
+
+    def __enter__(self):
+        with stage('client_acquire'):
+            self.client = self.pool.acquire(self.settings, self.api_key)
+        return self.client
+
+    def __exit__(self, exc_type, exc, tb):
+        self.pool.release(self.settings, self.api_key, self.client, discard=exc_type is not None)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """The process-wide client pool."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ClientPool()
+        return _pool
@@ -13,6 +13,80 @@ st.set_page_config(page_title="Package Diagnostic Tool", layout="wide")
 st.title("📦 Package Diagnostic Tool")
 st.write("This tool helps diagnose package installation issues on Streamlit Cloud")
 
+
+@st.cache_data(show_spinner=False)
+def run_probe(args, timeout):
+    """stdout of a probe command; cached, since installed packages do not change between reruns."""
+    return subprocess.run(list(args), capture_output=True, text=True, timeout=timeout).stdout
+
+
+@st.cache_resource(show_spinner=False)
+def selftest_environment():
+    import selftest
+    return selftest.environment()
+
+
+@st.cache_data(show_spinner="Running microbenchmarks...")
+def run_selftest(run):
+    # `run` is bumped by "Run again" so a fresh measurement replaces the cached one
+    import selftest
+    return selftest.run_selftest(env=selftest_environment())
+
+
+mode = st.sidebar.radio("Mode", ["Package check", "Performance self-test"])
+if mode == "Performance self-test":
+    import pandas as pd
+    import selftest
+
+    st.header("⚡ Performance Self-Test")
+    st.write("Microbenchmarks of the analysis hot paths, compared against the stored baseline")
+    if st.button("Run again"):
+        st.session_state['selftest_run'] = st.session_state.get('selftest_run', 0) + 1
+    report = run_selftest(st.session_state.get('selftest_run', 0))
+
+    env = report['environment']
+    cv2_env = env['cv2']
+    st.subheader("OpenCV")
+    st.write(f"**Version:** {cv2_env['version']}")
+    st.write(f"**Threads:** {cv2_env['threads']} on {cv2_env['cpus']} CPUs ({cv2_env['parallel_framework']})")
+    st.write(f"**SIMD baseline:** {' '.join(cv2_env['baseline']) or 'none'}")
+    st.write(f"**Dispatched code paths:** {' '.join(cv2_env['dispatched']) or 'none'}")
+    st.write(f"**Supported by this CPU:** {' '.join(cv2_env['supported']) or 'none'}")
+    st.write(f"**FFmpeg video I/O:** {'✅' if cv2_env['ffmpeg'] else '❌'}")
+    st.subheader("PyAV")
+    if env['av'] is None:
+        st.write("❌ Not installed")
+    else:
+        st.write(f"**Version:** {env['av']['version']} ({env['av']['codecs']} codecs)")
+        st.write("**Decoders:** " + ", ".join(f"{'✅' if ok else '❌'} {name}" for name, ok in env['av']['decoders'].items()))
+
+    st.subheader("Benchmarks")
+    st.dataframe(pd.DataFrame([{
+        "Benchmark": row['name'],
+        "Value": f"{row['value']:.3g} {row['unit']}" if row['value'] is not None else "-",
+        "Baseline": f"{row['baseline']:.3g}" if row['baseline'] else "-",
+        "vs Baseline": f"{row['ratio']:.2f}x" if row['ratio'] is not None else "-",
+        "Status": "⚠️ Slow" if row['flagged'] else "✅ OK",
+    } for row in report['rows']]), use_container_width=True)
+    baseline = selftest.load_baseline()
+    if report['baseline_recorded']:
+        st.caption(f"No baseline yet: this run was recorded as this machine's reference in {selftest.BASELINE_PATH}")
+    elif baseline:
+        base_env = baseline['environment']
+        st.caption(f"Baseline: Python {base_env['python']}, OpenCV {base_env['cv2']['version']}, "
+                   f"{base_env['cpus']} CPUs ({base_env['machine']}); flagged below "
+                   f"{selftest.DEFAULT_TOLERANCE:.0%} of it")
+    else:
+        st.caption(f"No baseline at {selftest.BASELINE_PATH}; record one with `python selftest.py --save-baseline`")
+
+    if report['problems']:
+        st.error(f"⚠️ {len(report['problems'])} problem(s) found:")
+        for problem in report['problems']:
+            st.write(f"- {problem}")
+    else:
+        st.success("✅ No configuration problems and every benchmark is within range of the baseline")
+    st.stop()
+
 # Expected packages
 EXPECTED_PACKAGES = {
     'streamlit': '1.31.0',
@@ -149,7 +223,7 @@ st.header("🔧 System Information")
 # Check system packages
 st.subheader("System Libraries (from packages.txt)")
 try:
-    result = subprocess.run(['dpkg', '-l'], capture_output=True, text=True, timeout=5)
+    dpkg_output = run_probe(('dpkg', '-l'), 5)
     packages_to_check = [
         'libgl1-mesa-glx',
         'libglib2.0-0',
@@ -162,7 +236,7 @@ try:
     
     st.write("Checking system packages:")
     for pkg in packages_to_check:
-        if pkg in result.stdout:
+        if pkg in dpkg_output:
             st.write(f"✅ {pkg} - Installed")
         else:
             st.write(f"❌ {pkg} - Not found")
@@ -172,9 +246,7 @@ except Exception as e:
 st.header("📝 All Installed Packages")
 if st.checkbox("Show all installed packages"):
     try:
-        result = subprocess.run([sys.executable, '-m', 'pip', 'list'], 
-                              capture_output=True, text=True, timeout=10)
-        st.code(result.stdout, language='text')
+        st.code(run_probe((sys.executable, '-m', 'pip', 'list'), 10), language='text')
     except Exception as e:
         st.error(f"Error getting package list: {str(e)}")
 
@@ -0,0 +1,410 @@
+"""
+Face ROI stage.
+Runs a cheap face detector (the Haar cascade that ships with OpenCV) on
+keyframes while a video is decoded and follows the face between keyframes
+by template matching, so only the face region of each frame is kept: the
+skin ROI channel means for the local methods and a small fixed-size crop of
+the model ROI for the API. Full frames are never stored, and a video with
+no face fails within the first seconds, before any inference.
+
+With `max_faces` above one, every face in view is followed in the same
+pass (MultiFaceTracker) and each gets its own means and crops, so a group
+recording is decoded once rather than once per person.
+"""
+
+import functools
+import os
+from dataclasses import dataclass, field
+
+import cv2
+import numpy as np
+
+from api_payload import api_roi
+from memstats import RssPeak
+from metrics import stage
+from rppg_local import detect_face_boxes, detect_frame_faces, face_roi
+from video_loader import (CHECKPOINT_FRAMES, DEFAULT_FPS, DEFAULT_MAX_FRAMES, decode_checkpoint, expected_frames,
+                          open_reader)
+
+CROP_SIZE = 64  # API crops; the model input is 40x40
+API_ROI_METHOD = 'upper_body_cropped'  # ROI of the VitalLens model around the face box
+DETECT_HZ = 2.0  # keyframes per second
+DETECT_WIDTH = 320  # keyframe detection runs on a grey copy this wide
+TRACK_WIDTH = 160  # template matching runs on a coarser one
+NO_FACE_TIMEOUT_S = 5.0
+MIN_SUBJECT_S = 5.0  # with several faces, shorter tracks (people passing through, false detections) are dropped
+
+
+class NoFaceDetectedError(Exception):
+    """Raised when the rPPG method finds no face in the video."""
+
+
+@functools.lru_cache(maxsize=1)
+def _haar_cascade():
+    # OpenCV 5 moved the cascades out of the main package
+    if not hasattr(cv2, 'CascadeClassifier'):
+        return None
+    return cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml'))
+
+
+class FaceTracker:
+    """Keyframe face detection with template matching in between.
+
+    Detects every `fps / detect_hz` frames (and, with the Haar cascade, on
+    every frame until a face is first found) on a grey copy `detect_width`
+    wide, and otherwise moves the last box to the best match of the face
+    patch near its previous position on a coarser `track_width` copy. Boxes
+    are smoothed with an exponential moving average so the ROI does not
+    jitter.
+    """
+
+    def __init__(self, fps, detect_hz=DETECT_HZ, detect_width=DETECT_WIDTH, track_width=TRACK_WIDTH,
+                 smoothing=0.5, min_score=0.5):
+        self.detect_every = max(int(round(fps / detect_hz)), 1)
+        self.detect_width = detect_width
+        self.track_width = track_width
+        self.smoothing = smoothing
+        self.min_score = min_score
+        self.box = None  # smoothed box in frame pixels
+        self.stats = {'detections': 0, 'detector_misses': 0, 'matches': 0, 'lost': 0}
+        self._index = 0
+        self._template = None
+        self._track_box = None  # last raw box in track pixels
+
+    def update(self, rgb):
+        """Box (x0, y0, x1, y1) in pixels of `rgb` for this frame, or None before the first face."""
+        height, width = rgb.shape[:2]
+        track_scale = min(self.track_width / width, 1.0)
+        track = _gray(rgb, track_scale)
+
+        found = None
+        # The fallback detector is too slow to run on every frame while searching
+        searching = self.box is None and _haar_cascade() is not None
+        if searching or self._index % self.detect_every == 0:
+            detect_scale = min(self.detect_width / width, 1.0)
+            found = self._detect(_gray(rgb, detect_scale), rgb, detect_scale)
+            if found is not None:
+                found = tuple(v * track_scale / detect_scale for v in found)
+        self._index += 1
+        return self.follow(track, track_scale, found)
+
+    def follow(self, track, track_scale, found=None):
+        """Move to `found`, a detection in pixels of the `track` copy, or else to the best template match.
+
+        Returns the smoothed box in frame pixels, or None before the first face.
+        """
+        if found is not None:
+            self._template = _patch(track, found)
+        elif self._template is not None:
+            found = self._match(track)
+        if found is None:
+            return self.box
+
+        self._track_box = found
+        box = np.asarray(found, dtype=np.float64) / track_scale
+        if self.box is None:
+            self.box = box
+        else:
+            self.box = self.smoothing * box + (1 - self.smoothing) * self.box
+        return self.box
+
+    def _detect(self, gray, rgb, scale):
+        boxes = face_boxes(gray, rgb, scale)
+        if not boxes:
+            self.stats['detector_misses'] += 1
+            return None
+        self.stats['detections'] += 1
+        # Largest face
+        return max(boxes, key=lambda b: (b[2] - b[0]) * (b[3] - b[1]))
+
+    def _match(self, gray):
+        x0, y0, x1, y1 = (int(round(v)) for v in self._track_box)
+        w, h = x1 - x0, y1 - y0
+        pad_x, pad_y = w // 8 + 2, h // 8 + 2  # faces move little between frames
+        sx0, sy0 = max(x0 - pad_x, 0), max(y0 - pad_y, 0)
+        search = gray[sy0:y1 + pad_y, sx0:x1 + pad_x]
+        if search.shape[0] < self._template.shape[0] or search.shape[1] < self._template.shape[1]:
+            self.stats['lost'] += 1
+            return None
+        scores = cv2.matchTemplate(search, self._template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (mx, my) = cv2.minMaxLoc(scores)
+        if score < self.min_score:
+            self.stats['lost'] += 1
+            return None
+        self.stats['matches'] += 1
+        nx0, ny0 = sx0 + mx, sy0 + my
+        return (nx0, ny0, nx0 + self._template.shape[1], ny0 + self._template.shape[0])
+
+
+class MultiFaceTracker:
+    """Up to `max_faces` faces followed from one shared detector pass per keyframe.
+
+    Each keyframe is scanned once for every face; a detection goes to the
+    subject whose last box overlaps it most (IoU of at least `min_iou`), and
+    the rest start new subjects until there are `max_faces`. Between
+    keyframes, and when the detector misses them, subjects follow their own
+    face by template matching (FaceTracker.follow) on one grey copy shared
+    by all, so another face costs a small matchTemplate per frame rather
+    than another detector run or decode.
+    """
+
+    def __init__(self, fps, max_faces, detect_hz=DETECT_HZ, detect_width=DETECT_WIDTH, track_width=TRACK_WIDTH,
+                 min_iou=0.3):
+        self.fps = fps
+        self.max_faces = max_faces
+        self.detect_hz = detect_hz
+        self.detect_every = max(int(round(fps / detect_hz)), 1)
+        self.detect_width = detect_width
+        self.track_width = track_width
+        self.min_iou = min_iou
+        self.subjects = []  # a FaceTracker per face, in order of first detection
+        self.stats = {'keyframes': 0, 'detector_misses': 0}
+        self._index = 0
+
+    def update(self, rgb):
+        """Box (x0, y0, x1, y1) in pixels of `rgb` of each subject so far, in the order of `subjects`."""
+        width = rgb.shape[1]
+        track_scale = min(self.track_width / width, 1.0)
+        track = _gray(rgb, track_scale)
+        found = [None] * len(self.subjects)
+        searching = not self.subjects and _haar_cascade() is not None
+        if searching or self._index % self.detect_every == 0:
+            detect_scale = min(self.detect_width / width, 1.0)
+            boxes = face_boxes(_gray(rgb, detect_scale), rgb, detect_scale, self.max_faces)
+            self.stats['keyframes'] += 1
+            self.stats['detector_misses'] += not boxes
+            found = self._assign([tuple(v * track_scale / detect_scale for v in box) for box in boxes])
+        self._index += 1
+        return [subject.follow(track, track_scale, box) for subject, box in zip(self.subjects, found)]
+
+    def _assign(self, boxes):
+        """Detections (track pixels) per subject, None where it got none; starts new subjects."""
+        found = [None] * len(self.subjects)
+        pairs = sorted(((_iou(box, subject._track_box), i, j)
+                        for i, subject in enumerate(self.subjects) for j, box in enumerate(boxes)), reverse=True)
+        taken = set()
+        for iou, i, j in pairs:
+            if iou < self.min_iou:
+                break
+            if found[i] is None and j not in taken:
+                found[i] = boxes[j]
+                taken.add(j)
+                self.subjects[i].stats['detections'] += 1
+        # Largest new faces first; a second detection of a tracked face is not a new subject
+        claimed = [subject._track_box for subject in self.subjects]
+        for j in sorted(set(range(len(boxes))) - taken, key=lambda j: -_area(boxes[j])):
+            if len(self.subjects) == self.max_faces:
+                break
+            if any(_iou(boxes[j], box) >= self.min_iou for box in claimed):
+                continue
+            claimed.append(boxes[j])
+            subject = FaceTracker(self.fps, self.detect_hz, self.detect_width, self.track_width)
+            subject.stats['detections'] += 1
+            self.subjects.append(subject)
+            found.append(boxes[j])
+        return found
+
+
+def face_boxes(gray, rgb, scale, max_faces=1):
+    """Face boxes (x0, y0, x1, y1) in pixels of `gray`, a copy of `rgb` scaled by `scale`.
+
+    Uses the Haar cascade on `gray`, which returns every face, or the
+    vitallens detector on `rgb` for up to `max_faces` when OpenCV has no
+    cascades.
+    """
+    cascade = _haar_cascade()
+    if cascade is not None:
+        faces = cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=4,
+                                         minSize=(gray.shape[1] // 10, gray.shape[1] // 10))
+        return [(x, y, x + w, y + h) for x, y, w, h in faces]
+    if max_faces > 1:
+        return [tuple(v * scale for v in box) for box in detect_frame_faces(rgb, max_faces)]
+    boxes = detect_face_boxes(rgb[np.newaxis], DEFAULT_FPS)
+    return [] if boxes is None else [tuple(b * scale) for b in boxes]
+
+
+def _area(box):
+    return max(box[2] - box[0], 0) * max(box[3] - box[1], 0)
+
+
+def _iou(a, b):
+    inter = _area((max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3])))
+    union = _area(a) + _area(b) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _gray(rgb, scale):
+    height, width = rgb.shape[:2]
+    size = (max(int(width * scale), 1), max(int(height * scale), 1))
+    return cv2.cvtColor(cv2.resize(rgb, size, interpolation=cv2.INTER_LINEAR), cv2.COLOR_RGB2GRAY)
+
+
+def _patch(gray, box):
+    x0, y0, x1, y1 = (int(round(v)) for v in box)
+    return gray[max(y0, 0):y1, max(x0, 0):x1].copy()
+
+
+def _clip(box, width, height):
+    x0, y0, x1, y1 = (int(round(v)) for v in box)
+    return max(x0, 0), max(y0, 0), min(x1, width), min(y1, height)
+
+
+@dataclass
+class FaceTrack:
+    """What the ROI stage keeps of a video: per-frame face boxes, skin means and API crops."""
+    means: np.ndarray  # (n, 3) RGB means of the skin ROI
+    boxes: np.ndarray  # (n, 4) face boxes in frame pixels
+    crops: np.ndarray  # (n, crop_size, crop_size, 3) uint8 model-ROI crops, or None
+    fps: float
+    fps_detected: bool = True
+    start_frame: int = 0  # frames before the face was first found are dropped
+    source_size: tuple = None
+    frame_size: tuple = None
+    peak_rss_bytes: int = 0
+    stats: dict = field(default_factory=dict)
+
+    @property
+    def n_frames(self):
+        return self.means.shape[0]
+
+    @property
+    def nbytes(self):
+        crops = self.crops.nbytes if self.crops is not None else 0
+        return self.means.nbytes + self.boxes.nbytes + crops
+
+
+class _Subject:
+    """Per-frame arrays of one tracked face, grown by doubling up to `max_frames`."""
+
+    def __init__(self, start_frame, capacity, max_frames, crop_size, keep_crops, stats):
+        self.start_frame = start_frame
+        self.max_frames = max_frames
+        self.stats = stats
+        self.n = 0
+        self.means = np.empty((capacity, 3))
+        self.boxes = np.empty((capacity, 4))
+        self.crops = np.empty((capacity, crop_size, crop_size, 3), dtype=np.uint8) if keep_crops else None
+
+    def add(self, frame, box, crop_box):
+        if self.n == len(self.means):
+            capacity = min(self.n * 2, self.max_frames)
+            self.means, self.boxes = np.resize(self.means, (capacity, 3)), np.resize(self.boxes, (capacity, 4))
+            if self.crops is not None:
+                grown = np.empty((capacity,) + self.crops.shape[1:], dtype=np.uint8)
+                grown[:self.n] = self.crops[:self.n]
+                self.crops = grown
+        height, width = frame.shape[:2]
+        self.boxes[self.n] = box
+        x0, y0, x1, y1 = _clip(face_roi(box), width, height)
+        self.means[self.n] = cv2.mean(frame[y0:y1, x0:x1])[:3]
+        if self.crops is not None:
+            x0, y0, x1, y1 = crop_box
+            cv2.resize(frame[y0:y1, x0:x1], self.crops.shape[1:3], dst=self.crops[self.n],
+                       interpolation=cv2.INTER_LINEAR)
+        self.n += 1
+
+
+def _tracker_stats(tracker, i):
+    if tracker is None:
+        return {}
+    return tracker.subjects[i].stats if isinstance(tracker, MultiFaceTracker) else tracker.stats
+
+
+def track_video(video_path, max_frames=DEFAULT_MAX_FRAMES, max_pixels=None, target_fps=None, decoder='cv2',
+                detect_faces=True, keep_crops=True, crop_size=CROP_SIZE, roi_method=API_ROI_METHOD,
+                detect_hz=DETECT_HZ, no_face_timeout_s=NO_FACE_TIMEOUT_S, progress=None, cancel=None):
+    """Decode `video_path` through the ROI stage, keeping only the face region.
+
+    Each frame is decoded into one scratch buffer, the face is located, and
+    only its skin ROI mean and (with `keep_crops`) a `crop_size` square crop
+    of the model ROI are stored. With detect_faces=False the whole frame is
+    the face. `progress` and `cancel` work as in video_loader.load_video.
+
+    Raises:
+        IOError: If the video cannot be opened or yields no frames.
+        NoFaceDetectedError: If no face is found in the first
+            `no_face_timeout_s` seconds, or at all.
+        pipeline.PipelineCancelled: If `cancel` was set.
+    """
+    return track_subjects(video_path, 1, max_frames=max_frames, max_pixels=max_pixels, target_fps=target_fps,
+                          decoder=decoder, detect_faces=detect_faces, keep_crops=keep_crops, crop_size=crop_size,
+                          roi_method=roi_method, detect_hz=detect_hz, no_face_timeout_s=no_face_timeout_s,
+                          progress=progress, cancel=cancel)[0]
+
+
+def track_subjects(video_path, max_faces, max_frames=DEFAULT_MAX_FRAMES, max_pixels=None, target_fps=None,
+                   decoder='cv2', detect_faces=True, keep_crops=True, crop_size=CROP_SIZE, roi_method=API_ROI_METHOD,
+                   detect_hz=DETECT_HZ, no_face_timeout_s=NO_FACE_TIMEOUT_S, progress=None, cancel=None):
+    """track_video for up to `max_faces` faces from a single decode pass.
+
+    Returns a FaceTrack per face, largest face first. Each starts at the
+    frame its face was first found (`start_frame`), and decoding stops
+    `max_frames` after the first face. With more than one face allowed,
+    faces tracked for less than MIN_SUBJECT_S (or than the longest track,
+    in shorter videos) are dropped. Raises as track_video does.
+    """
+    rss = RssPeak()
+    with stage('face_track'):
+        reader = open_reader(video_path, decoder, None, max_pixels, target_fps)
+        try:
+            fps = reader.out_fps if reader.out_fps > 0 else DEFAULT_FPS
+            width, height = reader.size
+            expected = expected_frames(reader.reported, reader.fps, target_fps)
+            capacity = min(expected, max_frames) if expected > 0 else max_frames
+            frame = np.empty((height, width, 3), dtype=np.uint8)
+            if not detect_faces:
+                tracker = None
+            elif max_faces > 1:
+                tracker = MultiFaceTracker(fps, max_faces, detect_hz)
+            else:
+                tracker = FaceTracker(fps, detect_hz)
+            full = (0, 0, width, height)
+            subjects = []
+            decoded = 0
+            while (not subjects or subjects[0].n < max_frames) and reader.read_into(frame):
+                decoded += 1
+                if decoded % CHECKPOINT_FRAMES == 0:
+                    decode_checkpoint(progress, cancel, decoded, capacity)
+                    rss.sample()
+                if tracker is None:
+                    frame_boxes = [full]
+                elif max_faces > 1:
+                    frame_boxes = tracker.update(frame)
+                else:
+                    frame_boxes = [tracker.update(frame)]
+                if not frame_boxes or frame_boxes[0] is None:
+                    if decoded >= no_face_timeout_s * fps:
+                        raise NoFaceDetectedError(f"No face detected in the first {no_face_timeout_s:.0f}s of video")
+                    continue
+                for i, box in enumerate(frame_boxes):
+                    if i == len(subjects):
+                        subjects.append(_Subject(decoded - 1, capacity, max_frames, crop_size, keep_crops,
+                                                 _tracker_stats(tracker, i)))
+                    crop_box = api_roi(box, roi_method, (width, height)) if tracker is not None else full
+                    subjects[i].add(frame, box, crop_box)
+        finally:
+            reader.release()
+
+    if not subjects:
+        raise NoFaceDetectedError("No face detected in video")
+    if max_faces > 1:
+        shortest = min(MIN_SUBJECT_S * fps, max(subject.n for subject in subjects))
+        subjects = [subject for subject in subjects if subject.n >= shortest]
+        subjects.sort(key=lambda subject: -_area(np.median(subject.boxes[:subject.n], axis=0)))
+    shared = {'decoded_frames': decoded, 'decoder': reader.name, 'source_fps': reader.fps,
+              'frames_skipped': reader.skipped}
+    if max_faces > 1 and tracker is not None:
+        shared.update(tracker.stats, faces_found=len(tracker.subjects))
+    peak_rss = rss.peak()
+    return [FaceTrack(
+        means=subject.means[:subject.n],
+        boxes=subject.boxes[:subject.n],
+        crops=subject.crops[:subject.n] if subject.crops is not None else None,
+        fps=fps,
+        fps_detected=reader.fps > 0,
+        start_frame=subject.start_frame,
+        source_size=reader.source_size,
+        frame_size=(width, height),
+        peak_rss_bytes=peak_rss,
+        stats=dict(subject.stats, **shared),
+    ) for subject in subjects]
@@ -0,0 +1,264 @@
+"""
+Decoded-intermediate cache.
+The first analysis of a video stores what its decode produced, so analyzing
+the same video again with another method, fallback or rolling window reads
+that back instead of opening the container: the face ROI stage's per-face
+skin means, boxes and API crops, or on the full-frame path the downscaled
+frame buffer. Each entry is a directory of .npy files plus meta.json, keyed
+on the video's content hash and the settings that change what is decoded,
+and its arrays are memory-mapped on a hit rather than read into the heap.
+Quality gate reports are kept alongside, so a hit decodes nothing at all.
+Entries are evicted least recently used first once their total size passes
+the cap; one entry may take at most a quarter of it.
+
+FRAME_CACHE_DIR sets the directory (default: a per-user directory in the
+temp dir) and FRAME_CACHE_MAX_BYTES the cap (default 2 GB). Like the result
+cache, it is turned off when the directory is not private to the user.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from face_track import FaceTrack
+from metrics import REGISTRY
+from result_cache import cache_key, private_dir, user_cache_dir
+from video_loader import LoadedVideo
+
+DEFAULT_CACHE_DIR = os.environ.get('FRAME_CACHE_DIR', user_cache_dir('vitallens_frame_cache'))
+DEFAULT_MAX_BYTES = int(os.environ.get('FRAME_CACHE_MAX_BYTES', 2 * 1024 ** 3))
+DECODE_SETTINGS = ('max_frames', 'max_pixels', 'target_fps', 'decoder')
+TRACK_SETTINGS = DECODE_SETTINGS + ('detect_faces', 'max_subjects')
+META_FILE = 'meta.json'
+
+
+def file_hash(path, chunk_bytes=1024 ** 2):
+    """SHA-256 hex digest of a file; the same as result_cache.content_hash of its bytes."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_bytes), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def intermediate_key(video_hash, settings):
+    """Key of what the decode path of `settings` (ROI stage or full frames) produces from the video."""
+    if settings['roi_stage']:
+        return cache_key(video_hash, {'kind': 'tracks', **{name: settings[name] for name in TRACK_SETTINGS}})
+    return cache_key(video_hash, {'kind': 'frames', **{name: settings[name] for name in DECODE_SETTINGS}})
+
+
+def quality_key(video_hash, settings):
+    """Key of the quality gate report for the video under `settings`."""
+    return cache_key(video_hash, {'kind': 'quality', 'thresholds': settings['quality_thresholds'],
+                                  'detect_faces': settings['detect_faces']})
+
+
+def _touch(path):
+    # Set the LRU position from the clock rather than the file system's coarser timestamps
+    now = time.time_ns()
+    os.utime(path, ns=(now, now))
+
+
+def _dir_bytes(path):
+    total = 0
+    for name in os.listdir(path):
+        try:
+            total += os.path.getsize(os.path.join(path, name))
+        except OSError:
+            pass
+    return total
+
+
+class FrameCache:
+    """Size-capped on-disk store of memory-mapped arrays plus JSON metadata, evicted LRU by total bytes."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, registry=REGISTRY):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_bytes // 4
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'skipped': 0, 'evictions': 0, 'bytes_mapped': 0}
+        if cache_dir and max_bytes > 0:
+            if private_dir(cache_dir):
+                self._bytes = sum(size for _, _, size in self._entries())
+            else:
+                self.cache_dir = None
+        if registry is not None:
+            registry.add_gauge('vitallens_frame_cache_bytes', 'Bytes held by the decoded-intermediate cache.',
+                               lambda: self._bytes)
+
+    @property
+    def enabled(self):
+        return bool(self.cache_dir) and self.max_bytes > 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def _entries(self):
+        """(mtime, path, size) for every stored entry; the meta file's mtime is its LRU position."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith('.'):
+                continue
+            try:
+                mtime = os.stat(os.path.join(path, META_FILE)).st_mtime
+                entries.append((mtime, path, _dir_bytes(path)))
+            except OSError:
+                continue
+        return entries
+
+    def _evict(self):
+        # Called with the lock held. Evicted arrays that are still mapped stay readable until unmapped.
+        if self._bytes <= self.max_bytes:
+            return
+        entries = sorted(self._entries())
+        self._bytes = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if self._bytes <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            self._bytes -= size
+            self.stats['evictions'] += 1
+
+    def get(self, key):
+        """(meta dict, {name: read-only memory-mapped array}) stored under `key`, or None on a miss."""
+        if not self.enabled:
+            return None
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(os.path.join(path, META_FILE)) as f:
+                    meta = json.load(f)
+                arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+                          for name in meta.pop('arrays')}
+                _touch(os.path.join(path, META_FILE))
+            except (OSError, ValueError, KeyError):
+                self.stats['misses'] += 1
+                return None
+            self.stats['hits'] += 1
+            self.stats['bytes_mapped'] += sum(array.nbytes for array in arrays.values())
+            return meta, arrays
+
+    def put(self, key, meta, arrays=None):
+        """Store `meta` (JSON-serializable) and `arrays` ({name: ndarray}) under `key`.
+
+        Returns False, storing nothing, when the entry is over max_entry_bytes.
+        """
+        arrays = arrays or {}
+        if not self.enabled:
+            return False
+        if sum(array.nbytes for array in arrays.values()) > self.max_entry_bytes:
+            with self._lock:
+                self.stats['skipped'] += 1
+            return False
+        # Written to a hidden directory and renamed into place, so readers never see a partial entry
+        tmp_path = tempfile.mkdtemp(dir=self.cache_dir, prefix='.tmp-')
+        try:
+            for name, array in arrays.items():
+                np.save(os.path.join(tmp_path, f'{name}.npy'), array)
+            with open(os.path.join(tmp_path, META_FILE), 'w') as f:
+                json.dump(dict(meta, arrays=list(arrays)), f, default=float)  # numpy scalars in decoder stats
+            _touch(os.path.join(tmp_path, META_FILE))
+            size = _dir_bytes(tmp_path)
+            path = self._path(key)
+            with self._lock:
+                if os.path.exists(path):
+                    old_size = _dir_bytes(path)
+                    shutil.rmtree(path, ignore_errors=True)
+                    self._bytes -= old_size
+                try:
+                    os.rename(tmp_path, path)
+                except OSError:
+                    return False  # another process stored the same entry in between
+                self._bytes += size
+                self.stats['stores'] += 1
+                self._evict()
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+        return True
+
+    def get_tracks(self, key, need_crops=False):
+        """The FaceTrack list stored by put_tracks, with memory-mapped arrays, or None.
+
+        An entry stored without crops is a miss when `need_crops` is set.
+        """
+        entry = self.get(key)
+        if entry is None:
+            return None
+        meta, arrays = entry
+        if need_crops and not all(f'crops_{i}' in arrays for i in range(len(meta['subjects']))):
+            with self._lock:
+                self.stats['hits'] -= 1
+                self.stats['misses'] += 1
+            return None
+        tracks = []
+        for i, subject in enumerate(meta['subjects']):
+            tracks.append(FaceTrack(arrays[f'means_{i}'], arrays[f'boxes_{i}'], arrays.get(f'crops_{i}'),
+                                    subject['fps'], subject['fps_detected'], subject['start_frame'],
+                                    tuple(subject['source_size']), tuple(subject['frame_size']),
+                                    stats=dict(subject['stats'], frame_cache='hit')))
+        return tracks
+
+    def put_tracks(self, key, tracks):
+        """Store the output of face_track.track_subjects (or [track_video(...)])."""
+        arrays = {}
+        subjects = []
+        for i, track in enumerate(tracks):
+            arrays[f'means_{i}'] = track.means
+            arrays[f'boxes_{i}'] = track.boxes
+            if track.crops is not None:
+                arrays[f'crops_{i}'] = track.crops
+            subjects.append({'fps': track.fps, 'fps_detected': track.fps_detected, 'start_frame': track.start_frame,
+                             'source_size': track.source_size, 'frame_size': track.frame_size,
+                             'stats': track.stats})
+        return self.put(key, {'kind': 'tracks', 'subjects': subjects}, arrays)
+
+    def get_frames(self, key):
+        """A LoadedVideo over the memory-mapped frame buffer stored by put_frames, or None."""
+        entry = self.get(key)
+        if entry is None:
+            return None
+        meta, arrays = entry
+        return LoadedVideo(arrays['frames'], meta['fps'], meta['fps_detected'], source_size=tuple(meta['source_size']),
+                           stats=dict(meta['stats'], frame_cache='hit'))
+
+    def put_frames(self, key, loaded):
+        """Store the frame buffer of a video_loader.LoadedVideo."""
+        meta = {'kind': 'frames', 'fps': loaded.fps, 'fps_detected': loaded.fps_detected,
+                'source_size': loaded.source_size, 'stats': loaded.stats}
+        return self.put(key, meta, {'frames': loaded.frames})
+
+    def get_quality(self, key):
+        """A stored quality gate report dict, or None."""
+        entry = self.get(key)
+        return entry[0]['report'] if entry is not None else None
+
+    def put_quality(self, key, report):
+        return self.put(key, {'kind': 'quality', 'report': report})
+
+    def snapshot(self):
+        """Counters and size for display."""
+        with self._lock:
+            return dict(self.stats, bytes=self._bytes, max_bytes=self.max_bytes)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_frame_cache():
+    """The process-wide frame cache."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = FrameCache()
+        return _cache
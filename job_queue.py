@@ -0,0 +1,244 @@
+"""
+Background analysis jobs.
+Analyses are submitted to a process-wide queue and run on a fixed pool of
+worker threads, so a long video does not hold the Streamlit script that
+submitted it and concurrent sessions wait in line instead of all decoding
+at once. Each job records its progress (stage, frames done) for the UI to
+poll and can be cancelled, whether it is still queued or already running.
+
+ANALYSIS_WORKERS sets the pool size (default 2) and ANALYSIS_MAX_QUEUED the
+number of jobs allowed to wait (default 16); further submissions raise
+QueueFullError. Queue depth, running jobs and queue wait times are exported
+with the other metrics (metrics.py).
+"""
+
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+
+from metrics import REGISTRY
+from pipeline import PipelineCancelled
+
+DEFAULT_WORKERS = int(os.environ.get('ANALYSIS_WORKERS', 2))
+DEFAULT_MAX_QUEUED = int(os.environ.get('ANALYSIS_MAX_QUEUED', 16))
+FINISHED_JOBS_KEPT = 256
+
+_STOP = object()
+
+
+class QueueFullError(RuntimeError):
+    """Raised by JobQueue.submit when `max_queued` jobs are already waiting."""
+
+
+class Job:
+    """One queued call and its progress.
+
+    `status` goes queued -> running -> done / failed / cancelled. The worker
+    calls `fn(*args, progress=job.report, cancel=job.cancel_event, **kwargs)`;
+    `result` or `error` is set when it returns or raises.
+    """
+
+    def __init__(self, job_id, fn, args, kwargs, label=None):
+        self.id = job_id
+        self.label = label
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.status = 'queued'
+        self.stage = 'queued'
+        self.frames = None
+        self.total = None
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        self._done = threading.Event()
+
+    def report(self, stage, frames=None, total=None):
+        """Progress callback handed to the job function."""
+        self.stage = stage
+        if frames is not None:
+            self.frames = frames
+        if total is not None:
+            self.total = total
+
+    def cancel(self):
+        """Ask the job to stop; a queued job never starts, a running one stops at its next check."""
+        self.cancel_event.set()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job has finished; returns whether it has."""
+        return self._done.wait(timeout)
+
+    def snapshot(self):
+        """Plain-dict view for polling."""
+        now = time.time()
+        start = self.started_at
+        fraction = None
+        if self.status == 'done':
+            fraction = 1.0
+        elif self.frames is not None and self.total:
+            fraction = min(self.frames / self.total, 1.0)
+        return {
+            'id': self.id,
+            'label': self.label,
+            'status': self.status,
+            'stage': self.stage,
+            'frames': self.frames,
+            'total': self.total,
+            'fraction': fraction,
+            'wait_s': (start or self.finished_at or now) - self.submitted_at,
+            'run_s': ((self.finished_at or now) - start) if start else None,
+            'error': f"{type(self.error).__name__}: {self.error}" if self.error is not None else None,
+        }
+
+    def _finish(self, status, result=None, error=None):
+        self.status = status
+        self.stage = status
+        self.result = result
+        self.error = error
+        self.finished_at = time.time()
+        self.fn = self.args = self.kwargs = None  # do not keep e.g. frame buffers alive
+        self._done.set()
+
+
+class JobQueue:
+    """FIFO of jobs served by `workers` daemon threads.
+
+    At most `workers` jobs run at once and at most `max_queued` wait; the
+    threads start with the first submission.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, max_queued=DEFAULT_MAX_QUEUED, registry=REGISTRY):
+        self.workers = max(workers, 1)
+        self.max_queued = max_queued
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._threads = []
+        self._queued = 0
+        self._running = 0
+        self.registry = registry
+        self.stats = {'submitted': 0, 'rejected': 0, 'done': 0, 'failed': 0, 'cancelled': 0,
+                      'wait_s_total': 0.0, 'wait_s_max': 0.0}
+        if registry is not None:
+            registry.add_gauge('vitallens_jobs_queued', 'Analysis jobs waiting for a worker.', lambda: self._queued)
+            registry.add_gauge('vitallens_jobs_running', 'Analysis jobs being run.', lambda: self._running)
+
+    def submit(self, fn, *args, label=None, **kwargs):
+        """Queue `fn(*args, progress=..., cancel=..., **kwargs)` and return its Job.
+
+        Raises:
+            QueueFullError: If `max_queued` jobs are already waiting.
+        """
+        with self._lock:
+            if self._queued >= self.max_queued:
+                self.stats['rejected'] += 1
+                raise QueueFullError(f"{self._queued} analyses are already waiting")
+            job = Job(f"job-{next(self._ids)}", fn, args, kwargs, label)
+            self._jobs[job.id] = job
+            self._queued += 1
+            self.stats['submitted'] += 1
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f'job-worker-{len(self._threads)}', daemon=True)
+                self._threads.append(thread)
+                thread.start()
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id):
+        """The job with `job_id`, or None once it has been forgotten."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def position(self, job):
+        """Number of queued jobs ahead of `job` (0 when it is running or finished)."""
+        if job.status != 'queued':
+            return 0
+        with self._lock:
+            return sum(1 for j in self._jobs.values()
+                       if j.status == 'queued' and j.submitted_at < job.submitted_at and not j.cancel_event.is_set())
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is _STOP:
+                return
+            wait_s = time.time() - job.submitted_at
+            with self._lock:
+                self._queued -= 1
+                self.stats['wait_s_total'] += wait_s
+                self.stats['wait_s_max'] = max(self.stats['wait_s_max'], wait_s)
+                if job.cancel_event.is_set():
+                    self._finished(job, 'cancelled')
+                    continue
+                self._running += 1
+            if self.registry is not None:
+                self.registry.observe_job_wait(wait_s)
+            job.status = 'running'
+            job.started_at = time.time()
+            try:
+                result = job.fn(*job.args, progress=job.report, cancel=job.cancel_event, **job.kwargs)
+            except PipelineCancelled as e:
+                status, result, error = 'cancelled', None, e
+            except Exception as e:
+                logging.exception(f"Job {job.id} failed")
+                status, result, error = 'failed', None, e
+            else:
+                status, error = 'done', None
+            with self._lock:
+                self._running -= 1
+                self._finished(job, status, result, error)
+
+    def _finished(self, job, status, result=None, error=None):
+        # Called with the lock held
+        job._finish(status, result, error)
+        self.stats[status] += 1
+        finished = [j for j in self._jobs.values() if j.done]
+        for old in finished[:max(len(finished) - FINISHED_JOBS_KEPT, 0)]:
+            del self._jobs[old.id]
+
+    def snapshot(self):
+        """Counters for display: queue depth, running jobs, outcomes and wait times."""
+        with self._lock:
+            started = self.stats['submitted'] - self._queued
+            return dict(self.stats, workers=self.workers, queued=self._queued, running=self._running,
+                        wait_s_mean=self.stats['wait_s_total'] / started if started else 0.0)
+
+    def shutdown(self, cancel=True):
+        """Stop the workers after the running jobs; with `cancel`, queued jobs are cancelled."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+            threads = list(self._threads)
+            self._threads = []
+        if cancel:
+            for job in jobs:
+                if job.status == 'queued':
+                    job.cancel()
+        for _ in threads:
+            self._queue.put(_STOP)
+        for thread in threads:
+            thread.join()
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def get_queue():
+    """The process-wide job queue."""
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue()
+        return _queue
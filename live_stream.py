@@ -0,0 +1,264 @@
+"""
+Live stream analysis.
+Reads frames from a webcam, an RTSP/HTTP stream or a video file through
+PyAV on a capture thread and keeps the face-ROI colour trace of the last
+`buffer_s` seconds in a ring buffer. Every frame is reduced to its ROI mean
+once, when it arrives. Each update (once per `update_s`) runs the rPPG
+projection over just the samples that arrived since the last one, plus a
+projection window of context on either side, and pushes them into running
+DFTs of the buffer (rppg_local.SlidingSpectrum), so neither the projection
+nor the spectrum is recomputed over the whole buffer. A looping file stands
+in for a camera.
+"""
+
+import collections
+import logging
+import sys
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from rppg_local import ALGORITHMS, HR_BAND_HZ, RR_BAND_HZ, WINDOW_S, SlidingSpectrum, detect_face_boxes, face_roi
+from video_loader import DEFAULT_FPS, scaled_size
+
+DEFAULT_BUFFER_S = 20.0
+DEFAULT_UPDATE_S = 1.0
+MIN_TRACE_S = 6.0  # shortest trace an update will estimate from
+DEFAULT_MAX_PIXELS = 640 * 360  # ROI means and face detection do not need more
+IDLE_TIMEOUT_S = 15.0
+
+
+class RingBuffer:
+    """Fixed-capacity ring of rows; `tail(n)` returns the last n oldest first."""
+
+    def __init__(self, capacity, width):
+        self.data = np.zeros((capacity, width))
+        self.capacity = capacity
+        self.count = 0  # total rows ever pushed
+
+    def push(self, row):
+        self.data[self.count % self.capacity] = row
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def tail(self, n):
+        """Copy of the last `n` rows (at most len(self)), oldest first."""
+        n = min(n, len(self))
+        idx = np.arange(self.count - n, self.count) % self.capacity
+        return self.data[idx]
+
+
+def open_stream(source):
+    """Open `source` with PyAV: a camera index ('0'), a URL or a file path.
+
+    Anything PyAV can read is opened, so callers pass only trusted sources
+    (the app offers the operator's LIVE_STREAM_SOURCES).
+    """
+    import av
+    if str(source).isdigit():
+        if sys.platform.startswith('linux'):
+            return av.open(f"/dev/video{source}", format='v4l2')
+        if sys.platform == 'darwin':
+            return av.open(str(source), format='avfoundation')
+        raise IOError("Camera indexes are only supported on Linux and macOS; pass a device or stream URL")
+    options = {'rtsp_transport': 'tcp'} if str(source).startswith('rtsp://') else {}
+    return av.open(source, options=options)
+
+
+class LiveAnalyzer:
+    """Incremental HR/RR estimation on a live frame source.
+
+    Call start(), then poll() for the latest estimate and metrics. The pulse
+    lags the trace by one projection window (WINDOW_S), the time until every
+    projection window over a sample is in. Frames that arrive more than
+    `max_lag_s` behind the stream clock are dropped
+    (their slot repeats the previous ROI mean so the trace stays uniformly
+    sampled). The capture thread stops by itself when nobody has polled
+    for `idle_timeout_s`, e.g. after the browser tab is closed.
+    """
+
+    def __init__(self, source, method='POS', buffer_s=DEFAULT_BUFFER_S, update_s=DEFAULT_UPDATE_S,
+                 detect_faces=True, loop=False, realtime=None, max_pixels=DEFAULT_MAX_PIXELS,
+                 scan_hz=1.0, max_lag_s=0.1, idle_timeout_s=IDLE_TIMEOUT_S):
+        if method not in ALGORITHMS:
+            raise ValueError(f"Live analysis needs a local method, got {method}")
+        self.source = source
+        self.method = method
+        self.buffer_s = buffer_s
+        self.update_s = update_s
+        self.detect_faces = detect_faces
+        self.loop = loop
+        # Files are paced at their frame rate to behave like a camera
+        self.realtime = loop if realtime is None else realtime
+        self.max_pixels = max_pixels
+        self.scan_hz = scan_hz
+        self.max_lag_s = max_lag_s
+        self.idle_timeout_s = idle_timeout_s
+
+        self.fps = None
+        self.trace = None
+        self._context = None  # samples of trace around new ones that the projection needs
+        self._hr_spectrum = None  # of the pulse
+        self._rr_spectrum = None  # of the skin brightness
+        self._pulse_done = 0  # trace samples already projected into the pulse
+        self.latest = None
+        self.history = collections.deque(maxlen=3600)
+        self.error = None
+        self.stats = {'frames_received': 0, 'frames_dropped': 0, 'frames_without_face': 0, 'updates': 0,
+                      'update_ms_last': 0.0, 'update_ms_max': 0.0, 'update_ms_total': 0.0}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_poll = time.monotonic()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self._last_poll = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name='live-capture', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def poll(self):
+        """Latest estimate (or None) and a copy of the metrics; also keeps the stream alive."""
+        self._last_poll = time.monotonic()
+        with self._lock:
+            return self.latest, self.metrics()
+
+    def metrics(self):
+        s = self.stats
+        received = s['frames_received']
+        return dict(s,
+                    drop_rate=s['frames_dropped'] / received if received else 0.0,
+                    update_ms_mean=s['update_ms_total'] / s['updates'] if s['updates'] else 0.0,
+                    buffered_s=len(self.trace) / self.fps if self.trace is not None else 0.0)
+
+    def _run(self):
+        try:
+            container = open_stream(self.source)
+        except Exception as e:
+            self.error = f"Could not open stream: {e}"
+            return
+        try:
+            self._capture(container)
+        except Exception as e:
+            logging.exception("Live capture failed")
+            self.error = str(e)
+        finally:
+            container.close()
+
+    def _capture(self, container):
+        stream = container.streams.video[0]
+        stream.thread_type = 'AUTO'
+        self.fps = float(stream.average_rate or stream.guessed_rate or DEFAULT_FPS)
+        width, height = scaled_size(stream.codec_context.width, stream.codec_context.height,
+                                    max_pixels=self.max_pixels)
+        self.trace = RingBuffer(max(int(round(self.buffer_s * self.fps)), 2), 3)
+        self._context = max(int(round(WINDOW_S * self.fps)), 2)
+        self._hr_spectrum = SlidingSpectrum(self.fps, self.trace.capacity, HR_BAND_HZ)
+        self._rr_spectrum = SlidingSpectrum(self.fps, self.trace.capacity, RR_BAND_HZ)
+        update_every = max(int(round(self.update_s * self.fps)), 1)
+        scan_every = max(int(round(self.fps / self.scan_hz)), 1)
+
+        roi = None
+        last_mean = np.zeros(3)
+        t0 = None
+        while not self._stop.is_set():
+            for frame in container.decode(stream):
+                if self._stop.is_set() or time.monotonic() - self._last_poll > self.idle_timeout_s:
+                    return
+                index = self.stats['frames_received']
+                now = time.monotonic()
+                if t0 is None:
+                    t0 = now
+                lag = (now - t0) - index / self.fps
+                if self.realtime and lag < 0:
+                    time.sleep(-lag)
+                elif lag > self.max_lag_s:
+                    # Behind the stream clock: keep the sample grid, skip the work
+                    self._push(last_mean, dropped=True)
+                    continue
+
+                rgb = frame.reformat(width=width, height=height, format='rgb24',
+                                     interpolation='BILINEAR').to_ndarray()
+                if index % scan_every == 0:
+                    roi = self._locate(rgb)
+                if roi is None:
+                    self.stats['frames_without_face'] += 1
+                else:
+                    x0, y0, x1, y1 = roi
+                    last_mean = np.array(cv2.mean(rgb[y0:y1, x0:x1])[:3])
+                self._push(last_mean, dropped=False)
+                if self.stats['frames_received'] % update_every == 0:
+                    self._update()
+            if not self.loop:
+                return
+            container.seek(0)
+
+    def _locate(self, rgb):
+        height, width = rgb.shape[:2]
+        if not self.detect_faces:
+            return (0, 0, width, height)
+        boxes = detect_face_boxes(rgb[np.newaxis], self.fps, scan_hz=self.scan_hz)
+        if boxes is None:
+            return None
+        x0, y0, x1, y1 = face_roi(boxes[0])
+        return (max(x0, 0), max(y0, 0), min(x1, width), min(y1, height))
+
+    def _push(self, mean, dropped):
+        with self._lock:
+            self.trace.push(mean)
+            self.stats['frames_received'] += 1
+            if dropped:
+                self.stats['frames_dropped'] += 1
+
+    def _update(self):
+        start = time.perf_counter()
+        with self._lock:
+            count = self.trace.count
+            # New samples, plus a projection window of context before the first one not yet in the pulse
+            first = max(self._pulse_done - self._context, count - len(self.trace))
+            rgb = self.trace.tail(count - first)
+        # Breathing modulates overall skin brightness
+        self._rr_spectrum.push(rgb[max(self._rr_spectrum.count, first) - first:].mean(axis=1))
+        # A sample's pulse is final once every projection window over it is in
+        end = count - self._context
+        done = max(self._pulse_done, first)
+        if end > done:
+            if np.all(rgb.mean(axis=0) > 0):
+                pulse = ALGORITHMS[self.method](rgb, self.fps)[done - first:end - first]
+            else:
+                pulse = np.zeros(end - done)  # no face yet
+            self._hr_spectrum.push(pulse)
+            self._pulse_done = end
+        if len(self._hr_spectrum) < MIN_TRACE_S * self.fps:
+            return
+        hr, hr_conf = self._hr_spectrum.rate()
+        rr, rr_conf = self._rr_spectrum.rate()
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        estimate = {
+            't': self.stats['frames_received'] / self.fps,
+            'heart_rate': float(hr[0]),
+            'heart_rate_confidence': float(hr_conf[0]),
+            'respiratory_rate': float(rr[0]),
+            'respiratory_rate_confidence': float(rr_conf[0]),
+        }
+        with self._lock:
+            self.latest = estimate
+            self.history.append(estimate)
+            s = self.stats
+            s['updates'] += 1
+            s['update_ms_last'] = elapsed_ms
+            s['update_ms_max'] = max(s['update_ms_max'], elapsed_ms)
+            s['update_ms_total'] += elapsed_ms
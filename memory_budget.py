@@ -0,0 +1,216 @@
+"""
+Process-wide memory budget.
+Every analysis reserves its estimated footprint against one budget shared by
+all sessions and jobs in the process. The footprint is worked out from the
+container metadata before anything is decoded: decoder scratch, the frame
+buffer or face ROI crops, and the inference working set. A request that does
+not fit in what is left is made to fit, cheapest option first: its frame
+buffer is spilled to a memory-mapped file, then it is decoded at a lower
+resolution (down to MIN_PIXELS), and otherwise it waits, first come first
+served, until running analyses release enough. A video too large for the
+whole budget runs alone at its smallest setting.
+
+MEMORY_BUDGET_BYTES sets the budget (default: half of physical memory). It
+covers analysis buffers, not the baseline memory of the app itself.
+"""
+
+import collections
+import contextlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+
+from metrics import REGISTRY
+from pipeline import PipelineCancelled
+from video_loader import DEFAULT_MAX_FRAMES, expected_frames, probe_video, scaled_size
+
+
+def _physical_memory_bytes():
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return 8 * 1024 ** 3
+
+
+DEFAULT_BUDGET_BYTES = int(os.environ.get('MEMORY_BUDGET_BYTES', _physical_memory_bytes() // 2))
+MIN_PIXELS = 480 * 270  # downscaling stops here; faces stay ~50 px wide
+DECODER_FRAMES = 6  # source-size frames held by the decoder (reference frames, threads, conversion)
+CROP_BYTES = 64 * 64 * 3 + 7 * 8  # per frame on the ROI stage: API crop, skin mean and box
+API_INPUT_BYTES = 40 * 40 * 3 * 4  # per frame sent to the API: crop, request copy, base64, gzip
+WINDOW_BUFFERS = 2  # analysis.analyze_video_windowed's prefetch_depth
+RUNTIME_BYTES = 64 * 1024 ** 2  # detector and inference scratch, allocator slack
+
+
+@dataclass
+class Footprint:
+    """Estimated bytes an analysis holds at its peak."""
+    resident: int  # must stay in RAM
+    spillable: int = 0  # frame buffer that can live in a memory-mapped file instead
+
+    @property
+    def total(self):
+        return self.resident + self.spillable
+
+
+def estimate_footprint(info, settings):
+    """Footprint of analyzing a video with `info` = probe_video(...) under `settings`.
+
+    Mirrors the three paths of analysis.analyze_video: fixed-length windows
+    for videos longer than `max_frames`, the face ROI stage, or a full frame
+    buffer (the only part that can spill). The ROI stage keeps crops for
+    each of up to `max_subjects` faces.
+    """
+    n_frames, src_w, src_h, fps = info
+    src_w, src_h = max(src_w, 1), max(src_h, 1)
+    width, height = scaled_size(src_w, src_h, None, settings['max_pixels'])
+    frame_bytes = width * height * 3
+    fixed = src_w * src_h * 3 * DECODER_FRAMES + RUNTIME_BYTES
+    kept = expected_frames(n_frames, fps, settings['target_fps'])
+    api = settings['method'] == 'VITALLENS'
+    if kept > settings['max_frames']:
+        out_fps = fps if fps > 0 else 30
+        window = int(round(settings['window_s'] * min(out_fps, settings['target_fps'] or out_fps)))
+        inference = window * (API_INPUT_BYTES if api and settings['reduce_api_payload'] else frame_bytes if api else 0)
+        return Footprint(fixed + WINDOW_BUFFERS * window * frame_bytes + inference)
+    kept = kept if kept > 0 else settings['max_frames'] or DEFAULT_MAX_FRAMES
+    if settings['roi_stage']:
+        per_face = kept * (CROP_BYTES + (API_INPUT_BYTES if api else 0))
+        return Footprint(fixed + frame_bytes + settings['max_subjects'] * per_face)
+    if api:
+        inference = kept * (API_INPUT_BYTES if settings['reduce_api_payload'] else frame_bytes)
+    else:
+        inference = 0
+    return Footprint(fixed + inference, spillable=kept * frame_bytes)
+
+
+@dataclass
+class Admission:
+    """How an analysis was let in: the settings to run with and what it reserved."""
+    settings: dict
+    decision: str  # 'admit', 'spill', 'downscale' or 'oversized'
+    reserved_bytes: int
+    requested_bytes: int
+    wait_s: float = 0.0
+
+    def as_dict(self):
+        return {'decision': self.decision, 'reserved_bytes': self.reserved_bytes,
+                'requested_bytes': self.requested_bytes, 'wait_s': self.wait_s,
+                'max_pixels': self.settings['max_pixels']}
+
+
+class MemoryBudget:
+    """Byte reservations against a fixed budget, safe to share between threads."""
+
+    def __init__(self, budget_bytes=DEFAULT_BUDGET_BYTES, min_pixels=MIN_PIXELS, registry=REGISTRY):
+        self.budget_bytes = budget_bytes
+        self.min_pixels = min_pixels
+        self._cond = threading.Condition()
+        self._reserved = 0
+        self._active = 0
+        self._waiting = collections.deque()
+        self.stats = {'admitted': 0, 'spilled': 0, 'downscaled': 0, 'oversized': 0, 'queued': 0,
+                      'wait_s_total': 0.0, 'wait_s_max': 0.0, 'peak_reserved_bytes': 0}
+        if registry is not None:
+            registry.add_gauge('vitallens_memory_budget_bytes', 'Memory budget for analyses.',
+                               lambda: self.budget_bytes)
+            registry.add_gauge('vitallens_memory_reserved_bytes', 'Memory reserved by running analyses.',
+                               lambda: self._reserved)
+            registry.add_gauge('vitallens_memory_waiting', 'Analyses waiting for memory.',
+                               lambda: len(self._waiting))
+
+    def _options(self, info, settings):
+        """(decision, settings, footprint) in order of preference, smallest last."""
+        footprint = estimate_footprint(info, settings)
+        yield 'admit', settings, footprint.resident + footprint.spillable
+        if footprint.spillable:
+            settings = dict(settings, spill_threshold=0)
+            yield 'spill', settings, footprint.resident
+        width, height = scaled_size(max(info[1], 1), max(info[2], 1), None, settings['max_pixels'])
+        pixels = width * height
+        while pixels > self.min_pixels:
+            pixels = max(pixels // 2, self.min_pixels)
+            reduced = dict(settings, max_pixels=pixels)
+            yield 'downscale', reduced, estimate_footprint(info, reduced).resident
+
+    def _plan(self, info, settings):
+        # Called with the lock held
+        available = self.budget_bytes - self._reserved
+        options = list(self._options(info, settings))
+        for option in options:
+            if option[2] <= available:
+                return option
+        if self._active == 0:
+            return ('oversized',) + options[-1][1:]
+        return None
+
+    @contextlib.contextmanager
+    def reserve(self, video_path, settings, progress=None, cancel=None):
+        """Hold a reservation for analyzing `video_path` while the block runs.
+
+        Yields an Admission whose `settings` may have a lower `max_pixels` or
+        a zero `spill_threshold`. While waiting, `progress('memory')` is
+        called once and `cancel` is checked every 0.1 s.
+
+        Raises:
+            IOError: If the video cannot be probed.
+            pipeline.PipelineCancelled: If `cancel` was set while waiting.
+        """
+        info = probe_video(video_path)
+        requested = estimate_footprint(info, settings).total
+        ticket = object()
+        start = time.perf_counter()
+        with self._cond:
+            self._waiting.append(ticket)
+            queued = False
+            try:
+                while True:
+                    plan = self._plan(info, settings) if self._waiting[0] is ticket else None
+                    if plan is not None:
+                        break
+                    if cancel is not None and cancel.is_set():
+                        raise PipelineCancelled()
+                    if not queued:
+                        queued = True
+                        self.stats['queued'] += 1
+                        if progress is not None:
+                            progress('memory')
+                    self._cond.wait(0.1)
+            finally:
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+            decision, run_settings, reserved = plan
+            wait_s = time.perf_counter() - start if queued else 0.0
+            self._reserved += reserved
+            self._active += 1
+            self.stats[{'admit': 'admitted', 'spill': 'spilled', 'downscale': 'downscaled',
+                        'oversized': 'oversized'}[decision]] += 1
+            self.stats['wait_s_total'] += wait_s
+            self.stats['wait_s_max'] = max(self.stats['wait_s_max'], wait_s)
+            self.stats['peak_reserved_bytes'] = max(self.stats['peak_reserved_bytes'], self._reserved)
+        try:
+            yield Admission(run_settings, decision, reserved, requested, wait_s)
+        finally:
+            with self._cond:
+                self._reserved -= reserved
+                self._active -= 1
+                self._cond.notify_all()
+
+    def snapshot(self):
+        """Budget, current reservations and admission counters for display."""
+        with self._cond:
+            return dict(self.stats, budget_bytes=self.budget_bytes, reserved_bytes=self._reserved,
+                        active=self._active, waiting=len(self._waiting))
+
+
+_budget = None
+_budget_lock = threading.Lock()
+
+
+def get_budget():
+    """The process-wide memory budget."""
+    global _budget
+    with _budget_lock:
+        if _budget is None:
+            _budget = MemoryBudget()
+        return _budget
@@ -0,0 +1,92 @@
+"""
+Process memory statistics.
+Reads current and peak resident set size (RSS) without extra dependencies.
+"""
+
+import resource
+import sys
+
+
+def _read_status_kb(field):
+    """Return a kB value from /proc/self/status, or None when unavailable."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def current_rss_bytes():
+    """Current resident set size of this process in bytes."""
+    kb = _read_status_kb('VmRSS')
+    if kb is not None:
+        return kb * 1024
+    return peak_rss_bytes()
+
+
+def anon_rss_bytes():
+    """Anonymous (heap) part of the current RSS, leaving out file-backed pages such as memory-mapped frames."""
+    kb = _read_status_kb('RssAnon')
+    if kb is not None:
+        return kb * 1024
+    return current_rss_bytes()
+
+
+def peak_rss_bytes():
+    """Peak resident set size since process start (or the last reset) in bytes."""
+    kb = _read_status_kb('VmHWM')
+    if kb is not None:
+        return kb * 1024
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports kilobytes
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def reset_peak_rss():
+    """Reset the peak RSS counter so the next reading covers only new work.
+
+    The counter is process-wide, so this is for benchmarks that run one job
+    per process; concurrent work measures itself with RssPeak instead. Only
+    supported on Linux; returns False where the counter cannot be reset.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+class RssPeak:
+    """Peak RSS over a span of work, without resetting the process-wide counter.
+
+    If the process high-water mark rose during the span, the span reached it;
+    otherwise the peak is the largest RSS sampled at the start, at sample()
+    calls and at the end.
+    """
+
+    def __init__(self):
+        self.start_hwm = peak_rss_bytes()
+        self.sampled = current_rss_bytes()
+
+    def sample(self, rss=None):
+        """Record the current RSS (or an `rss` reading the caller already took)."""
+        self.sampled = max(self.sampled, current_rss_bytes() if rss is None else rss)
+
+    def peak(self):
+        """Peak RSS in bytes so far."""
+        self.sample()
+        hwm = peak_rss_bytes()
+        return hwm if hwm > self.start_hwm else self.sampled
+
+
+def format_bytes(n):
+    """Human readable byte count, e.g. '1.5 GB'."""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if abs(n) < 1024:
+            return f"{n:.1f} {unit}" if unit != 'B' else f"{n} B"
+        n /= 1024
+    return f"{n:.1f} TB"
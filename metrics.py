@@ -0,0 +1,293 @@
+"""
+Per-stage timing and memory instrumentation.
+An analysis runs inside `trace()`; code along the path wraps each stage in
+`stage(name)`, which adds its wall time (and, unless memory=False, its RSS
+change) to the current trace. Finished traces are logged as one JSON line
+and folded into process-wide per-stage histograms, exported in the
+Prometheus text format over HTTP (`start_http_server`) or as a textfile.
+
+VITALLENS_METRICS=0 turns `stage()` into a shared no-op context manager.
+VITALLENS_METRICS_LOG appends the JSON lines to a file and
+VITALLENS_METRICS_FILE rewrites a Prometheus textfile after every trace.
+"""
+
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from memstats import RssPeak, current_rss_bytes
+
+ENABLED = os.environ.get('VITALLENS_METRICS', '1') != '0'
+LOG_PATH = os.environ.get('VITALLENS_METRICS_LOG') or None
+TEXTFILE_PATH = os.environ.get('VITALLENS_METRICS_FILE') or None
+
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+RSS_BUCKETS = tuple(mb * 1024 ** 2 for mb in (128, 256, 512, 1024, 2048, 4096, 8192))
+
+logger = logging.getLogger('metrics')
+_current = contextvars.ContextVar('metrics_trace', default=None)
+
+
+class Trace:
+    """Stage timings and memory counters of one analysis."""
+
+    def __init__(self, kind='analysis', **labels):
+        self.kind = kind
+        self.labels = labels
+        self.status = 'ok'
+        self.stages = {}
+        self.start = time.perf_counter()
+        self.total_s = None
+        self.peak_rss_bytes = None
+        # Sampled at stage ends; other analyses in the process share the high-water mark
+        self._rss = RssPeak()
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, rss_delta=None, calls=1, rss=None):
+        """Add `seconds` (and an RSS change in bytes) to stage `name`; `rss` is the RSS at its end."""
+        with self._lock:
+            if rss is not None:
+                self._rss.sample(rss)
+            s = self.stages.get(name)
+            if s is None:
+                s = self.stages[name] = {'seconds': 0.0, 'calls': 0, 'rss_delta_bytes': None}
+            s['seconds'] += seconds
+            s['calls'] += calls
+            if rss_delta is not None:
+                s['rss_delta_bytes'] = (s['rss_delta_bytes'] or 0) + rss_delta
+
+    def finish(self):
+        self.total_s = time.perf_counter() - self.start
+        with self._lock:
+            self.peak_rss_bytes = self._rss.peak()
+
+    def summary(self):
+        """Plain-dict view, suitable for JSON and the debug sidebar."""
+        with self._lock:
+            stages = {name: dict(s) for name, s in self.stages.items()}
+        return {
+            'kind': self.kind,
+            'labels': self.labels,
+            'status': self.status,
+            'total_s': self.total_s,
+            'peak_rss_bytes': self.peak_rss_bytes,
+            'stages': stages,
+        }
+
+
+class _Stage:
+    __slots__ = ('trace', 'name', 'memory', 't0', 'rss0')
+
+    def __init__(self, trace, name, memory):
+        self.trace = trace
+        self.name = name
+        self.memory = memory
+
+    def __enter__(self):
+        self.rss0 = current_rss_bytes() if self.memory else None
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.t0
+        rss = current_rss_bytes() if self.memory else None
+        rss_delta = rss - self.rss0 if self.memory else None
+        if self.trace is not None:
+            self.trace.record(self.name, seconds, rss_delta, rss=rss)
+        else:
+            # Work outside an analysis (e.g. chart rendering) still feeds the histograms
+            REGISTRY.observe_stage(self.name, seconds, rss_delta)
+
+
+_NOOP = contextlib.nullcontext()
+
+
+def current_trace():
+    """The trace of the running analysis, or None."""
+    return _current.get()
+
+
+def stage(name, memory=True):
+    """Context manager timing one stage of the current trace.
+
+    memory=False skips the RSS reads, for stages entered once per frame.
+    """
+    if not ENABLED:
+        return _NOOP
+    return _Stage(_current.get(), name, memory)
+
+
+@contextlib.contextmanager
+def trace(kind='analysis', **labels):
+    """Run the block as one traced analysis; nested calls join the outer trace."""
+    outer = _current.get()
+    if outer is not None or not ENABLED:
+        yield outer
+        return
+    tr = Trace(kind, **labels)
+    token = _current.set(tr)
+    try:
+        yield tr
+    # Script control flow (e.g. Streamlit's rerun) is not an error
+    except Exception:
+        tr.status = 'error'
+        raise
+    finally:
+        _current.reset(token)
+        tr.finish()
+        _export(tr)
+
+
+def _export(tr):
+    summary = tr.summary()
+    REGISTRY.observe_trace(tr)
+    line = json.dumps(summary, default=str)
+    logger.info(line)
+    try:
+        if LOG_PATH:
+            with open(LOG_PATH, 'a') as f:
+                f.write(line + '\n')
+        if TEXTFILE_PATH:
+            REGISTRY.write_textfile(TEXTFILE_PATH)
+    except OSError as e:
+        logger.warning(f"Could not write metrics: {e}")
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+
+class Registry:
+    """Process-wide metrics across every session, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage_seconds = {}
+        self.stage_rss = {}  # stage -> [sum, count]
+        self.traces = {}  # (kind, status) -> count
+        self.peak_rss = _Histogram(RSS_BUCKETS)
+        self.job_wait = _Histogram(STAGE_BUCKETS)
+        self.gauges = {}  # name -> (help, callable), read at render time
+
+    def add_gauge(self, name, help, fn):
+        """Export `fn()` as gauge `name` (e.g. a queue depth)."""
+        with self._lock:
+            self.gauges[name] = (help, fn)
+
+    def observe_job_wait(self, seconds):
+        with self._lock:
+            self.job_wait.observe(seconds)
+
+    def observe_stage(self, name, seconds, rss_delta=None):
+        with self._lock:
+            self._observe_stage(name, seconds, rss_delta)
+
+    def _observe_stage(self, name, seconds, rss_delta):
+        hist = self.stage_seconds.get(name)
+        if hist is None:
+            hist = self.stage_seconds[name] = _Histogram(STAGE_BUCKETS)
+        hist.observe(seconds)
+        if rss_delta is not None:
+            rss = self.stage_rss.setdefault(name, [0, 0])
+            rss[0] += rss_delta
+            rss[1] += 1
+
+    def observe_trace(self, tr):
+        with self._lock:
+            for name, s in tr.stages.items():
+                self._observe_stage(name, s['seconds'], s['rss_delta_bytes'])
+            self._observe_stage('total', tr.total_s, None)
+            key = (tr.kind, tr.status)
+            self.traces[key] = self.traces.get(key, 0) + 1
+            self.peak_rss.observe(tr.peak_rss_bytes)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines.append('# HELP vitallens_stage_seconds Wall time per analysis stage.')
+            lines.append('# TYPE vitallens_stage_seconds histogram')
+            for name, hist in sorted(self.stage_seconds.items()):
+                lines.extend(_histogram_lines('vitallens_stage_seconds', hist, f'stage="{name}"'))
+            lines.append('# HELP vitallens_stage_rss_delta_bytes Resident memory change per analysis stage.')
+            lines.append('# TYPE vitallens_stage_rss_delta_bytes summary')
+            for name, (total, count) in sorted(self.stage_rss.items()):
+                lines.append(f'vitallens_stage_rss_delta_bytes_sum{{stage="{name}"}} {total}')
+                lines.append(f'vitallens_stage_rss_delta_bytes_count{{stage="{name}"}} {count}')
+            lines.append('# HELP vitallens_analysis_peak_rss_bytes Process peak RSS at the end of each analysis.')
+            lines.append('# TYPE vitallens_analysis_peak_rss_bytes histogram')
+            lines.extend(_histogram_lines('vitallens_analysis_peak_rss_bytes', self.peak_rss, ''))
+            lines.append('# HELP vitallens_analyses_total Finished analyses.')
+            lines.append('# TYPE vitallens_analyses_total counter')
+            for (kind, status), count in sorted(self.traces.items()):
+                lines.append(f'vitallens_analyses_total{{kind="{kind}",status="{status}"}} {count}')
+            lines.append('# HELP vitallens_job_wait_seconds Time analysis jobs spent queued before a worker took them.')
+            lines.append('# TYPE vitallens_job_wait_seconds histogram')
+            lines.extend(_histogram_lines('vitallens_job_wait_seconds', self.job_wait, ''))
+            gauges = sorted(self.gauges.items())
+        for name, (help, fn) in gauges:
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} gauge')
+            lines.append(f'{name} {fn()}')
+        lines.append(f'vitallens_process_rss_bytes {current_rss_bytes()}')
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        """Atomically rewrite `path` (e.g. for node_exporter's textfile collector)."""
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp, path)
+
+
+def _histogram_lines(metric, hist, labels):
+    sep = ',' if labels else ''
+    lines = []
+    for upper, count in zip(hist.buckets, hist.counts):
+        lines.append(f'{metric}_bucket{{{labels}{sep}le="{upper:g}"}} {count}')
+    lines.append(f'{metric}_bucket{{{labels}{sep}le="+Inf"}} {hist.count}')
+    braces = f'{{{labels}}}' if labels else ''
+    lines.append(f'{metric}_sum{braces} {hist.sum:g}')
+    lines.append(f'{metric}_count{braces} {hist.count}')
+    return lines
+
+
+REGISTRY = Registry()
+
+
+def start_http_server(port, host='0.0.0.0', registry=REGISTRY):
+    """Serve `registry` at http://host:port/metrics on a daemon thread."""
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split('?')[0] not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            data = registry.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
@@ -0,0 +1,104 @@
+"""
+Producer/consumer pipelining.
+Runs a frame source (e.g. video_loader.FrameWindows) in a background decode
+thread so the next chunk is decoded while the caller runs inference on the
+current one. The number of chunks alive at once is bounded, which is what
+lets a source recycle a fixed set of buffers, and the pipeline can be
+cancelled from either side.
+"""
+
+import contextvars
+import queue
+import threading
+
+_DONE = object()
+
+
+class PipelineCancelled(Exception):
+    """Raised in the consumer when the pipeline's cancel event is set."""
+
+
+class _Failure:
+    def __init__(self, error):
+        self.error = error
+
+
+def prefetch(source, depth=2, cancel=None):
+    """Iterate `source` in a background thread.
+
+    At most `depth` items are alive at once, counting the one the consumer
+    is working on and the one being produced, so a source that rotates
+    through `depth` buffers never overwrites a chunk still in use. With
+    depth=1 the source runs inline and nothing overlaps.
+
+    Setting `cancel` (a threading.Event) stops the producer at the next
+    chunk and raises PipelineCancelled in the consumer. Closing the
+    generator early (break, exception, Streamlit stopping the script) also
+    stops and joins the producer. Exceptions in the producer are re-raised
+    in the consumer.
+    """
+    cancel = cancel if cancel is not None else threading.Event()
+    if depth <= 1:
+        for item in source:
+            if cancel.is_set():
+                raise PipelineCancelled()
+            yield item
+        return
+
+    slots = threading.Semaphore(depth)
+    items = queue.Queue()
+    stop = threading.Event()
+
+    def produce():
+        iterator = None
+        try:
+            iterator = iter(source)
+            while True:
+                # Wait for a free slot before touching the next buffer
+                while not slots.acquire(timeout=0.1):
+                    if stop.is_set() or cancel.is_set():
+                        return
+                if stop.is_set() or cancel.is_set():
+                    return
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                items.put(item)
+        except BaseException as e:
+            items.put(_Failure(e))
+        finally:
+            # Close a generator source here so its cleanup runs on this thread
+            close = getattr(iterator, 'close', None)
+            if close is not None:
+                close()
+            items.put(_DONE)
+
+    # The producer inherits the caller's context, e.g. the active metrics trace
+    producer = threading.Thread(target=contextvars.copy_context().run, args=(produce,), name='prefetch', daemon=True)
+    producer.start()
+    try:
+        first = True
+        while True:
+            if not first:
+                slots.release()  # the previous item is no longer in use
+            first = False
+            if cancel.is_set():
+                raise PipelineCancelled()
+            while True:
+                try:
+                    item = items.get(timeout=0.1)
+                    break
+                except queue.Empty:
+                    if cancel.is_set():
+                        raise PipelineCancelled()
+            if item is _DONE:
+                if cancel.is_set():
+                    raise PipelineCancelled()
+                return
+            if isinstance(item, _Failure):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+        producer.join()
@@ -0,0 +1,170 @@
+"""
+Content-addressed cache for analysis results.
+Results are keyed on a hash of the uploaded video bytes plus the analysis
+settings, held in a bounded in-memory LRU and backed by a size-capped
+on-disk store so re-uploads and Streamlit reruns skip decode and analysis.
+The store is only used from a directory that belongs to the current user and
+that no one else can write to, since its entries are unpickled.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def user_cache_dir(name):
+    """Directory `name` in the temp dir, suffixed with the user id where there is one."""
+    if hasattr(os, 'getuid'):
+        name = f'{name}-{os.getuid()}'
+    return os.path.join(tempfile.gettempdir(), name)
+
+
+def private_dir(path, narrow=True):
+    """Create `path` with mode 0o700, returning False if another user could have written to it.
+
+    With `narrow`, an existing directory of the current user that only it can
+    write to is narrowed to 0o700 as well.
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if not hasattr(os, 'getuid'):
+        return True
+    st = os.stat(path)
+    if st.st_uid != os.getuid() or st.st_mode & 0o022:
+        logging.warning(f"Not using directory {path}: it must be owned by this user and not writable by others")
+        return False
+    if narrow and st.st_mode & 0o077:
+        os.chmod(path, 0o700)
+    return True
+
+
+DEFAULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR', user_cache_dir('vitallens_result_cache'))
+DEFAULT_MAX_MEMORY_BYTES = int(os.environ.get('RESULT_CACHE_MAX_MEMORY_BYTES', 64 * 1024 ** 2))
+DEFAULT_MAX_DISK_BYTES = int(os.environ.get('RESULT_CACHE_MAX_DISK_BYTES', 512 * 1024 ** 2))
+
+
+def content_hash(data):
+    """SHA-256 hex digest of raw uploaded bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def cache_key(video_hash, settings):
+    """Combine a content hash with the analysis settings that affect the result."""
+    encoded = json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.sha256(f"{video_hash}:{encoded}".encode()).hexdigest()
+
+
+class ResultCache:
+    """Two-level LRU cache of pickled result payloads, evicted by total bytes."""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_memory_bytes=DEFAULT_MAX_MEMORY_BYTES,
+                 max_disk_bytes=DEFAULT_MAX_DISK_BYTES):
+        self.cache_dir = cache_dir
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+        if cache_dir and max_disk_bytes > 0:
+            if private_dir(cache_dir):
+                self._disk_bytes = sum(size for _, _, size in self._disk_entries())
+            else:
+                self.cache_dir = None  # memory only
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _disk_entries(self):
+        """(mtime, path, size) for every stored entry."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.pkl'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, path, st.st_size))
+        return entries
+
+    def _remember(self, key, blob):
+        if len(blob) > self.max_memory_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        self._memory[key] = blob
+        self._memory_bytes += len(blob)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.stats['evictions'] += 1
+
+    def _evict_disk(self):
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+        entries = sorted(self._disk_entries())
+        self._disk_bytes = sum(size for _, _, size in entries)
+        for _, path, size in entries:
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            self._disk_bytes -= size
+            self.stats['evictions'] += 1
+
+    def get(self, key):
+        """Return the cached payload for `key`, or None on a miss."""
+        with self._lock:
+            blob = self._memory.get(key)
+            if blob is not None:
+                self._memory.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return pickle.loads(blob)
+            if self.cache_dir and self.max_disk_bytes > 0:
+                path = self._path(key)
+                try:
+                    with open(path, 'rb') as f:
+                        blob = f.read()
+                    os.utime(path)  # refresh LRU position
+                except OSError:
+                    blob = None
+                if blob is not None:
+                    self.stats['disk_hits'] += 1
+                    self._remember(key, blob)
+                    return pickle.loads(blob)
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, key, payload):
+        """Store `payload` (any picklable object) under `key`."""
+        blob = pickle.dumps(payload, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._remember(key, blob)
+            if not self.cache_dir or len(blob) > self.max_disk_bytes:
+                return
+            path = self._path(key)
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(blob)
+            os.replace(tmp_path, path)
+            self._disk_bytes += len(blob) - old_size
+            self._evict_disk()
+
+    def snapshot(self):
+        """Counters and sizes for display."""
+        with self._lock:
+            return dict(self.stats,
+                        hits=self.stats['memory_hits'] + self.stats['disk_hits'],
+                        memory_entries=len(self._memory),
+                        memory_bytes=self._memory_bytes,
+                        disk_bytes=self._disk_bytes)
@@ -0,0 +1,283 @@
+"""
+Persistent store of scan results.
+Each analysis is one row of a SQLite table (user, time, method, HR, RR),
+indexed for lookups by user and time range, and its rolling HR/RR series are
+kept beside it as compact binary blobs: values quantized to 0.01 and stored
+as zlib-compressed int8/16/32 deltas, or as float32 when a series has gaps.
+
+RESULTS_DB_PATH sets the database file (default: results.sqlite3 in
+VITALLENS_DATA_DIR, itself by default $XDG_DATA_HOME/vitallens). The file is
+created with mode 0o600, and only in a directory that belongs to the user
+and that no one else can write to; the data directory is created with 0o700.
+
+    python results_store.py export --user alice --since 2026-01-01 -o alice.jsonl
+"""
+
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import zlib
+
+from result_cache import private_dir
+
+DEFAULT_DATA_DIR = os.environ.get('VITALLENS_DATA_DIR', os.path.join(
+    os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share'), 'vitallens'))
+DEFAULT_DB_PATH = os.environ.get('RESULTS_DB_PATH', os.path.join(DEFAULT_DATA_DIR, 'results.sqlite3'))
+SERIES = ('rolling_heart_rate', 'rolling_respiratory_rate')
+SCALE = 100  # series are stored in units of 0.01 bpm / rpm
+
+_FLOAT32, _DELTA8, _DELTA16, _DELTA32 = 0, 1, 2, 3
+_DELTA_DTYPES = {_DELTA8: '<i1', _DELTA16: '<i2', _DELTA32: '<i4'}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    id INTEGER PRIMARY KEY,
+    user TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    method TEXT,
+    fps REAL,
+    n_frames INTEGER,
+    result_key TEXT,
+    heart_rate REAL,
+    respiratory_rate REAL
+);
+-- Covers user/time range lookups and HR/RR trends without touching the table
+CREATE INDEX IF NOT EXISTS scans_user_time ON scans (user, created_at, heart_rate, respiratory_rate);
+CREATE INDEX IF NOT EXISTS scans_time ON scans (created_at);
+CREATE TABLE IF NOT EXISTS series (
+    scan_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (scan_id, name)
+) WITHOUT ROWID;
+"""
+
+SCAN_COLUMNS = ('id', 'user', 'created_at', 'method', 'fps', 'n_frames', 'result_key', 'heart_rate', 'respiratory_rate')
+
+
+def encode_series(values):
+    """Pack a rolling series into a blob; the first byte names the encoding.
+
+    Finite series are stored as the first quantized value (int32) followed by
+    the narrowest integer deltas that fit, so a slowly drifting rate costs
+    well under a byte per sample.
+    """
+    # Imported here so the app can list history without loading numpy
+    import numpy as np
+    values = np.asarray(values, dtype=np.float64)
+    if values.size and np.isfinite(values).all() and np.abs(values).max() * SCALE < 2 ** 31:
+        quantized = np.rint(values * SCALE).astype(np.int64)
+        deltas = np.diff(quantized)
+        widest = np.abs(deltas).max() if deltas.size else 0
+        # zlib level 1: on small deltas higher levels take twice as long for ~1% less
+        for encoding, dtype in _DELTA_DTYPES.items():
+            if widest < 2 ** (8 * np.dtype(dtype).itemsize - 1):
+                return (bytes([encoding]) + struct.pack('<i', quantized[0])
+                        + zlib.compress(deltas.astype(dtype).tobytes(), 1))
+    return bytes([_FLOAT32]) + zlib.compress(values.astype('<f4').tobytes(), 1)
+
+
+def decode_series(blob):
+    """Inverse of encode_series, as a float32 array."""
+    import numpy as np
+    encoding = blob[0]
+    if encoding == _FLOAT32:
+        return np.frombuffer(zlib.decompress(blob[1:]), dtype='<f4').astype(np.float32)
+    first, = struct.unpack_from('<i', blob, 1)
+    deltas = np.frombuffer(zlib.decompress(blob[5:]), dtype=_DELTA_DTYPES[encoding])
+    quantized = np.empty(deltas.size + 1, dtype=np.int64)
+    quantized[0] = first
+    np.cumsum(deltas, out=quantized[1:])
+    quantized[1:] += first
+    return (quantized / SCALE).astype(np.float32)
+
+
+def _json_series(values):
+    # Two decimals is the stored precision; gaps become null
+    values = values.astype(float).round(2)
+    return [None if v != v else v for v in values.tolist()]
+
+
+def _timestamp(value):
+    """Seconds since the epoch from a number, datetime or ISO date string."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value)
+    return value.timestamp()
+
+
+class ResultsStore:
+    """SQLite-backed scan history, safe to share between threads."""
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        if path != ':memory:':
+            # Health data: never in a directory others can write to
+            if not private_dir(os.path.dirname(os.path.abspath(path)), narrow=False):
+                raise PermissionError(f"Not opening results database {path} in a directory others can write to")
+            os.close(os.open(path, os.O_CREAT | os.O_WRONLY, 0o600))
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+        self.stats = {'scans_added': 0, 'queries': 0, 'series_bytes': 0, 'series_raw_bytes': 0}
+
+    def add(self, user, row, created_at=None):
+        """Record one scan and return its id.
+
+        `row` is an analysis.summarize_vitals dict, optionally with `method`,
+        `fps`, `n_frames` and `result_key` (batch_cli rows have this shape).
+        """
+        return self.add_many([(user, row, created_at)])[0]
+
+    def add_many(self, scans):
+        """Record (user, row, created_at) tuples in one transaction; returns their ids."""
+        encoded = []
+        for user, row, created_at in scans:
+            series = [(name, encode_series(row[name]), len(row[name]) * 8) for name in SERIES
+                      if row.get(name) is not None]
+            values = (user, _timestamp(created_at) or time.time(), row.get('method'), row.get('fps'),
+                      row.get('n_frames'), row.get('result_key'), row.get('heart_rate'), row.get('respiratory_rate'))
+            encoded.append((values, series))
+        ids = []
+        with self._lock, self._db:
+            for values, series in encoded:
+                cursor = self._db.execute(
+                    'INSERT INTO scans (user, created_at, method, fps, n_frames, result_key, heart_rate, '
+                    'respiratory_rate) VALUES (?, ?, ?, ?, ?, ?, ?, ?)', values)
+                ids.append(cursor.lastrowid)
+                self._db.executemany('INSERT INTO series (scan_id, name, data) VALUES (?, ?, ?)',
+                                     [(cursor.lastrowid, name, blob) for name, blob, _ in series])
+                self.stats['series_bytes'] += sum(len(blob) for _, blob, _ in series)
+                self.stats['series_raw_bytes'] += sum(raw for _, _, raw in series)
+            self.stats['scans_added'] += len(encoded)
+        return ids
+
+    def _range(self, user, since, until):
+        clauses, params = [], []
+        if user is not None:
+            clauses.append('user = ?')
+            params.append(user)
+        if since is not None:
+            clauses.append('created_at >= ?')
+            params.append(_timestamp(since))
+        if until is not None:
+            clauses.append('created_at < ?')
+            params.append(_timestamp(until))
+        return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+    def query(self, user=None, since=None, until=None, limit=None):
+        """Scans in [since, until), newest first, as dicts without their series."""
+        where, params = self._range(user, since, until)
+        sql = f'SELECT {", ".join(SCAN_COLUMNS)} FROM scans{where} ORDER BY created_at DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        with self._lock:
+            self.stats['queries'] += 1
+            rows = self._db.execute(sql, params).fetchall()
+        return [dict(zip(SCAN_COLUMNS, row)) for row in rows]
+
+    def trend(self, user, since=None, until=None):
+        """(created_at, heart_rate, respiratory_rate) tuples for `user`, oldest first.
+
+        Answered from the user/time index alone.
+        """
+        where, params = self._range(user, since, until)
+        with self._lock:
+            self.stats['queries'] += 1
+            return self._db.execute(
+                f'SELECT created_at, heart_rate, respiratory_rate FROM scans{where} ORDER BY created_at',
+                params).fetchall()
+
+    def series(self, scan_id):
+        """The rolling series of one scan, {name: float32 array}."""
+        with self._lock:
+            self.stats['queries'] += 1
+            rows = self._db.execute('SELECT name, data FROM series WHERE scan_id = ?', (scan_id,)).fetchall()
+        return {name: decode_series(blob) for name, blob in rows}
+
+    def export(self, f, user=None, since=None, until=None, batch_size=1000):
+        """Write matching scans with their series to `f` as JSON lines, oldest first; returns the count.
+
+        Rows are streamed in batches of `batch_size`, so the export never
+        holds the whole range in memory.
+        """
+        where, params = self._range(user, since, until)
+        count = 0
+        last = (float('-inf'), 0)
+        while True:
+            # Keyset pagination: each batch resumes after the last (created_at, id) written
+            page = (' AND ' if where else ' WHERE ') + '(created_at > ? OR (created_at = ? AND id > ?))'
+            with self._lock:
+                rows = self._db.execute(
+                    f'SELECT {", ".join(SCAN_COLUMNS)} FROM scans{where}{page} ORDER BY created_at, id LIMIT ?',
+                    params + [last[0], last[0], last[1], batch_size]).fetchall()
+                ids = [row[0] for row in rows]
+                blobs = self._db.execute(
+                    f'SELECT scan_id, name, data FROM series WHERE scan_id IN ({", ".join("?" * len(ids))})',
+                    ids).fetchall() if ids else []
+            series = {}
+            for scan_id, name, blob in blobs:
+                series.setdefault(scan_id, {})[name] = _json_series(decode_series(blob))
+            for row in rows:
+                scan = dict(zip(SCAN_COLUMNS, row))
+                scan.update(series.get(scan['id'], {}))
+                f.write(json.dumps(scan) + '\n')
+            count += len(rows)
+            if len(rows) < batch_size:
+                return count
+            last = (rows[-1][2], rows[-1][0])
+
+    def count(self, user=None):
+        """Number of stored scans, for one user or all."""
+        where, params = self._range(user, None, None)
+        with self._lock:
+            return self._db.execute(f'SELECT COUNT(*) FROM scans{where}', params).fetchone()[0]
+
+    def snapshot(self):
+        """Counters and file size for display."""
+        with self._lock:
+            stats = dict(self.stats)
+        stats['db_bytes'] = sum(os.path.getsize(self.path + suffix) for suffix in ('', '-wal')
+                                if os.path.exists(self.path + suffix))
+        return stats
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export stored scan results")
+    sub = parser.add_subparsers(dest='command', required=True)
+    export = sub.add_parser('export', help="Write scans and their rolling series as JSON lines")
+    export.add_argument('--db', default=DEFAULT_DB_PATH)
+    export.add_argument('--user')
+    export.add_argument('--since', help="ISO date or time, inclusive")
+    export.add_argument('--until', help="ISO date or time, exclusive")
+    export.add_argument('--output', '-o', help="Output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    store = ResultsStore(args.db)
+    f = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        count = store.export(f, user=args.user, since=args.since, until=args.until)
+    finally:
+        if args.output:
+            f.close()
+        store.close()
+    print(f"Exported {count} scans", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,263 @@
+"""
+Deployment performance self-test.
+Probes the OpenCV build (threads, SIMD baseline and dispatched code paths,
+parallel framework, FFmpeg video I/O) and the PyAV codecs, then runs short
+microbenchmarks of the hot paths: decode frames/s with each decoder,
+cvtColor throughput, NumPy frame stacking and copy bandwidth, and chart
+render time. Results are compared against a baseline of the same machine
+so a deployment that slows down or is reconfigured is flagged; no baseline
+ships with the code, and the first run on a machine records one.
+diagnostic.py shows the same report.
+
+    python selftest.py                  # exits 1 when something is flagged
+    python selftest.py --save-baseline  # record this machine as the reference again
+
+SELFTEST_BASELINE_PATH sets the baseline file (default: selftest_baseline.json
+in the data directory, see results_store.DEFAULT_DATA_DIR).
+"""
+
+import argparse
+import json
+import os
+import platform
+import re
+import sys
+import time
+
+from results_store import DEFAULT_DATA_DIR
+
+BASELINE_PATH = os.environ.get('SELFTEST_BASELINE_PATH', os.path.join(DEFAULT_DATA_DIR, 'selftest_baseline.json'))
+DEFAULT_TOLERANCE = 0.5  # flag results worse than half (or over twice) the baseline
+
+# name: (unit, higher is better)
+BENCHMARKS = {
+    'decode_cv2_fps': ('frames/s', True),
+    'decode_av_fps': ('frames/s', True),
+    'cvtcolor_mpix_s': ('Mpixel/s', True),
+    'numpy_stack_gb_s': ('GB/s', True),
+    'numpy_copy_gb_s': ('GB/s', True),
+    'chart_render_ms': ('ms', False),
+}
+VIDEO_CODECS = ('h264', 'hevc', 'vp9', 'av1', 'mpeg4')  # decoders phone and browser uploads need
+# OpenCV's CV_CPU_* feature ids (core/cvdef.h); the Python bindings do not export them
+CPU_FEATURES = {
+    'SSE': 2, 'SSE2': 3, 'SSE3': 4, 'SSSE3': 5, 'SSE4_1': 6, 'SSE4_2': 7, 'POPCNT': 8, 'FP16': 9, 'AVX': 10,
+    'AVX2': 11, 'FMA3': 12, 'AVX_512F': 13, 'AVX512_SKX': 256, 'AVX512_COMMON': 257, 'AVX512_KNL': 258,
+    'AVX512_KNM': 259, 'AVX512_CNL': 260, 'AVX512_CLX': 261, 'AVX512_ICL': 262,
+    'NEON': 100, 'NEON_DOTPROD': 101, 'NEON_FP16': 102, 'NEON_BF16': 103, 'VSX': 200, 'VSX3': 201, 'RVV': 210,
+}
+
+
+def parse_build_info(text):
+    """SIMD, threading and video I/O details from cv2.getBuildInformation()."""
+    def field(name):
+        match = re.search(rf'^\s*{re.escape(name)}:\s*(.*)$', text, re.MULTILINE)
+        return match.group(1).strip() if match else ''
+
+    return {
+        'baseline': field('Baseline').split(),
+        'dispatched': field('Dispatched code generation').split(),
+        'parallel_framework': field('Parallel framework'),
+        'ffmpeg': field('FFMPEG').upper().startswith('YES'),
+    }
+
+
+def cv2_info():
+    """OpenCV version, threads and which of its SIMD code paths this CPU can run."""
+    import cv2
+    info = parse_build_info(cv2.getBuildInformation())
+    info['supported'] = [name for name in info['baseline'] + info['dispatched']
+                         if name in CPU_FEATURES and cv2.checkHardwareSupport(CPU_FEATURES[name])]
+    info.update(version=cv2.__version__, threads=cv2.getNumThreads(), cpus=cv2.getNumberOfCPUs(),
+                optimized=cv2.useOptimized())
+    return info
+
+
+def av_info():
+    """PyAV version and which of VIDEO_CODECS it can decode, or None without PyAV."""
+    try:
+        import av
+    except ImportError:
+        return None
+    decoders = {}
+    for name in VIDEO_CODECS:
+        try:
+            av.codec.Codec(name, 'r')
+            decoders[name] = True
+        except Exception:
+            decoders[name] = False
+    return {'version': av.__version__, 'codecs': len(av.codecs_available), 'decoders': decoders}
+
+
+def config_problems(cv2_info, av_info):
+    """Configuration issues that slow analyses down, as messages."""
+    problems = []
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    if cpus > 1 and cv2_info['threads'] < 2:
+        problems.append(f"OpenCV uses {cv2_info['threads']} thread on {cpus} CPUs (cv2.setNumThreads)")
+    if not cv2_info['optimized']:
+        problems.append("OpenCV optimizations are off (cv2.setUseOptimized(False))")
+    if not any(name.startswith(('AVX', 'NEON')) for name in cv2_info['supported']):
+        problems.append("No AVX or NEON code path of OpenCV runs on this CPU")
+    if not cv2_info['ffmpeg']:
+        problems.append("OpenCV was built without FFmpeg video I/O")
+    if av_info is None:
+        problems.append("PyAV is not installed; the 'av' decoder is unavailable")
+    else:
+        missing = [name for name, ok in av_info['decoders'].items() if not ok]
+        if missing:
+            problems.append(f"PyAV cannot decode {', '.join(missing)}")
+    return problems
+
+
+def _best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench_cvtcolor(width=1280, height=720, frames=60, repeat=3):
+    """BGR -> RGB conversion throughput in megapixels per second."""
+    import cv2
+    import numpy as np
+    src = np.random.default_rng(0).integers(0, 255, (height, width, 3), dtype=np.uint8)
+    dst = np.empty_like(src)
+
+    def run():
+        for _ in range(frames):
+            cv2.cvtColor(src, cv2.COLOR_BGR2RGB, dst=dst)
+    return width * height * frames / _best_of(run, repeat) / 1e6
+
+
+def bench_numpy(width=960, height=540, frames=120, repeat=3):
+    """(np.stack of a frame list, np.copyto of the stacked buffer) in GB/s."""
+    import numpy as np
+    frame_list = [np.full((height, width, 3), i, dtype=np.uint8) for i in range(frames)]
+    nbytes = frames * height * width * 3
+    stacked = np.stack(frame_list)
+    copy = np.empty_like(stacked)
+    stack_s = _best_of(lambda: np.stack(frame_list), repeat)
+    copy_s = _best_of(lambda: np.copyto(copy, stacked), repeat)
+    return nbytes / stack_s / 1e9, nbytes / copy_s / 1e9
+
+
+def bench_chart(samples=1800, repeat=3):
+    """Milliseconds to render one 60 s rolling-series chart to PNG."""
+    import numpy as np
+
+    from charts import render_series_png
+    series = 70 + np.cumsum(np.random.default_rng(0).normal(0, 0.1, samples))
+    render_series_png(series, 30, 70)  # font cache and backend setup
+    return _best_of(lambda: render_series_png(series, 30, 70), repeat) * 1e3
+
+
+def run_benchmarks():
+    """Run every microbenchmark; returns {name: value} for the names in BENCHMARKS."""
+    from video_loader import benchmark_decoders
+    # Bypass the per-process cache the 'auto' decoder pick uses, so every run measures
+    results = {f'decode_{name}_fps': fps for name, fps in benchmark_decoders.__wrapped__().items()}
+    results['cvtcolor_mpix_s'] = bench_cvtcolor()
+    results['numpy_stack_gb_s'], results['numpy_copy_gb_s'] = bench_numpy()
+    results['chart_render_ms'] = bench_chart()
+    return results
+
+
+def load_baseline(path=BASELINE_PATH):
+    """The stored baseline dict, or None when there is none."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_baseline(results, environment, path=BASELINE_PATH):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), mode=0o700, exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump({'results': results, 'environment': environment}, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """One row per benchmark: value, baseline, ratio (>1 is better) and whether it is flagged."""
+    reference = (baseline or {}).get('results', {})
+    rows = []
+    for name, (unit, higher_is_better) in BENCHMARKS.items():
+        value, base = results.get(name), reference.get(name)
+        ratio = None
+        if value is not None and base:
+            ratio = value / base if higher_is_better else base / value
+        rows.append({'name': name, 'unit': unit, 'value': value, 'baseline': base, 'ratio': ratio,
+                     'flagged': value is None or (ratio is not None and ratio < tolerance)})
+    return rows
+
+
+def environment():
+    """Machine and library details stored with a baseline and shown with a report."""
+    return {'python': platform.python_version(), 'machine': platform.machine(), 'cpus': os.cpu_count(),
+            'cv2': cv2_info(), 'av': av_info()}
+
+
+def run_selftest(baseline_path=BASELINE_PATH, tolerance=DEFAULT_TOLERANCE, env=None):
+    """Probe (unless `env` is given), benchmark and compare; returns a report dict (see main for its use).
+
+    Without a baseline this run is stored as one (`baseline_recorded` in the
+    report), so only configuration problems can be flagged on a first run.
+    """
+    env = env or environment()
+    results = run_benchmarks()
+    baseline = load_baseline(baseline_path)
+    recorded = False
+    if baseline is None:
+        try:
+            save_baseline(results, env, baseline_path)
+            baseline, recorded = {'results': results, 'environment': env}, True
+        except OSError:
+            pass
+    rows = compare(results, baseline, tolerance)
+    problems = config_problems(env['cv2'], env['av'])
+    problems += [f"{row['name']} is {row['value']:.3g} {row['unit']}, "
+                 f"{1 / row['ratio']:.1f}x worse than the baseline {row['baseline']:.3g}"
+                 for row in rows if row['flagged'] and row['ratio'] is not None]
+    problems += [f"{row['name']} could not be measured" for row in rows if row['value'] is None]
+    return {'environment': env, 'results': results, 'rows': rows, 'problems': problems, 'baseline_recorded': recorded}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Deployment performance self-test")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Flag benchmarks below this fraction of the baseline")
+    parser.add_argument('--save-baseline', action='store_true', help="Store this run as the baseline")
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = run_selftest(args.baseline, args.tolerance)
+    if report['baseline_recorded']:
+        print(f"No baseline yet; recorded this run as the reference in {args.baseline}", file=sys.stderr)
+    if args.save_baseline:
+        save_baseline(report['results'], report['environment'], args.baseline)
+        print(f"Saved baseline to {args.baseline}", file=sys.stderr)
+        return 0
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+    else:
+        cv2_env = report['environment']['cv2']
+        print(f"OpenCV {cv2_env['version']}: {cv2_env['threads']} threads on {cv2_env['cpus']} CPUs, "
+              f"{cv2_env['parallel_framework']}, SIMD {' '.join(cv2_env['supported'])}")
+        print(f"{'benchmark':>18} {'value':>10} {'baseline':>10} {'ratio':>6}")
+        for row in report['rows']:
+            value = f"{row['value']:.3g}" if row['value'] is not None else '-'
+            base = f"{row['baseline']:.3g}" if row['baseline'] else '-'
+            ratio = f"{row['ratio']:.2f}" if row['ratio'] is not None else '-'
+            print(f"{row['name']:>18} {value:>10} {base:>10} {ratio:>6} {row['unit']}{'  <- slow' if row['flagged'] else ''}")
+        for problem in report['problems']:
+            print(f"FLAG: {problem}")
+    return 1 if report['problems'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
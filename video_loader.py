@@ -0,0 +1,548 @@
+"""
+Streaming video loader.
+Decodes frames straight into one preallocated uint8 RGB buffer so only a
+single copy of the video is ever held in memory. Buffers larger than the
+spill threshold are backed by a memory-mapped file instead of RAM.
+
+Decoding goes through OpenCV (decode, then cv2.resize and cvtColor) or
+PyAV (threaded decode, swscale scaling straight to RGB); 'auto' picks the
+faster one on this machine. Frames can be scaled down to a pixel budget
+while they are decoded and decimated in time to a target frame rate:
+unwanted frames are picked out by their timestamps and never converted or
+stored.
+"""
+
+import functools
+import logging
+import math
+import os
+import tempfile
+import time
+from dataclasses import dataclass, field
+
+import cv2
+import numpy as np
+
+from memstats import RssPeak
+from metrics import stage
+from pipeline import PipelineCancelled
+
+DEFAULT_FPS = 30
+DEFAULT_MAX_FRAMES = 1800  # Limit to 60 seconds at 30fps
+SPILL_THRESHOLD_BYTES = int(os.environ.get('VIDEO_SPILL_THRESHOLD_BYTES', 2 * 1024 ** 3))
+# 960x540 keeps a typical face well over 100 px wide; 0 disables scaling
+DEFAULT_MAX_PIXELS = int(os.environ.get('VIDEO_MAX_PIXELS', 960 * 540))
+# The VitalLens model runs at 30 fps, so faster uploads are decimated to it; 0 disables
+DEFAULT_TARGET_FPS = float(os.environ.get('VIDEO_TARGET_FPS', 30))
+
+DECODERS = ('cv2', 'av')
+# 'auto' picks the faster decoder on this machine with a short benchmark on first use
+DEFAULT_DECODER = os.environ.get('VIDEO_DECODER', 'auto')
+CHECKPOINT_FRAMES = 15  # decoded frames between progress reports and cancel checks
+
+
+@dataclass
+class LoadedVideo:
+    """Decoded video frames plus the metadata needed for analysis."""
+    frames: np.ndarray
+    fps: float
+    fps_detected: bool = True
+    spill_path: str = None
+    peak_rss_bytes: int = 0
+    source_size: tuple = None
+    stats: dict = field(default_factory=dict)
+
+    @property
+    def n_frames(self):
+        return self.frames.shape[0]
+
+    @property
+    def nbytes(self):
+        return self.frames.nbytes
+
+    @property
+    def scale(self):
+        """Linear scale factor from source to stored frames."""
+        if not self.source_size or self.frames.ndim != 4 or self.frames.shape[2] == 0:
+            return 1.0
+        return self.frames.shape[2] / self.source_size[0]
+
+    def close(self):
+        """Release the frame buffer and delete the spill file, if any."""
+        self.frames = np.empty((0, 0, 0, 3), dtype=np.uint8)
+        if self.spill_path and os.path.exists(self.spill_path):
+            try:
+                os.unlink(self.spill_path)
+            except OSError:
+                pass
+        self.spill_path = None
+
+
+def scaled_size(width, height, target_size=None, max_pixels=None):
+    """Output (width, height) for a source frame, preserving aspect ratio.
+
+    Args:
+        target_size: Maximum length of the longer side in pixels.
+        max_pixels: Maximum number of pixels per frame.
+    Frames are never upscaled, and output sides are rounded to even numbers
+    as most codecs and swscale paths expect.
+    """
+    factor = 1.0
+    if target_size:
+        factor = min(factor, target_size / max(width, height))
+    if max_pixels:
+        factor = min(factor, math.sqrt(max_pixels / (width * height)))
+    if factor >= 1.0:
+        return width, height
+    out_w = max(2, int(width * factor) // 2 * 2)
+    out_h = max(2, int(height * factor) // 2 * 2)
+    return out_w, out_h
+
+
+def output_fps(fps, target_fps=None):
+    """Frame rate of the frames kept when decimating `fps` to `target_fps`."""
+    if target_fps and (fps <= 0 or fps > target_fps):
+        return target_fps
+    return fps
+
+
+def expected_frames(n_frames, fps, target_fps=None):
+    """Number of frames kept out of `n_frames` after decimation to `target_fps`."""
+    out_fps = output_fps(fps, target_fps)
+    if n_frames <= 0 or fps <= 0 or out_fps >= fps:
+        return n_frames
+    return int(math.ceil(n_frames * out_fps / fps))
+
+
+class _FrameClock:
+    """Picks the frames closest to a uniform `target_fps` grid from their timestamps.
+
+    Works on real presentation times, so variable-frame-rate sources come out
+    evenly sampled; a frame within a quarter grid step (or half a source
+    frame) before the next grid point is kept.
+    """
+
+    def __init__(self, fps, target_fps):
+        self.step_ms = 1000.0 / output_fps(fps, target_fps)
+        source_ms = 1000.0 / fps if fps > 0 else self.step_ms
+        self.tolerance_ms = min(self.step_ms / 4, source_ms / 2)
+        self.next_ms = None
+        self.skipped = 0
+
+    def keep(self, t_ms):
+        if self.next_ms is not None and t_ms < self.next_ms - self.tolerance_ms:
+            self.skipped += 1
+            return False
+        if self.next_ms is None:
+            self.next_ms = t_ms
+        while self.next_ms <= t_ms + self.tolerance_ms:
+            self.next_ms += self.step_ms
+        return True
+
+
+def probe_video(video_path):
+    """Cheaply read (n_frames, width, height, fps) from the container metadata."""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError("Could not open video file")
+    try:
+        return (int(cap.get(cv2.CAP_PROP_FRAME_COUNT)), int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)), cap.get(cv2.CAP_PROP_FPS))
+    finally:
+        cap.release()
+
+
+def estimate_nbytes(video_path, max_frames=DEFAULT_MAX_FRAMES, target_size=None, max_pixels=None, target_fps=None):
+    """Estimated size of the frame buffer `load_video` would allocate, without decoding."""
+    n_frames, width, height, fps = probe_video(video_path)
+    out_w, out_h = scaled_size(width, height, target_size, max_pixels)
+    n_frames = expected_frames(n_frames, fps, target_fps)
+    n_frames = min(n_frames, max_frames) if n_frames > 0 else max_frames
+    return n_frames * out_w * out_h * 3
+
+
+def _allocate(n_frames, height, width, spill_threshold, spill_dir):
+    """Allocate an uninitialised (n, h, w, 3) uint8 buffer, in RAM or on disk."""
+    shape = (n_frames, height, width, 3)
+    nbytes = n_frames * height * width * 3
+    if nbytes <= spill_threshold:
+        return np.empty(shape, dtype=np.uint8), None
+    fd, path = tempfile.mkstemp(suffix='.frames', dir=spill_dir)
+    os.close(fd)
+    return np.memmap(path, dtype=np.uint8, mode='w+', shape=shape), path
+
+
+def _grow(buffer, path, n_frames, spill_threshold, spill_dir):
+    """Reallocate a buffer that turned out too small for the reported frame count."""
+    new_buffer, new_path = _allocate(n_frames, *buffer.shape[1:3], spill_threshold, spill_dir)
+    new_buffer[:buffer.shape[0]] = buffer
+    del buffer
+    if path:
+        os.unlink(path)
+    return new_buffer, new_path
+
+
+class _FrameSink:
+    """Writes frames into a preallocated buffer, growing it if the count was under-reported."""
+
+    def __init__(self, capacity, height, width, max_frames, spill_threshold, spill_dir):
+        self.capacity = capacity
+        self.max_frames = max_frames
+        self.spill_threshold = spill_threshold
+        self.spill_dir = spill_dir
+        self.buffer, self.spill_path = _allocate(capacity, height, width, spill_threshold, spill_dir)
+        self.count = 0
+
+    @property
+    def full(self):
+        return self.count >= self.max_frames
+
+    def next_slot(self):
+        """Return the view the next frame must be written into."""
+        if self.count == self.capacity:
+            self.capacity = min(self.capacity * 2, self.max_frames)
+            self.buffer, self.spill_path = _grow(
+                self.buffer, self.spill_path, self.capacity, self.spill_threshold, self.spill_dir)
+        slot = self.buffer[self.count]
+        self.count += 1
+        return slot
+
+    def frames(self):
+        return self.buffer[:self.count]
+
+
+class _Cv2Reader:
+    """Sequential OpenCV reader that writes scaled RGB frames into caller-provided slots.
+
+    With `target_fps` below the source rate, frames off the target grid are
+    only grab()bed: they are never retrieved, converted or resized.
+    """
+    name = 'cv2'
+
+    def __init__(self, video_path, target_size=None, max_pixels=None, target_fps=None):
+        self.cap = cv2.VideoCapture(video_path)
+        if not self.cap.isOpened():
+            raise IOError("Could not open video file")
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS)
+        self.target_fps = target_fps
+        self.out_fps = output_fps(self.fps, target_fps)
+        self.reported = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        self.clock = _FrameClock(self.fps, target_fps) if self.out_fps != self.fps else None
+
+        # The first frame gives the true resolution and becomes the BGR
+        # scratch buffer reused by every subsequent read
+        self._scratch = None
+        if not self._advance():
+            self.cap.release()
+            raise IOError("No frames could be read from video")
+        height, width = self._scratch.shape[:2]
+        self.source_size = (width, height)
+        self.size = scaled_size(width, height, target_size, max_pixels)
+        self._resize = self.size != self.source_size
+        self._small = np.empty((self.size[1], self.size[0], 3), dtype=np.uint8) if self._resize else None
+        self._pending = True  # the scratch buffer holds a frame not yet handed out
+
+    @property
+    def exhausted(self):
+        return not self._pending
+
+    @property
+    def skipped(self):
+        return self.clock.skipped if self.clock is not None else 0
+
+    def read_into(self, dst):
+        """Convert the next frame into `dst`. Returns False at the end of the stream."""
+        if not self._pending:
+            return False
+        src = self._scratch
+        with stage('color_convert', memory=False):
+            if self._resize:
+                # Resize first so the colour conversion runs on the smaller frame
+                src = cv2.resize(src, self.size, dst=self._small, interpolation=cv2.INTER_LINEAR)
+            cv2.cvtColor(src, cv2.COLOR_BGR2RGB, dst=dst)
+        self._pending = self._advance()
+        return True
+
+    def _advance(self):
+        """Decode up to the next kept frame into the scratch buffer. Returns False at the end."""
+        with stage('decode', memory=False):
+            while self.cap.grab():
+                if self.clock is None or self.clock.keep(self.cap.get(cv2.CAP_PROP_POS_MSEC)):
+                    ret, self._scratch = self.cap.retrieve(self._scratch)
+                    return ret
+            return False
+
+    def release(self):
+        self.cap.release()
+
+
+class _AvReader:
+    """PyAV reader with the same interface as _Cv2Reader.
+
+    FFmpeg decodes with frame and slice threading, and swscale scales and
+    converts straight to RGB, so there is no separate BGR->RGB pass.
+    Frames off the `target_fps` grid are decoded but never converted.
+    """
+    name = 'av'
+
+    def __init__(self, video_path, target_size=None, max_pixels=None, target_fps=None):
+        import av
+
+        try:
+            self.container = av.open(video_path)
+        except (av.FFmpegError, OSError) as e:
+            raise IOError("Could not open video file") from e
+        try:
+            stream = self.container.streams.video[0]
+        except IndexError:
+            self.container.close()
+            raise IOError("No video stream in file") from None
+        stream.thread_type = 'AUTO'  # frame + slice threads, one per core
+        self.fps = float(stream.average_rate or stream.guessed_rate or 0)
+        self.target_fps = target_fps
+        self.out_fps = output_fps(self.fps, target_fps)
+        self.reported = stream.frames
+        self.clock = _FrameClock(self.fps, target_fps) if self.out_fps != self.fps else None
+        self._decoded = self.container.decode(stream)
+        self._frame = None
+        try:
+            if not self._advance():
+                raise IOError("No frames could be read from video")
+        except av.FFmpegError as e:
+            self.container.close()
+            raise IOError("No frames could be read from video") from e
+        except IOError:
+            self.container.close()
+            raise
+        self.source_size = (self._frame.width, self._frame.height)
+        self.size = scaled_size(*self.source_size, target_size, max_pixels)
+        self._resize = self.size != self.source_size
+
+    @property
+    def exhausted(self):
+        return self._frame is None
+
+    @property
+    def skipped(self):
+        return self.clock.skipped if self.clock is not None else 0
+
+    def read_into(self, dst):
+        """Convert the next frame into `dst`. Returns False at the end of the stream."""
+        if self._frame is None:
+            return False
+        frame = self._frame
+        with stage('color_convert', memory=False):
+            if self._resize:
+                # Scale in the source pixel format (e.g. yuv420p, half the bytes of RGB)
+                # so the RGB conversion runs on the smaller frame
+                frame = frame.reformat(width=self.size[0], height=self.size[1], interpolation='BILINEAR')
+            dst[:] = frame.to_ndarray(format='rgb24')
+        self._advance()
+        return True
+
+    def _advance(self):
+        with stage('decode', memory=False):
+            for frame in self._decoded:
+                if self.clock is None or frame.time is None or self.clock.keep(frame.time * 1000):
+                    self._frame = frame
+                    return True
+            self._frame = None
+            return False
+
+    def release(self):
+        self._frame = None
+        self.container.close()
+
+
+def _benchmark_clip(path, seconds, fps, width, height):
+    """Write a small clip with moving, textured content for the decoder benchmark."""
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    if not writer.isOpened():
+        raise IOError("Could not open video writer")
+    rng = np.random.default_rng(0)
+    texture = rng.integers(0, 255, (height, width * 2, 3), dtype=np.uint8)
+    texture = cv2.GaussianBlur(texture, (9, 9), 0)
+    try:
+        for i in range(int(seconds * fps)):
+            offset = i * 4 % width
+            writer.write(np.ascontiguousarray(texture[:, offset:offset + width]))
+    finally:
+        writer.release()
+
+
+@functools.lru_cache(maxsize=None)
+def benchmark_decoders(seconds=1.0, fps=30, width=1280, height=720, max_pixels=DEFAULT_MAX_PIXELS):
+    """Decode throughput in frames/s of each available decoder, on a generated clip.
+
+    Runs once per process (about half a second); decoders that cannot be
+    imported are left out.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'decoder_benchmark.mp4')
+        _benchmark_clip(path, seconds, fps, width, height)
+        for name in DECODERS:
+            try:
+                start = time.perf_counter()
+                reader = open_reader(path, name, max_pixels=max_pixels)
+            except ImportError:
+                continue
+            try:
+                out_w, out_h = reader.size
+                dst = np.empty((out_h, out_w, 3), dtype=np.uint8)
+                n = 0
+                while reader.read_into(dst):
+                    n += 1
+            finally:
+                reader.release()
+            results[name] = n / (time.perf_counter() - start)
+    return results
+
+
+def select_decoder(decoder=DEFAULT_DECODER):
+    """Resolve 'auto' to the decoder that benchmarks fastest on this machine."""
+    if decoder != 'auto':
+        return decoder
+    try:
+        results = benchmark_decoders()
+    except (IOError, cv2.error) as e:
+        logging.warning(f"Decoder benchmark failed ({e}); using cv2")
+        return 'cv2'
+    choice = max(results, key=results.get)
+    logging.info("Decoder benchmark: " + ", ".join(f"{k} {v:.0f} fps" for k, v in results.items())
+                 + f"; using {choice}")
+    return choice
+
+
+def open_reader(video_path, decoder='cv2', target_size=None, max_pixels=None, target_fps=None):
+    """Open a sequential RGB frame reader with the given decoder ('cv2', 'av' or 'auto')."""
+    decoder = select_decoder(decoder)
+    if decoder not in DECODERS:
+        raise ValueError(f"Unknown decoder: {decoder}")
+    reader_class = _AvReader if decoder == 'av' else _Cv2Reader
+    return reader_class(video_path, target_size, max_pixels, target_fps)
+
+
+def decode_checkpoint(progress, cancel, frames, total):
+    """Report decode progress and stop if cancelled; loaders call it every CHECKPOINT_FRAMES frames.
+
+    `progress`, if given, is called as progress('decode', frames, total), and
+    a set `cancel` event (threading.Event) raises pipeline.PipelineCancelled.
+    """
+    if cancel is not None and cancel.is_set():
+        raise PipelineCancelled()
+    if progress is not None:
+        progress('decode', frames, total)
+
+
+def load_video(video_path, max_frames=DEFAULT_MAX_FRAMES, target_size=None, max_pixels=None,
+               target_fps=None, decoder='cv2', spill_threshold=SPILL_THRESHOLD_BYTES, spill_dir=None,
+               progress=None, cancel=None):
+    """Decode up to `max_frames` RGB frames from `video_path`.
+
+    The frame count and resolution are probed up front and every decoded
+    frame is converted directly into its slot of the output buffer.
+
+    Args:
+        target_size: Optional maximum length of the longer frame side.
+        max_pixels: Optional maximum pixels per stored frame.
+        target_fps: Optional frame rate to decimate faster videos to. Frames
+            are picked by timestamp, so the returned `fps` is exact even for
+            variable-frame-rate files, and `max_frames` counts kept frames.
+        decoder: 'cv2' (OpenCV decode, then resize and cvtColor), 'av'
+            (threaded PyAV decode, swscale straight to RGB) or 'auto' to
+            pick the faster one on this machine (see benchmark_decoders).
+        progress, cancel: See decode_checkpoint.
+    Raises:
+        IOError: If the video cannot be opened or yields no frames.
+        pipeline.PipelineCancelled: If `cancel` was set.
+    """
+    rss = RssPeak()
+    with stage('load_video'):
+        reader = open_reader(video_path, decoder, target_size, max_pixels, target_fps)
+        try:
+            out_w, out_h = reader.size
+            expected = expected_frames(reader.reported, reader.fps, target_fps)
+            capacity = min(expected, max_frames) if expected > 0 else max_frames
+            sink = _FrameSink(capacity, out_h, out_w, max_frames, spill_threshold, spill_dir)
+            while not sink.full and not reader.exhausted:
+                reader.read_into(sink.next_slot())
+                if sink.count % CHECKPOINT_FRAMES == 0:
+                    decode_checkpoint(progress, cancel, sink.count, capacity)
+                    rss.sample()
+        finally:
+            reader.release()
+
+    return LoadedVideo(
+        frames=sink.frames(),
+        # Without a source rate the clock still spaces kept frames at target_fps
+        fps=reader.out_fps if reader.out_fps > 0 else DEFAULT_FPS,
+        fps_detected=reader.fps > 0,
+        spill_path=sink.spill_path,
+        peak_rss_bytes=rss.peak(),
+        source_size=reader.source_size,
+        stats={'reported_frames': reader.reported, 'spilled': sink.spill_path is not None,
+               'source_fps': reader.fps, 'frames_skipped': reader.skipped,
+               'decoder': reader.name},
+    )
+
+
+class FrameWindows:
+    """Iterate a video as fixed-length overlapping windows of RGB frames.
+
+    Windows are decoded into `n_buffers` preallocated buffers used in turn:
+    the overlap is copied from the previous window and the next hop is
+    decoded behind it, so memory stays constant regardless of video length.
+    A yielded array is reused `n_buffers` windows later; with more than one
+    buffer the next window can be decoded while the current one is in use
+    (see pipeline.prefetch).
+    """
+
+    def __init__(self, video_path, window_s, overlap_s, target_size=None, max_pixels=None, n_buffers=1,
+                 target_fps=None, decoder='cv2'):
+        if not 0 <= overlap_s < window_s:
+            raise ValueError("overlap_s must be in [0, window_s)")
+        self.reader = open_reader(video_path, decoder, target_size, max_pixels, target_fps)
+        self.fps_detected = self.reader.fps > 0
+        self.fps = self.reader.out_fps if self.reader.out_fps > 0 else DEFAULT_FPS
+        # In frames after decimation, as the windows count them
+        self.n_frames_reported = expected_frames(self.reader.reported, self.reader.fps, target_fps)
+        self.source_size = self.reader.source_size
+        self.window_frames = max(int(round(window_s * self.fps)), 1)
+        self.hop_frames = max(self.window_frames - int(round(overlap_s * self.fps)), 1)
+        width, height = self.reader.size
+        self.buffers = [np.empty((self.window_frames, height, width, 3), dtype=np.uint8)
+                        for _ in range(max(n_buffers, 1))]
+
+    @property
+    def nbytes(self):
+        return sum(buffer.nbytes for buffer in self.buffers)
+
+    def __iter__(self):
+        """Yield (start_frame, frames, is_last) for each window."""
+        try:
+            filled = 0
+            start = 0
+            index = 0
+            while True:
+                buffer = self.buffers[index]
+                new = 0
+                while filled < self.window_frames and self.reader.read_into(buffer[filled]):
+                    filled += 1
+                    new += 1
+                if new == 0:
+                    break
+                yield start, buffer[:filled], self.reader.exhausted
+                if self.reader.exhausted:
+                    break
+                keep = self.window_frames - self.hop_frames
+                index = (index + 1) % len(self.buffers)
+                self.buffers[index][:keep] = buffer[self.hop_frames:filled]
+                filled = keep
+                start += self.hop_frames
+        finally:
+            self.reader.release()
+
+    def close(self):
+        self.reader.release()
+        self.buffers = []
@@ -1,21 +1,40 @@
 import streamlit as st
 import sys
 import os
+import time
 
 # Add error tracking at the very start
 try:
-    import cv2
-    import numpy as np
     import tempfile
-    import matplotlib.pyplot as plt
-    
-    # Try to import vitallens
-    try:
-        import vitallens
-        VITALLENS_AVAILABLE = True
-    except ImportError as e:
-        st.error(f"VitalLens import error: {str(e)}")
-        VITALLENS_AVAILABLE = False
+
+    import app_support
+    from app_support import CHART_COLORS, VITALLENS_AVAILABLE, render_chart
+    from client_pool import get_pool
+    from job_queue import QueueFullError, get_queue
+    from memstats import format_bytes
+    from result_cache import cache_key, content_hash
+
+    # cv2, numpy, matplotlib and vitallens are imported on the code paths that
+    # need them, so the first page load and idle reruns do not pay for them
+    if not VITALLENS_AVAILABLE:
+        st.error("VitalLens import error: No module named 'vitallens'")
+
+    result_cache = app_support.get_result_cache()
+    results_store = app_support.get_results_store()
+    app_support.start_metrics_server()
+
+    METHOD_LABELS = {
+        'VITALLENS': 'VitalLens API',
+        'POS': 'POS (local)',
+        'CHROM': 'CHROM (local)',
+        'G': 'Green channel (local)',
+    }
+    # Seconds to wait for the VitalLens API before falling back to local POS
+    API_TIMEOUT = float(os.environ.get('VITALLENS_API_TIMEOUT', 60))
+    MAX_SUBJECTS = 6
+    # Live stream sources visitors may pick (camera indexes, rtsp:// or http:// URLs,
+    # files), comma separated; live mode is off without any
+    LIVE_SOURCES = [s.strip() for s in os.environ.get('LIVE_STREAM_SOURCES', '').split(',') if s.strip()]
 
     # Page config
     st.set_page_config(
@@ -24,211 +43,14 @@ try:
         initial_sidebar_state="collapsed"
     )
 
-    # Custom CSS
-    st.markdown('''
-    <style>
-        @import url('https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap');
-
-        * {
-            font-family: 'Inter', sans-serif;
-        }
-
-        .main {
-            padding: 0 !important;
-            background: #fafafa;
-        }
-
-        .block-container {
-            padding: 2rem 3rem !important;
-            max-width: 100% !important;
-        }
-
-        .header-section {
-            text-align: center;
-            padding: 1rem 0 2rem 0;
-        }
-
-        .main-title {
-            font-size: 2.5rem;
-            font-weight: 700;
-            color: #111;
-            margin-bottom: 0.5rem;
-        }
-
-        .main-subtitle {
-            font-size: 1.1rem;
-            color: #666;
-            font-weight: 400;
-            line-height: 1.6;
-        }
-
-        .instructions-container {
-            background: white;
-            border-radius: 16px;
-            padding: 2rem;
-            box-shadow: 0 2px 8px rgba(0,0,0,0.08);
-            margin-bottom: 2rem;
-        }
-
-        .section-title {
-            font-size: 1.4rem;
-            font-weight: 600;
-            color: #111;
-            margin-bottom: 1.5rem;
-        }
-
-        .instruction-item {
-            display: flex;
-            align-items: flex-start;
-            margin-bottom: 1.2rem;
-            font-size: 0.95rem;
-            color: #333;
-        }
-
-        .instruction-number {
-            background: #f5f5f5;
-            color: #666;
-            min-width: 28px;
-            height: 28px;
-            border-radius: 50%;
-            display: flex;
-            align-items: center;
-            justify-content: center;
-            font-weight: 600;
-            font-size: 0.85rem;
-            margin-right: 0.8rem;
-            flex-shrink: 0;
-        }
-
-        .video-section {
-            background: white;
-            border-radius: 16px;
-            padding: 2rem;
-            box-shadow: 0 2px 8px rgba(0,0,0,0.08);
-            margin-bottom: 2rem;
-        }
-
-        .metrics-grid {
-            display: grid;
-            grid-template-columns: 1fr 1fr;
-            gap: 1rem;
-            margin-top: 1rem;
-        }
-
-        .metric-card {
-            background: white;
-            border-radius: 12px;
-            padding: 1.5rem;
-            box-shadow: 0 2px 8px rgba(0,0,0,0.08);
-            text-align: center;
-            transition: transform 0.2s;
-        }
-
-        .metric-card:hover {
-            transform: translateY(-2px);
-            box-shadow: 0 4px 12px rgba(0,0,0,0.12);
-        }
-
-        .metric-icon {
-            font-size: 2rem;
-            margin-bottom: 0.5rem;
-        }
-
-        .metric-label {
-            font-size: 0.85rem;
-            color: #666;
-            font-weight: 500;
-            margin-bottom: 0.3rem;
-        }
-
-        .metric-value {
-            font-size: 2rem;
-            font-weight: 700;
-            color: #111;
-        }
-
-        .metric-unit {
-            font-size: 0.9rem;
-            color: #999;
-            font-weight: 500;
-        }
-
-        .stButton > button {
-            width: 100%;
-            background: #22c55e !important;
-            color: white !important;
-            border: none !important;
-            border-radius: 12px !important;
-            padding: 1rem 2rem !important;
-            font-size: 1.1rem !important;
-            font-weight: 600 !important;
-            letter-spacing: 0.5px !important;
-            transition: all 0.2s !important;
-            box-shadow: 0 4px 12px rgba(34, 197, 94, 0.3) !important;
-            margin-top: 1rem !important;
-        }
-
-        .stButton > button:hover {
-            background: #16a34a !important;
-            box-shadow: 0 6px 16px rgba(34, 197, 94, 0.4) !important;
-            transform: translateY(-1px);
-        }
-
-        .upload-info {
-            text-align: center;
-            padding: 3rem 2rem;
-            color: #999;
-            font-size: 1rem;
-        }
-
-        #MainMenu {visibility: hidden;}
-        footer {visibility: hidden;}
-
-        .chart-container {
-            background: white;
-            border-radius: 12px;
-            padding: 1.5rem;
-            box-shadow: 0 2px 8px rgba(0,0,0,0.08);
-            margin-bottom: 1rem;
-        }
-
-        .chart-title {
-            font-size: 1.1rem;
-            font-weight: 600;
-            color: #111;
-            margin-bottom: 1rem;
-        }
-
-        .more-metrics {
-            text-align: center;
-            padding: 1rem;
-            color: #666;
-            font-size: 0.9rem;
-            font-weight: 500;
-        }
-
-        .scenario-description {
-            background: #f9fafb;
-            border-radius: 8px;
-            padding: 1rem;
-            margin-top: 1rem;
-            font-size: 0.9rem;
-            color: #555;
-            line-height: 1.6;
-        }
-    </style>
-    ''', unsafe_allow_html=True)
-
-    # Header
-    st.markdown('''
-    <div class="header-section">
-        <div class="main-title">Monitor health metrics in just 30 seconds—with a video scan.</div>
-        <div class="main-subtitle">Measure health markers like heart rate (HR), respiratory rate (RR) and more in just 30 seconds via video scan.</div>
-    </div>
-    ''', unsafe_allow_html=True)
+    # Static styles and header, built once per process in app_support
+    st.markdown(app_support.STYLE, unsafe_allow_html=True)
+    st.markdown(app_support.HEADER, unsafe_allow_html=True)
 
     # Show system info for debugging
     if st.sidebar.checkbox("Show Debug Info", False):
+        import cv2
+        import numpy as np
         st.sidebar.write("Python Version:", sys.version)
         st.sidebar.write("OpenCV Version:", cv2.__version__)
         st.sidebar.write("NumPy Version:", np.__version__)
@@ -237,6 +59,52 @@ try:
             st.sidebar.write("API Key: Configured ✅")
         else:
             st.sidebar.write("API Key: Not configured ❌")
+        if st.session_state.get('cache_hit'):
+            st.sidebar.write("Last Analysis:", "served from the result cache (nothing decoded or analyzed)")
+        if 'load_stats' in st.session_state:
+            load_stats = st.session_state['load_stats']
+            st.sidebar.write("Frames Loaded:", load_stats['frames'])
+            if 'windows' in load_stats:
+                st.sidebar.write("Windows Analyzed:", load_stats['windows'])
+            else:
+                st.sidebar.write("Frame Size:", "{}x{} (source {}x{})".format(*load_stats['frame_size'], *load_stats['source_size']))
+            if 'decoder' in load_stats:
+                st.sidebar.write("Decoder:", load_stats['decoder'])
+            if 'face_track' in load_stats:
+                face_stats = load_stats['face_track']
+                st.sidebar.write("Face Track:", f"{face_stats.get('detections', 0)} detections, "
+                                 f"{face_stats.get('matches', 0)} tracked, {face_stats.get('lost', 0)} lost")
+            if 'subjects' in load_stats:
+                st.sidebar.write("Subjects:", f"{load_stats['subjects']} analyzed of {load_stats['face_track'].get('faces_found', 0)} faces found, from {load_stats['face_track']['decoded_frames']} decoded frames")
+            st.sidebar.write("Video Buffer:", format_bytes(load_stats['video_bytes']) + (" (memory-mapped)" if load_stats['spilled'] else ""))
+            st.sidebar.write("Peak RSS:", format_bytes(load_stats['peak_rss_bytes']))
+        if st.session_state.get('quality'):
+            quality = st.session_state['quality']
+            st.sidebar.write("Quality Gate:", f"{quality['status']} in {quality['elapsed_s'] * 1e3:.0f} ms from {quality['frames_decoded']} frames (" + ", ".join(f"{k} {v:.3g}" for k, v in quality['metrics'].items() if v is not None) + ")")
+        if 'analysis_trace' in st.session_state:
+            trace_stats = st.session_state['analysis_trace'].summary()
+            stages = trace_stats['stages'].items()
+            st.sidebar.write("Stage Timings:", ", ".join(f"{name} {s['seconds']:.2f}s" for name, s in stages) + f" (total {trace_stats['total_s']:.2f}s)")
+            st.sidebar.write("Stage Memory:", ", ".join(f"{name} {format_bytes(s['rss_delta_bytes'])}" for name, s in stages if s['rss_delta_bytes'] is not None))
+        cache_stats = result_cache.snapshot()
+        st.sidebar.write("Result Cache:", f"{cache_stats['hits']} hits / {cache_stats['misses']} misses")
+        st.sidebar.write("Result Cache Size:", f"{cache_stats['memory_entries']} in memory ({format_bytes(cache_stats['memory_bytes'])}), {format_bytes(cache_stats['disk_bytes'])} on disk, {cache_stats['evictions']} evicted")
+        from frame_cache import get_frame_cache
+        frame_stats = get_frame_cache().snapshot()
+        st.sidebar.write("Frame Cache:", (f"{st.session_state['load_stats']['frame_cache']} for this analysis; " if 'frame_cache' in st.session_state.get('load_stats', {}) else "") + f"{frame_stats['hits']} hits / {frame_stats['misses']} misses, {format_bytes(frame_stats['bytes'])} of {format_bytes(frame_stats['max_bytes'])} on disk, {frame_stats['evictions']} evicted")
+        store_stats = results_store.snapshot()
+        st.sidebar.write("Results Store:", f"{store_stats['scans_added']} scans added, {format_bytes(store_stats['db_bytes'])} on disk" + (f", series {store_stats['series_raw_bytes'] / store_stats['series_bytes']:.1f}x compressed" if store_stats['series_bytes'] else ""))
+        pool_stats = get_pool().snapshot()
+        st.sidebar.write("API Clients:", f"{pool_stats['clients']} pooled ({pool_stats['idle']} idle), {pool_stats['acquisitions']} uses, {pool_stats['waits']} waits (max {pool_stats['wait_s_max']:.2f}s)")
+        st.sidebar.write("API Connection Reuse:", f"{pool_stats['connection_reuse_rate']:.0%} of {pool_stats['http_requests']} requests, {format_bytes(pool_stats['bytes_sent'])} sent")
+        from memory_budget import get_budget
+        budget_stats = get_budget().snapshot()
+        st.sidebar.write("Memory Budget:", f"{format_bytes(budget_stats['reserved_bytes'])} of {format_bytes(budget_stats['budget_bytes'])} reserved by {budget_stats['active']} analyses, {budget_stats['waiting']} waiting (peak {format_bytes(budget_stats['peak_reserved_bytes'])}); {budget_stats['spilled']} spilled, {budget_stats['downscaled']} downscaled, {budget_stats['queued']} queued")
+        if st.session_state.get('memory'):
+            memory = st.session_state['memory']
+            st.sidebar.write("Memory Admission:", f"{memory['decision']}, {format_bytes(memory['reserved_bytes'])} reserved of {format_bytes(memory['requested_bytes'])} requested" + (f" after {memory['wait_s']:.1f}s" if memory['wait_s'] else ""))
+        queue_stats = get_queue().snapshot()
+        st.sidebar.write("Job Queue:", f"{queue_stats['running']}/{queue_stats['workers']} running, {queue_stats['queued']} queued, {queue_stats['done']} done, {queue_stats['failed']} failed, {queue_stats['cancelled']} cancelled (wait mean {queue_stats['wait_s_mean']:.2f}s, max {queue_stats['wait_s_max']:.2f}s)")
 
     # Create three columns layout
     col1, col2, col3 = st.columns([2, 3, 2], gap="large")
@@ -244,31 +112,27 @@ try:
     # LEFT COLUMN - Instructions
     with col1:
         st.markdown('<div class="instructions-container">', unsafe_allow_html=True)
-        st.markdown('<div class="section-title">How to take assessment</div>', unsafe_allow_html=True)
+        st.markdown(app_support.section_title("How to take assessment"), unsafe_allow_html=True)
 
-        instructions = [
-            "Ensure good lighting for clear visibility.",
-            "Position your device's camera so it's level with your eyes.",
-            "Avoid talking or moving your head."
-        ]
-
-        for i, instruction in enumerate(instructions, 1):
-            st.markdown(f'<div class="instruction-item"><div class="instruction-number">{i}</div><div>{instruction}</div></div>', unsafe_allow_html=True)
+        for item in app_support.INSTRUCTION_ITEMS:
+            st.markdown(item, unsafe_allow_html=True)
 
         st.markdown('</div>', unsafe_allow_html=True)
 
         # Scenario selection
         st.markdown('<div class="instructions-container">', unsafe_allow_html=True)
-        st.markdown('<div class="section-title">Apply in various scenarios</div>', unsafe_allow_html=True)
-        scenario = st.selectbox("", ["Health Assessment", "Fitness Tracking", "Wellness Monitoring"], label_visibility="collapsed")
-
-        st.markdown('''
-        <div class="scenario-description">
-            This health assessment uses rPPG, computer vision, and advanced AI to build a full profile of your health markers.
-            <br><br>
-            Click <strong>START</strong> to take a 30 seconds video scan and get insights into your health.
-        </div>
-        ''', unsafe_allow_html=True)
+        st.markdown(app_support.section_title("Apply in various scenarios"), unsafe_allow_html=True)
+        scenario = st.selectbox("Scenario", ["Health Assessment", "Fitness Tracking", "Wellness Monitoring"], label_visibility="collapsed")
+
+        st.markdown(app_support.SCENARIO_DESCRIPTION, unsafe_allow_html=True)
+        st.markdown('</div>', unsafe_allow_html=True)
+
+        # Method selection
+        st.markdown('<div class="instructions-container">', unsafe_allow_html=True)
+        st.markdown(app_support.section_title("Analysis method"), unsafe_allow_html=True)
+        method = st.selectbox("Analysis method", list(METHOD_LABELS), format_func=METHOD_LABELS.get, label_visibility="collapsed")
+        # Every face is tracked from the same decode pass, so group recordings are decoded once
+        max_subjects = st.number_input("Faces to analyze", min_value=1, max_value=MAX_SUBJECTS, value=1, help="Analyze everyone in a group recording")
         st.markdown('</div>', unsafe_allow_html=True)
 
     # MIDDLE COLUMN - Video Display
@@ -278,134 +142,151 @@ try:
         if not VITALLENS_AVAILABLE:
             st.error("⚠️ VitalLens library is not available. Please check deployment logs.")
 
-        video_file = st.file_uploader("📹 Upload Video", type=["mp4", "avi", "mov"])
+        input_mode = st.radio("Input", ["Upload video", "Live stream"], horizontal=True, label_visibility="collapsed") if LIVE_SOURCES else "Upload video"
+        video_file = st.file_uploader("📹 Upload Video", type=["mp4", "avi", "mov"]) if input_mode == "Upload video" else None
 
-        video_path = None
+        video_hash = None
         if video_file is not None:
-            try:
-                # Save uploaded file to temporary location
-                tfile = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
-                tfile.write(video_file.read())
-                video_path = tfile.name
-                tfile.close()
-            except Exception as e:
-                st.error(f"Error saving video file: {str(e)}")
-
-        if video_path:
-            st.video(video_path)
-        else:
+            # Hashed once per uploaded file; the temp file for analysis is only written on START
+            upload = st.session_state.get('upload')
+            if upload is None or upload[0] != video_file.file_id:
+                upload = (video_file.file_id, content_hash(video_file.getvalue()))
+                st.session_state['upload'] = upload
+            video_hash = upload[1]
+
+        if video_hash:
+            st.video(video_file)
+        elif input_mode == "Upload video":
             st.markdown('<div class="upload-info">📹 Please upload a video file to begin assessment</div>', unsafe_allow_html=True)
 
+        live_panel = None
+        if input_mode == "Live stream":
+            from live_stream import LiveAnalyzer
+            from rppg_local import LOCAL_METHODS
+            # Live analysis runs the local engines; the API method falls back to POS here
+            live_method = method if method in LOCAL_METHODS else 'POS'
+            stream_source = st.selectbox("Stream source", LIVE_SOURCES, help="Sources set by the operator in LIVE_STREAM_SOURCES")
+            loop_file = st.checkbox("Loop file (camera stand-in)", value=False)
+            start_col, stop_col = st.columns(2)
+            if start_col.button("START LIVE", use_container_width=True):
+                if 'live' in st.session_state:
+                    st.session_state.pop('live').stop()
+                st.session_state['live'] = LiveAnalyzer(stream_source, method=live_method, loop=loop_file).start()
+            if stop_col.button("STOP", use_container_width=True) and 'live' in st.session_state:
+                st.session_state.pop('live').stop()
+            # Filled by the update loop at the end of the script so the other columns render first
+            live_panel = st.empty()
+
         # Start button
-        if video_path and VITALLENS_AVAILABLE:
+        if video_hash and VITALLENS_AVAILABLE:
             if st.button("START", use_container_width=True):
-                with st.spinner("Loading and analyzing video..."):
+                from analysis import API_METHODS, analysis_settings
+                # Everything that changes the result must be part of the cache key
+                if method in API_METHODS:
+                    settings = analysis_settings(method=method, mode='BURST', fallback_method='POS', api_timeout=API_TIMEOUT, max_subjects=max_subjects)
+                else:
+                    settings = analysis_settings(method=method, max_subjects=max_subjects)
+                result_key = cache_key(video_hash, settings)
+                cached = result_cache.get(result_key)
+                if cached is not None:
+                    st.session_state['results'] = cached['vital_signs']
+                    st.session_state['fps'] = cached['fps']
+                    st.session_state['fps_detected'] = cached.get('fps_detected', True)
+                    st.session_state['quality'] = cached.get('quality')
+                    st.session_state['subjects'] = cached.get('subjects')
+                    st.session_state['method'] = method
+                    st.session_state['result_key'] = result_key
+                    st.session_state['rolling_windows'] = (settings['rolling_hr_window_s'], settings['rolling_rr_window_s'])
+                    # Nothing was loaded or admitted, so the previous analysis' stats no longer apply
+                    for stale in ('load_stats', 'memory', 'analysis_trace'):
+                        st.session_state.pop(stale, None)
+                    st.session_state['cache_hit'] = True
+                    st.rerun()
+
+                # Get API key from secrets (only the VitalLens API needs one)
+                API_KEY = None
+                if method in API_METHODS:
+                    try:
+                        API_KEY = st.secrets["VITALLENS_API_KEY"]
+                    except Exception as e:
+                        st.error("❌ API key not found in secrets. Please configure VITALLENS_API_KEY in Streamlit Cloud settings.")
+
+                video_path = None
+                if API_KEY or method not in API_METHODS:
                     try:
-                        # Load video
-                        cap = cv2.VideoCapture(video_path)
-                        if not cap.isOpened():
-                            st.error("❌ Could not open video file")
-                        else:
-                            fps = cap.get(cv2.CAP_PROP_FPS)
-                            if fps == 0:
-                                fps = 30
-                                st.warning("⚠️ Could not detect FPS, using default 30 FPS")
-                            
-                            frames = []
-                            frame_count = 0
-                            max_frames = 1800  # Limit to 60 seconds at 30fps
-                            
-                            while frame_count < max_frames:
-                                ret, frame = cap.read()
-                                if not ret:
-                                    break
-                                frames.append(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
-                                frame_count += 1
-                            
-                            cap.release()
-                            
-                            if len(frames) == 0:
-                                st.error("❌ No frames could be read from video")
-                            else:
-                                video_array = np.array(frames)
-                                st.success(f"✅ Video loaded: {len(frames)} frames at {fps:.1f} FPS")
-
-                                # Get API key from secrets
-                                try:
-                                    API_KEY = st.secrets["VITALLENS_API_KEY"]
-                                except Exception as e:
-                                    st.error("❌ API key not found in secrets. Please configure VITALLENS_API_KEY in Streamlit Cloud settings.")
-                                    API_KEY = None
-
-                                if API_KEY:
-                                    # Initialize VitalLens
-                                    try:
-                                        vl = vitallens.VitalLens(
-                                            method=vitallens.Method.VITALLENS,
-                                            api_key=API_KEY,
-                                            mode=vitallens.Mode.BURST,
-                                            export_to_json=False,
-                                            estimate_rolling_vitals=True
-                                        )
-
-                                        # Analyze
-                                        with st.spinner("Analyzing vital signs..."):
-                                            results = vl(video_array, fps=fps)
-
-                                        if not results or len(results) == 0:
-                                            st.error("⚠️ No face detected in video! Please ensure your face is clearly visible.")
-                                        else:
-                                            st.session_state['results'] = results[0]['vital_signs']
-                                            st.session_state['fps'] = fps
-                                            st.success("✅ Analysis complete!")
-                                            st.rerun()
-                                    
-                                    except Exception as e:
-                                        st.error(f"❌ VitalLens error: {str(e)}")
-                    
+                        # Save uploaded file to temporary location
+                        upload_start = time.perf_counter()
+                        tfile = tempfile.NamedTemporaryFile(delete=False, suffix='.mp4')
+                        tfile.write(video_file.getvalue())
+                        video_path = tfile.name
+                        tfile.close()
+                        upload_write_s = time.perf_counter() - upload_start
                     except Exception as e:
-                        st.error(f"❌ Error processing video: {str(e)}")
-                        import traceback
-                        st.code(traceback.format_exc())
-                    
-                    finally:
-                        # Clean up temporary file
-                        if video_path and os.path.exists(video_path):
-                            try:
-                                os.unlink(video_path)
-                            except:
-                                pass
+                        st.error(f"Error saving video file: {str(e)}")
+
+                if video_path:
+                    # Runs on a worker thread; this session only polls it
+                    try:
+                        job = get_queue().submit(app_support.run_analysis, video_path, settings, API_KEY,
+                                                 result_cache, result_key, upload_write_s, results_store,
+                                                 app_support.current_user(), video_hash=video_hash,
+                                                 label=METHOD_LABELS[method])
+                        st.session_state['job_id'] = job.id
+                        video_path = None  # the job removes the upload when it finishes
+                    except QueueFullError:
+                        st.error("❌ Too many analyses are waiting. Please try again in a minute.")
+
+                # Clean up temporary file
+                if video_path and os.path.exists(video_path):
+                    try:
+                        os.unlink(video_path)
+                    except:
+                        pass
+
+        # Filled by the polling loop at the end of the script so the other columns render first
+        job = get_queue().get(st.session_state.pop('job_id')) if 'job_id' in st.session_state else None
+        job_panel = None
+        if job is not None:
+            st.session_state['job_id'] = job.id
+            job_panel = st.empty()
+            if not job.done and st.button("CANCEL", use_container_width=True):
+                job.cancel()
 
         st.markdown('</div>', unsafe_allow_html=True)
 
     # RIGHT COLUMN - Metrics Display
+    subject = 0
     with col3:
         if 'results' in st.session_state:
             vital_signs = st.session_state['results']
 
+            used_method = st.session_state.get('method', 'VITALLENS')
+            subjects = st.session_state.get('subjects')
+            if subjects:
+                # Largest face first; the rest of the page shows the selected one
+                subject = st.radio("Subject", range(len(subjects)), format_func=lambda i: f"Face {i + 1}", horizontal=True)
+                vital_signs = subjects[subject]['vital_signs']
+                used_method = subjects[subject]['method']
+            if used_method != method and method == 'VITALLENS':
+                st.warning(f"⚠️ VitalLens API unavailable - showing results from {METHOD_LABELS[used_method]}")
+            else:
+                st.caption(f"Analyzed with {METHOD_LABELS[used_method]}")
+            quality = st.session_state.get('quality')
+            if quality and quality['warnings']:
+                st.warning("⚠️ Results may be less accurate: " + "; ".join(quality['warnings']))
+            if not st.session_state.get('fps_detected', True):
+                st.warning(f"⚠️ Could not detect FPS, using default {st.session_state['fps']:g} FPS")
+
             hr_global = vital_signs.get('heart_rate', {}).get('value')
             rr_global = vital_signs.get('respiratory_rate', {}).get('value')
 
             # Metrics grid
             st.markdown('<div class="metrics-grid">', unsafe_allow_html=True)
 
-            # Heart Rate
-            if hr_global:
-                st.markdown(f'<div class="metric-card"><div class="metric-icon">❤️</div><div class="metric-label">Heart Rate</div><div class="metric-value">{hr_global:.0f}<span class="metric-unit"> bpm</span></div></div>', unsafe_allow_html=True)
-            else:
-                st.markdown('<div class="metric-card"><div class="metric-icon">❤️</div><div class="metric-label">Heart Rate</div><div class="metric-value">--</div></div>', unsafe_allow_html=True)
-
-            # Breathing Rate
-            if rr_global:
-                st.markdown(f'<div class="metric-card"><div class="metric-icon">🫁</div><div class="metric-label">Breathing Rate</div><div class="metric-value">{rr_global:.0f}<span class="metric-unit"> rpm</span></div></div>', unsafe_allow_html=True)
-            else:
-                st.markdown('<div class="metric-card"><div class="metric-icon">🫁</div><div class="metric-label">Breathing Rate</div><div class="metric-value">--</div></div>', unsafe_allow_html=True)
-
-            # Placeholders
-            st.markdown('<div class="metric-card"><div class="metric-icon">🩺</div><div class="metric-label">Blood Pressure</div><div class="metric-value">--</div></div>', unsafe_allow_html=True)
-            st.markdown('<div class="metric-card"><div class="metric-icon">📊</div><div class="metric-label">Body Mass Index</div><div class="metric-value">--</div></div>', unsafe_allow_html=True)
-            st.markdown('<div class="metric-card"><div class="metric-icon">💓</div><div class="metric-label">Heart Rate Variability</div><div class="metric-value">--</div></div>', unsafe_allow_html=True)
-            st.markdown('<div class="metric-card"><div class="metric-icon">📈</div><div class="metric-label">Cardiac Stress Index</div><div class="metric-value">--</div></div>', unsafe_allow_html=True)
+            cards = (app_support.metric_card("❤️", "Heart Rate", hr_global or None, "bpm"),
+                     app_support.metric_card("🫁", "Breathing Rate", rr_global or None, "rpm"))
+            for card in cards + app_support.PLACEHOLDER_CARDS:
+                st.markdown(card, unsafe_allow_html=True)
 
             st.markdown('</div>', unsafe_allow_html=True)
             st.markdown('<div class="more-metrics">+25 More Health Markers</div>', unsafe_allow_html=True)
@@ -413,80 +294,153 @@ try:
             # Show empty state
             st.markdown('<div class="metrics-grid">', unsafe_allow_html=True)
 
-            metrics = [
-                ("❤️", "Heart Rate"),
-                ("🫁", "Breathing Rate"),
-                ("🩺", "Blood Pressure"),
-                ("📊", "Body Mass Index"),
-                ("💓", "Heart Rate Variability"),
-                ("📈", "Cardiac Stress Index")
-            ]
-
-            for icon, label in metrics:
-                st.markdown(f'<div class="metric-card"><div class="metric-icon">{icon}</div><div class="metric-label">{label}</div><div class="metric-value">--</div></div>', unsafe_allow_html=True)
+            for card in app_support.EMPTY_CARDS:
+                st.markdown(card, unsafe_allow_html=True)
 
             st.markdown('</div>', unsafe_allow_html=True)
             st.markdown('<div class="more-metrics">+25 More Health Markers</div>', unsafe_allow_html=True)
 
+        # Previous scans of this user, from the persistent results store; visitors who are not
+        # signed in share no identity, so they get no history
+        user = app_support.current_user()
+        history = results_store.query(user=user, limit=10) if user else []
+        if history:
+            with st.expander(f"🕘 Recent scans ({len(history)})"):
+                rows = ["| Time | Method | HR (bpm) | RR (rpm) |", "|---|---|---|---|"]
+                for scan in history:
+                    when = time.strftime('%Y-%m-%d %H:%M', time.localtime(scan['created_at']))
+                    hr = f"{scan['heart_rate']:.0f}" if scan['heart_rate'] is not None else "-"
+                    rr = f"{scan['respiratory_rate']:.0f}" if scan['respiratory_rate'] is not None else "-"
+                    rows.append(f"| {when} | {METHOD_LABELS.get(scan['method'], scan['method'])} | {hr} | {rr} |")
+                st.markdown("\n".join(rows))
+
     # Display detailed charts if results exist
     if 'results' in st.session_state:
         vital_signs = st.session_state['results']
         fps = st.session_state['fps']
+        result_key = st.session_state.get('result_key')
+        if st.session_state.get('subjects'):
+            vital_signs = st.session_state['subjects'][subject]['vital_signs']
+            # Chart and re-roll caches are keyed per face
+            result_key = f"{result_key}/face{subject}"
 
-        has_rolling_hr = 'rolling_heart_rate' in vital_signs
-        has_rolling_rr = 'rolling_respiratory_rate' in vital_signs
+        rolling_windows = st.session_state.get('rolling_windows')
+        can_reroll = rolling_windows is not None and 'ppg_waveform' in vital_signs
 
-        if has_rolling_hr or has_rolling_rr:
+        if can_reroll or 'rolling_heart_rate' in vital_signs or 'rolling_respiratory_rate' in vital_signs:
             st.markdown("---")
             st.markdown('<div class="section-title" style="text-align: center; margin: 2rem 0;">📈 Detailed Analysis</div>', unsafe_allow_html=True)
 
-            chart_col1, chart_col2 = st.columns(2, gap="large")
+            if can_reroll:
+                # Other windows are rolled from the stored waveforms, without calling the API again
+                window_col1, window_col2 = st.columns(2, gap="large")
+                hr_window_s = window_col1.slider("Heart rate window (s)", 4, 30, int(rolling_windows[0]))
+                rr_window_s = window_col2.slider("Respiratory rate window (s)", 10, 60, int(rolling_windows[1]))
+                if (hr_window_s, rr_window_s) != tuple(rolling_windows):
+                    rolled = app_support.reroll_vitals(result_key, st.session_state.get('method'),
+                                                       hr_window_s, rr_window_s, vital_signs, fps)
+                    vital_signs = {k: v for k, v in vital_signs.items() if not k.startswith('rolling_')}
+                    vital_signs.update(rolled)
+                chart_windows = (hr_window_s, rr_window_s)
+            else:
+                chart_windows = None
+            has_rolling_hr = 'rolling_heart_rate' in vital_signs
+            has_rolling_rr = 'rolling_respiratory_rate' in vital_signs
 
-            with chart_col1:
-                if has_rolling_hr:
+            lightweight = st.checkbox("Lightweight charts", value=False, help="Interactive native charts instead of rendered images")
+            chart_col1, chart_col2 = st.columns(2, gap="large")
+            charts = [
+                (chart_col1, has_rolling_hr, 'heart_rate', "Heart Rate Over Time", "Heart Rate (bpm)"),
+                (chart_col2, has_rolling_rr, 'respiratory_rate', "Respiratory Rate Over Time", "Respiratory Rate (rpm)"),
+            ]
+            for chart_col, has_rolling, name, title, ylabel in charts:
+                if not has_rolling:
+                    continue
+                with chart_col:
                     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                    st.markdown('<div class="chart-title">Heart Rate Over Time</div>', unsafe_allow_html=True)
-
-                    rolling_hr = vital_signs['rolling_heart_rate']['data']
-                    time_axis = np.arange(len(rolling_hr)) / fps
-                    hr_global = vital_signs.get('heart_rate', {}).get('value')
-
-                    fig, ax = plt.subplots(figsize=(7, 4), facecolor='white')
-                    ax.plot(time_axis, rolling_hr, color='#ef4444', linewidth=2.5)
-                    if hr_global:
-                        ax.axhline(y=hr_global, color='#dc2626', linestyle='--', linewidth=1.5, alpha=0.7)
-                    ax.set_xlabel("Time (seconds)", fontsize=10)
-                    ax.set_ylabel("Heart Rate (bpm)", fontsize=10)
-                    ax.grid(True, alpha=0.2, linestyle='-', linewidth=0.5)
-                    ax.spines['top'].set_visible(False)
-                    ax.spines['right'].set_visible(False)
-                    plt.tight_layout()
-                    st.pyplot(fig)
-                    plt.close()
+                    st.markdown(f'<div class="chart-title">{title}</div>', unsafe_allow_html=True)
+
+                    series = vital_signs[f'rolling_{name}']['data']
+                    global_value = vital_signs.get(name, {}).get('value')
+                    if lightweight:
+                        from charts import decimated
+                        time_axis, values = decimated(series, fps)
+                        st.line_chart({"Time (seconds)": time_axis, ylabel: values}, x="Time (seconds)", y=ylabel,
+                                      color=CHART_COLORS[name][0])
+                    else:
+                        png = render_chart(result_key, st.session_state.get('method'), name,
+                                           chart_windows, series, fps, global_value, ylabel)
+                        st.image(png, width="stretch")
                     st.markdown('</div>', unsafe_allow_html=True)
 
-            with chart_col2:
-                if has_rolling_rr:
-                    st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                    st.markdown('<div class="chart-title">Respiratory Rate Over Time</div>', unsafe_allow_html=True)
-
-                    rolling_rr = vital_signs['rolling_respiratory_rate']['data']
-                    time_axis = np.arange(len(rolling_rr)) / fps
-                    rr_global = vital_signs.get('respiratory_rate', {}).get('value')
-
-                    fig, ax = plt.subplots(figsize=(7, 4), facecolor='white')
-                    ax.plot(time_axis, rolling_rr, color='#3b82f6', linewidth=2.5)
-                    if rr_global:
-                        ax.axhline(y=rr_global, color='#2563eb', linestyle='--', linewidth=1.5, alpha=0.7)
-                    ax.set_xlabel("Time (seconds)", fontsize=10)
-                    ax.set_ylabel("Respiratory Rate (rpm)", fontsize=10)
-                    ax.grid(True, alpha=0.2, linestyle='-', linewidth=0.5)
-                    ax.spines['top'].set_visible(False)
-                    ax.spines['right'].set_visible(False)
-                    plt.tight_layout()
-                    st.pyplot(fig)
-                    plt.close()
-                    st.markdown('</div>', unsafe_allow_html=True)
+    # Analysis job progress, polled until the job finishes or CANCEL is clicked
+    if job_panel is not None:
+        while not job.done:
+            with job_panel.container():
+                snapshot = job.snapshot()
+                if snapshot['status'] == 'queued':
+                    ahead = get_queue().position(job)
+                    st.progress(0.0, text=f"⏳ Waiting for a free worker ({ahead} ahead, {snapshot['wait_s']:.0f}s so far)")
+                elif snapshot['stage'] == 'memory':
+                    st.progress(0.0, text="⏳ Waiting for memory to free up...")
+                elif snapshot['stage'] == 'quality':
+                    st.progress(0.0, text="Checking video quality...")
+                elif snapshot['stage'] == 'decode':
+                    total = f"/{snapshot['total']}" if snapshot['total'] else ""
+                    st.progress(snapshot['fraction'] or 0.0, text=f"Loading video: {snapshot['frames']}{total} frames")
+                elif snapshot['stage'] == 'windows':
+                    st.progress(snapshot['fraction'] or 0.0, text=f"Analyzing long video in windows: {snapshot['frames']} frames done")
+                else:
+                    st.progress(1.0, text="Analyzing vital signs...")
+            time.sleep(0.25)
+        st.session_state.pop('job_id', None)
+        job_panel.empty()
+        from analysis import NoFaceDetectedError, QualityGateError
+        if job.status == 'done':
+            result = job.result
+            st.session_state['results'] = result['vital_signs']
+            st.session_state['fps'] = result['fps']
+            st.session_state['fps_detected'] = result['load_stats'].get('fps_detected', True)
+            st.session_state['quality'] = result['quality']
+            st.session_state['memory'] = result['memory']
+            st.session_state['subjects'] = result['subjects']
+            st.session_state['method'] = result['method']
+            st.session_state['result_key'] = result['result_key']
+            st.session_state['rolling_windows'] = result['rolling_windows']
+            st.session_state['load_stats'] = result['load_stats']
+            st.session_state['cache_hit'] = False
+            if result['trace'] is not None:
+                st.session_state['analysis_trace'] = result['trace']
+            else:
+                st.session_state.pop('analysis_trace', None)
+            st.rerun()
+        elif job.status == 'cancelled':
+            st.info("Analysis cancelled.")
+        elif isinstance(job.error, QualityGateError):
+            st.error(f"⚠️ {str(job.error)}. Please record in even light with the camera steady and your face in view.")
+        elif isinstance(job.error, NoFaceDetectedError):
+            st.error("⚠️ No face detected in video! Please ensure your face is clearly visible.")
+        elif isinstance(job.error, IOError):
+            st.error(f"❌ {str(job.error)}")
+        else:
+            st.error(f"❌ Error processing video: {str(job.error)}")
+
+    # Live stream updates, once per second until the stream ends or STOP is clicked
+    live = st.session_state.get('live')
+    if live_panel is not None and live is not None:
+        while True:
+            estimate, live_stats = live.poll()
+            with live_panel.container():
+                st.caption(f"{METHOD_LABELS[live.method]} over the last {live_stats['buffered_s']:.0f} s of {live.buffer_s:.0f} s, updated every {live.update_s:.0f} s")
+                hr_col, rr_col = st.columns(2)
+                hr_col.metric("Heart Rate", f"{estimate['heart_rate']:.0f} bpm" if estimate else "--")
+                rr_col.metric("Breathing Rate", f"{estimate['respiratory_rate']:.0f} rpm" if estimate else "--")
+                st.caption(f"{live_stats['frames_received']} frames, {live_stats['frames_dropped']} dropped ({live_stats['drop_rate']:.1%}), {live_stats['frames_without_face']} without a face, update latency {live_stats['update_ms_last']:.1f} ms (max {live_stats['update_ms_max']:.1f} ms)")
+                if live.error:
+                    st.error(f"❌ {live.error}")
+            if not live.running:
+                break
+            time.sleep(live.update_s)
 
 except Exception as e:
     st.error(f"Critical Error: {str(e)}")